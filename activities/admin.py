@@ -1,6 +1,8 @@
 from django import forms
 from django.contrib import admin
 from django.core.exceptions import ValidationError, PermissionDenied
+from isd.autocomplete import PrefixAutocompleteMixin, activity_scope, financial_year_filter
+from isd.facets import CachedFacetsMixin
 from .models import FinancialYear,Budget, Expenditure, Activity
 from django.utils.translation import gettext_lazy as _
 
@@ -112,7 +114,7 @@ class FinancialYearListFilter(admin.SimpleListFilter):
     parameter_name = 'financial_year'
 
     def lookups(self, request, model_admin):
-        return [(fy.id, str(fy)) for fy in FinancialYear.objects.all()]
+        return FinancialYear.choices()
 
     def queryset(self, request, queryset):
         if self.value():
@@ -121,12 +123,16 @@ class FinancialYearListFilter(admin.SimpleListFilter):
 
 
 @admin.register(Activity)
-class ActivityAdmin(admin.ModelAdmin):
+class ActivityAdmin(PrefixAutocompleteMixin, admin.ModelAdmin):
     form = ActivityAdminForm
     list_display = ('name', 'description', 'financial_year', 'assigned_to')
+    list_select_related = ('financial_year', 'unit', 'section__department')
     list_filter = [FinancialYearListFilter]
     search_fields = ['name', 'description']
 
+    def get_autocomplete_queryset(self, request, queryset):
+        return queryset.filter(activity_scope(request.user), financial_year_filter(request))
+
     def get_form(self, request, obj=None, **kwargs):
         Form = super().get_form(request, obj, **kwargs)
         class RequestUserForm(Form):
@@ -192,9 +198,11 @@ class ExpenditureForm(forms.ModelForm):
             elif user.department:
                 self.fields["activity"].queryset = Activity.objects.filter(section__department=user.department)
 @admin.register(Budget)
-class BudgetAdmin(admin.ModelAdmin):
+class BudgetAdmin(CachedFacetsMixin, admin.ModelAdmin):
     list_display = ("activity", "financial_year", "budget_type", "amount")
-    list_filter = ("financial_year", "budget_type")
+    list_select_related = ("activity", "financial_year")
+    list_filter = (FinancialYearListFilter, "budget_type")
+    autocomplete_fields = ("activity",)
 
     def get_queryset(self, request):
         qs = super().get_queryset(request)
@@ -217,7 +225,9 @@ class BudgetAdmin(admin.ModelAdmin):
 @admin.register(Expenditure)
 class ExpenditureAdmin(admin.ModelAdmin):
     list_display = ("activity", "financial_year", "expenditure_date", "amount")
-    list_filter = ("financial_year",)
+    list_select_related = ("activity", "financial_year")
+    list_filter = (FinancialYearListFilter,)
+    autocomplete_fields = ("activity",)
 
     def get_queryset(self, request):
         qs = super().get_queryset(request)
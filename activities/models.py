@@ -1,3 +1,7 @@
+import datetime
+
+from django.conf import settings
+from django.core.cache import cache
 from django.core.exceptions import ValidationError
 from django.db import models
 from django.utils import timezone
@@ -5,6 +9,9 @@ from django.utils import timezone
 from office.models import Unit, Section
 
 
+FINANCIAL_YEAR_CHOICES_KEY = 'activities:financial_year_choices'
+
+
 class FinancialYear(models.Model):
     start_date = models.DateField()
     end_date = models.DateField()
@@ -15,10 +22,30 @@ class FinancialYear(models.Model):
     def __str__(self):
         return f"{self.start_date.year}/{self.end_date.year}"
 
+    @classmethod
+    def choices(cls):
+        """
+        (id, label) pairs, newest first. Saving or deleting a financial year
+        clears the cached list, but only in the cache of the process that did
+        it when the cache is per process (the default), so it also expires
+        after FINANCIAL_YEAR_CHOICES_CACHE_SECONDS.
+        """
+        return cache.get_or_set(
+            FINANCIAL_YEAR_CHOICES_KEY,
+            lambda: [(fy.id, str(fy)) for fy in cls.objects.order_by('-start_date')],
+            settings.FINANCIAL_YEAR_CHOICES_CACHE_SECONDS,
+        )
+
+    @staticmethod
+    def start_for(date):
+        """July 1 of the financial year that contains `date`."""
+        year = date.year if date.month >= 7 else date.year - 1
+        return datetime.date(year, 7, 1)
+
 
 
 class Activity(models.Model):
-    name = models.CharField(max_length=255)
+    name = models.CharField(max_length=255, db_index=True)
     description = models.TextField(blank=True)
 
     unit = models.ForeignKey(Unit, null=True, blank=True, related_name='activities', on_delete=models.CASCADE)
@@ -37,9 +64,9 @@ class Activity(models.Model):
                 raise ValidationError("Activity must belong to either a Unit or a Section.")
 
     def __str__(self):
-        if self.unit:
+        if self.unit_id:
             return f"{self.name}"
-        elif self.section:
+        elif self.section_id:
             return f"{self.name}"
         else:
             return self.name
@@ -0,0 +1,10 @@
+from django.core.cache import cache
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import FINANCIAL_YEAR_CHOICES_KEY, FinancialYear
+
+
+@receiver([post_save, post_delete], sender=FinancialYear)
+def clear_financial_year_choices(sender, **kwargs):
+    cache.delete(FINANCIAL_YEAR_CHOICES_KEY)
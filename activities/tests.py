@@ -1,3 +1,100 @@
+
+import datetime
+
+from django.contrib.auth.models import Permission
 from django.test import TestCase
+from django.urls import reverse
+
+from activities.models import Activity, Budget, Expenditure, FinancialYear
+from authentication.models import CustomUser
+from isd.testing import QueryBudgetTestCase
+from office.models import Department, Section, Unit
+
+
+class ActivityAdminQueryBudgetTests(QueryBudgetTestCase):
+    def test_changelist(self):
+        self.assertQueryBudget(reverse('admin:activities_activity_changelist'), 10)
+
+    def test_add_form(self):
+        self.assertQueryBudget(reverse('admin:activities_activity_add'), 12)
+
+    def test_change_form(self):
+        self.assertQueryBudget(lambda: reverse('admin:activities_activity_change', args=[Activity.objects.first().pk]), 12,
+                               users=[self.superuser])
+
+
+class BudgetAdminQueryBudgetTests(QueryBudgetTestCase):
+    def test_changelist(self):
+        self.assertQueryBudget(reverse('admin:activities_budget_changelist'), 10)
+
+    def test_activity_autocomplete(self):
+        url = reverse('admin:autocomplete') + '?term=seed&app_label=activities&model_name=budget&field_name=activity'
+        self.assertQueryBudget(url, 10)
+
+    def test_changelist_facets(self):
+        self.assertFacetsCached(reverse('admin:activities_budget_changelist'))
+
+    def test_add_form(self):
+        self.assertQueryBudget(reverse('admin:activities_budget_add'), 10)
+
+    def test_change_form(self):
+        self.assertQueryBudget(lambda: reverse('admin:activities_budget_change', args=[Budget.objects.first().pk]), 10,
+                               users=[self.superuser])
+
+
+class ExpenditureAdminQueryBudgetTests(QueryBudgetTestCase):
+    def test_changelist(self):
+        self.assertQueryBudget(reverse('admin:activities_expenditure_changelist'), 10)
+
+    def test_add_form(self):
+        self.assertQueryBudget(reverse('admin:activities_expenditure_add'), 10)
+
+    def test_change_form(self):
+        self.assertQueryBudget(lambda: reverse('admin:activities_expenditure_change', args=[Expenditure.objects.first().pk]), 10,
+                               users=[self.superuser])
+
+
+class ActivityAutocompleteTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.superuser = CustomUser.objects.create_superuser('admin@example.com', None, full_name='Admin')
+        department = Department.objects.create(name='ICT', short_name='ICT')
+        cls.section = Section.objects.create(name='Systems', department=department, short_name='SYS')
+        cls.unit = Unit.objects.create(name='Audit', short_name='AU')
+        current = FinancialYear.start_for(datetime.date.today())
+        start = current.replace(year=current.year - 1)
+        cls.previous_year = FinancialYear.objects.create(start_date=start, end_date=start.replace(year=start.year + 1) - datetime.timedelta(days=1))
+        Activity.objects.create(name='Seed previous own', section=cls.section, financial_year=cls.previous_year)
+        Activity.objects.create(name='Seed previous unit', unit=cls.unit, financial_year=cls.previous_year)
+        cls.section_user = CustomUser.objects.create_user('section@example.com', None, full_name='Section', is_staff=True,
+                                                          department=department, section=cls.section)
+        cls.section_user.user_permissions.set(
+            Permission.objects.filter(content_type__app_label='activities').exclude(codename='view_all_activities')
+        )
+
+    def autocomplete(self, user, term='', **params):
+        self.client.force_login(user)
+        response = self.client.get(reverse('admin:autocomplete'), {
+            'term': term, 'app_label': 'activities', 'model_name': 'budget', 'field_name': 'activity', **params,
+        })
+        self.assertEqual(response.status_code, 200)
+        return {int(result['id']) for result in response.json()['results']}
+
+    def test_limited_to_scope_and_current_year(self):
+        today = datetime.date.today()
+        start = FinancialYear.start_for(today)
+        current, _ = FinancialYear.objects.get_or_create(start_date=start, end_date=start.replace(year=start.year + 1) - datetime.timedelta(days=1))
+        own = Activity.objects.create(name='Seed current own', section=self.section, financial_year=current)
+        Activity.objects.create(name='Seed current unit', unit=self.unit, financial_year=current)
+
+        self.assertEqual(self.autocomplete(self.section_user, 'seed'), {own.pk})
+        self.assertEqual(self.autocomplete(self.section_user, 'current own'), set())  # prefix match on the name only
+        self.assertEqual(len(self.autocomplete(self.superuser, 'seed')), 2)
 
-# Create your tests here.
+    def test_explicit_financial_year(self):
+        previous = self.previous_year
+        in_scope = Activity.objects.filter(section=self.section)
+        self.assertEqual(self.autocomplete(self.section_user, 'seed', financial_year=previous.pk),
+                         set(in_scope.filter(financial_year=previous).values_list('pk', flat=True)))
+        self.assertEqual(self.autocomplete(self.section_user, 'seed', financial_year='all'),
+                         set(in_scope.values_list('pk', flat=True)))
@@ -6,6 +6,7 @@ from django.contrib.auth.forms import ReadOnlyPasswordHashField
 from django.core.exceptions import ValidationError
 
 from authentication.models import CustomUser, Role
+from isd.facets import CachedFacetsMixin
 from office.models import Section, Department, Unit
 
 
@@ -109,12 +110,13 @@ class CustomUserChangeForm(forms.ModelForm):
         return user
 
 
-class CustomUserAdmin(UserAdmin):
+class CustomUserAdmin(CachedFacetsMixin, UserAdmin):
     model = CustomUser
     add_form = CustomUserCreationForm
     form = CustomUserChangeForm
 
     list_display = ('email', 'full_name', 'is_active', 'date_joined', 'department', 'section', 'unit')
+    list_select_related = ('department', 'section__department', 'unit')
     list_filter = ('is_active', 'is_staff', 'is_superuser', 'department', 'section', 'unit')
     search_fields = ('email', 'full_name')
     ordering = ('-date_joined',)
@@ -141,6 +143,12 @@ class CustomUserAdmin(UserAdmin):
         }),
     )
 
+    def formfield_for_manytomany(self, db_field, request=None, **kwargs):
+        if db_field.name == 'user_permissions':
+            # Permission.__str__ includes its content type.
+            kwargs['queryset'] = db_field.remote_field.model.objects.select_related('content_type')
+        return super().formfield_for_manytomany(db_field, request=request, **kwargs)
+
 
 admin.site.register(CustomUser, CustomUserAdmin)
 admin.site.unregister(Group)
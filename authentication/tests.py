@@ -1,3 +1,18 @@
-from django.test import TestCase
 
-# Create your tests here.
+from django.urls import reverse
+
+from isd.testing import QueryBudgetTestCase
+
+
+class CustomUserAdminQueryBudgetTests(QueryBudgetTestCase):
+    def test_changelist(self):
+        self.assertQueryBudget(reverse('admin:authentication_customuser_changelist'), 12)
+
+    def test_changelist_facets(self):
+        self.assertFacetsCached(reverse('admin:authentication_customuser_changelist'))
+
+    def test_add_form(self):
+        self.assertQueryBudget(reverse('admin:authentication_customuser_add'), 10)
+
+    def test_change_form(self):
+        self.assertQueryBudget(lambda: reverse('admin:authentication_customuser_change', args=[self.section_user.pk]), 15)
@@ -0,0 +1,155 @@
+"""
+Admission control for expensive views.
+
+Report generation and exports can each hold a worker for many seconds. Views
+wrapped with ``admission_controlled`` need a free slot from a global pool and
+from the user's own pool before they run; when either pool is full the
+request is answered at once with 429 and ``Retry-After`` instead of waiting
+for a worker. Slots are cache keys created with ``cache.add`` and carry a
+timeout, so a worker that dies mid-request cannot leak one for longer than
+``ADMISSION_SLOT_SECONDS``. With several workers the cache must be shared.
+
+Identical requests (same view, user, parameters and data version) are
+coalesced: the finished response of one is kept for
+``ADMISSION_COALESCE_SECONDS`` and served to the others. A duplicate that
+arrives while the first is still running polls for that response for up to
+``ADMISSION_COALESCE_WAIT_SECONDS`` (holding its worker meanwhile) and gets a
+429 if it is not ready by then. Streamed and failed responses are not kept; a
+waiting duplicate then runs the view itself.
+"""
+
+import hashlib
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+
+from monitoring.metrics import record_cache
+
+IGNORED_PARAMS = {'csrfmiddlewaretoken'}
+COALESCE_POLL_SECONDS = 0.25
+
+
+def acquire_slot(pool, limit):
+    """Take one of `limit` slots of `pool`; returns the slot's cache key, or None when all are taken."""
+    for i in range(limit):
+        key = f'admission:{pool}:{i}'
+        if cache.add(key, 1, settings.ADMISSION_SLOT_SECONDS):
+            return key
+    return None
+
+
+def request_fingerprint(request, name, user_id, version):
+    params = sorted(
+        (source, key, value)
+        for source, data in (('get', request.GET), ('post', request.POST))
+        for key, values in data.lists() if key not in IGNORED_PARAMS
+        for value in values
+    )
+    return hashlib.sha256(repr((name, user_id, request.method, request.path, params, version)).encode()).hexdigest()
+
+
+def wait_for_duplicate(result_key, running_key):
+    """
+    Poll for the response of the identical request holding `running_key`.
+    Returns (response, False) once it is cached, (None, True) when that request
+    ended without caching one and this request took `running_key` over, and
+    (None, False) after ADMISSION_COALESCE_WAIT_SECONDS.
+    """
+    deadline = time.monotonic() + settings.ADMISSION_COALESCE_WAIT_SECONDS
+    while time.monotonic() < deadline:
+        time.sleep(min(COALESCE_POLL_SECONDS, max(deadline - time.monotonic(), 0)))
+        response = cache.get(result_key)
+        if response is not None:
+            return response, False
+        if cache.add(running_key, 1, settings.ADMISSION_SLOT_SECONDS):
+            return None, True
+    return None, False
+
+
+def busy(message):
+    response = HttpResponse(message, status=429, content_type='text/plain; charset=utf-8')
+    response['Retry-After'] = str(settings.ADMISSION_RETRY_AFTER)
+    return response
+
+
+class ReleaseOnClose:
+    """
+    Streaming content that frees admission slots when the response is closed,
+    including when the client goes away before the first chunk (a generator
+    closed before it started would never run its cleanup).
+    """
+
+    def __init__(self, content, keys):
+        self.content = iter(content)
+        self.keys = keys
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return next(self.content)
+
+    def close(self):
+        try:
+            if hasattr(self.content, 'close'):
+                self.content.close()
+        finally:
+            cache.delete_many(self.keys)
+
+
+def admission_controlled(name, version=None):
+    """
+    Limit concurrent runs of a view to ADMISSION_GLOBAL_LIMIT in total and
+    ADMISSION_USER_LIMIT per user, across every view sharing `name`.
+    `version`, when given, is called per request and becomes part of the
+    coalescing key, so a cached response is not served after the data changed.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            user_id = request.user.pk if request.user.is_authenticated else None
+            fingerprint = request_fingerprint(request, name, user_id, version() if version else None)
+            result_key = f'admission:result:{fingerprint}'
+            running_key = f'admission:running:{fingerprint}'
+
+            response = cache.get(result_key)
+            record_cache('coalesced_response', response is not None)
+            if response is not None:
+                return response
+            if not cache.add(running_key, 1, settings.ADMISSION_SLOT_SECONDS):
+                response, took_over = wait_for_duplicate(result_key, running_key)
+                if response is not None:
+                    return response
+                if not took_over:
+                    return busy("An identical request is already being processed. Please try again shortly.")
+
+            keys = [running_key]
+            for pool, limit in ((f'{name}:user:{user_id}', settings.ADMISSION_USER_LIMIT),
+                                (f'{name}:global', settings.ADMISSION_GLOBAL_LIMIT)):
+                slot = acquire_slot(pool, limit)
+                if slot is None:
+                    cache.delete_many(keys)
+                    return busy("The server is busy with other reports. Please try again shortly.")
+                keys.append(slot)
+
+            try:
+                response = view(request, *args, **kwargs)
+                if hasattr(response, 'render') and not response.is_rendered:
+                    response.render()
+            except BaseException:
+                cache.delete_many(keys)
+                raise
+
+            if response.streaming:
+                # The work happens while the body is sent; hold the slots until then.
+                response.streaming_content = ReleaseOnClose(response.streaming_content, keys)
+                return response
+            if response.status_code == 200 and settings.ADMISSION_COALESCE_SECONDS:
+                cache.set(result_key, response, settings.ADMISSION_COALESCE_SECONDS)
+            cache.delete_many(keys)
+            return response
+        return wrapper
+    return decorator
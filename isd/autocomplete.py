@@ -0,0 +1,72 @@
+"""
+Admin autocomplete helpers.
+
+Foreign-key pickers for activities, services, systems and statistic types use
+the admin's paginated autocomplete view instead of rendering every row as an
+<option>. ``PrefixAutocompleteMixin`` makes those lookups an indexed prefix
+search on ``name`` and lets an admin narrow the candidates (org scope, current
+financial year) without changing what its changelist search matches. Pickers
+default to the current financial year; a ``financial_year`` parameter on the
+autocomplete request picks another year by id, or every year with ``all``.
+"""
+
+import datetime
+
+from django.db.models import Q
+
+from activities.models import FinancialYear
+
+
+def is_autocomplete(request):
+    match = getattr(request, 'resolver_match', None)
+    return match is not None and match.url_name == 'autocomplete'
+
+
+def activity_scope(user, prefix=''):
+    """Q restricting activities (reached through `prefix`) to the user's section, unit or department."""
+    if user.is_superuser or user.has_perm('activities.view_all_activities'):
+        return Q()
+    if user.section_id:
+        return Q(**{f'{prefix}section': user.section_id})
+    if user.unit_id:
+        return Q(**{f'{prefix}unit': user.unit_id})
+    if user.department_id:
+        return Q(**{f'{prefix}section__department': user.department_id})
+    return Q(pk__in=[])
+
+
+def current_financial_year_filter(prefix=''):
+    """Q matching activities of the financial year that contains today, or nothing when no such year exists yet."""
+    today = datetime.date.today()
+    if not FinancialYear.objects.filter(start_date__lte=today, end_date__gte=today).exists():
+        return Q()
+    return Q(**{f'{prefix}financial_year__start_date__lte': today, f'{prefix}financial_year__end_date__gte': today})
+
+
+def financial_year_filter(request, prefix=''):
+    """Q for the request's `financial_year` parameter (an id, or 'all'), or the current year when it has none."""
+    value = request.GET.get('financial_year', '').strip()
+    if value == 'all':
+        return Q()
+    if value.isdigit():
+        return Q(**{f'{prefix}financial_year': int(value)})
+    return current_financial_year_filter(prefix)
+
+
+class PrefixAutocompleteMixin:
+    autocomplete_search_fields = ('^name',)
+    autocomplete_ordering = ('name', 'pk')
+
+    def get_search_fields(self, request):
+        if is_autocomplete(request):
+            return self.autocomplete_search_fields
+        return super().get_search_fields(request)
+
+    def get_search_results(self, request, queryset, search_term):
+        queryset, may_have_duplicates = super().get_search_results(request, queryset, search_term)
+        if is_autocomplete(request):
+            queryset = self.get_autocomplete_queryset(request, queryset).order_by(*self.autocomplete_ordering)
+        return queryset, may_have_duplicates
+
+    def get_autocomplete_queryset(self, request, queryset):
+        return queryset
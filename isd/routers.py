@@ -0,0 +1,100 @@
+"""
+Database routing for the optional read replica.
+
+Only installed when ``DATABASE_URL_REPLICA`` is set. Reads are sent to the
+replica only inside ``use_replica()`` blocks (reports, dashboards, exports),
+and never while the primary is inside a transaction or the current request
+has been pinned to the primary after a write. A write is a request with a
+non-safe method or a saved or deleted row (see ``watch_writes``), not every
+call to ``db_for_write``: Django asks for the write alias on plain GETs too,
+e.g. the admin change form opens a transaction just to render. Views wrapped
+in ``read_from_replica`` are read-only, so a POST to one (the report forms
+post their filters) only counts as a write if it actually saves a row.
+"""
+
+from contextlib import contextmanager
+from functools import wraps
+
+from asgiref.local import Local
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.models.signals import m2m_changed, post_delete, post_save
+
+REPLICA_DB_ALIAS = 'replica'
+
+_state = Local()
+
+
+def replica_configured():
+    return REPLICA_DB_ALIAS in settings.DATABASES
+
+
+def pin_to_primary():
+    _state.pinned = True
+
+
+def is_pinned():
+    return getattr(_state, 'pinned', False)
+
+
+def has_written():
+    return getattr(_state, 'wrote', False)
+
+
+def reset_pin():
+    _state.pinned = False
+    _state.wrote = False
+
+
+def note_write(**kwargs):
+    """Pin the rest of the request to the primary and mark it as having written."""
+    pin_to_primary()
+    _state.wrote = True
+
+
+def watch_writes():
+    for signal in (post_save, post_delete, m2m_changed):
+        signal.connect(note_write, dispatch_uid='isd.routers.note_write')
+
+
+@contextmanager
+def use_replica():
+    previous = getattr(_state, 'replica', False)
+    _state.replica = True
+    try:
+        yield
+    finally:
+        _state.replica = previous
+
+
+def read_from_replica(view):
+    """Run a report/export view with its reads routed to the replica."""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        with use_replica():
+            return view(*args, **kwargs)
+    wrapper.replica_safe = True
+    return wrapper
+
+
+def is_replica_safe(view):
+    # Decorators built on functools.wraps (admin_view, admission_controlled) copy the flag outwards.
+    return getattr(view, 'replica_safe', False)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if not getattr(_state, 'replica', False) or is_pinned():
+            return DEFAULT_DB_ALIAS
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return REPLICA_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return None
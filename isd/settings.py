@@ -1,6 +1,7 @@
 import os
+import tempfile
 from pathlib import Path
-from decouple import config
+from decouple import Csv, config
 import dj_database_url
 
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -26,9 +27,11 @@ INSTALLED_APPS = [
     'activities',
     'office',
     'report',
+    'monitoring',
 ]
 
 MIDDLEWARE = [
+    'monitoring.middleware.MetricsMiddleware.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -37,6 +40,7 @@ MIDDLEWARE = [
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'services.middleware.PermissionsPolicyMiddleware.PermissionsPolicyMiddleware',
+    'monitoring.middleware.ProfilingMiddleware.ProfilingMiddleware',
 ]
 
 ROOT_URLCONF = 'isd.urls'
@@ -62,6 +66,18 @@ WSGI_APPLICATION = 'isd.wsgi.application'
 db_url = config('DATABASE_URL')
 db = dj_database_url.config(default=db_url, conn_max_age=600,conn_health_checks=True, ssl_require=False, )
 DATABASES = {'default': db}
+
+# Optional read replica for report/export/analytics reads, e.g.
+# DATABASE_URL_REPLICA=sqlite:///replica.sqlite3 alongside a SQLite default locally.
+db_replica_url = config('DATABASE_URL_REPLICA', default='')
+if db_replica_url:
+    DATABASES['replica'] = dj_database_url.parse(db_replica_url, conn_max_age=600, conn_health_checks=True, ssl_require=False, )
+    DATABASES['replica']['TEST'] = {'MIRROR': 'default'}
+    DATABASE_ROUTERS = ['isd.routers.ReplicaRouter']
+    MIDDLEWARE.append('services.middleware.ReplicaPinningMiddleware.ReplicaPinningMiddleware')
+
+REPLICA_PIN_COOKIE = 'isd_pin_primary'
+REPLICA_PIN_SECONDS = config('REPLICA_PIN_SECONDS', default=5, cast=int)
 AUTH_USER_MODEL = 'authentication.CustomUser'
 
 AUTH_PASSWORD_VALIDATORS = [
@@ -98,8 +114,71 @@ STATICFILES_STORAGE = 'django.contrib.staticfiles.storage.StaticFilesStorage'
 MEDIA_ROOT = os.path.join(os.path.dirname(BASE_DIR), "media")
 MEDIA_URL = "/media/"
 
+# Stream every upload to a temporary file instead of holding it in memory.
+FILE_UPLOAD_HANDLERS = [
+    'django.core.files.uploadhandler.TemporaryFileUploadHandler',
+]
+
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Use a shared backend (e.g. FileBasedCache or Redis) when running several workers.
+CACHES = {
+    'default': {
+        'BACKEND': config('CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': config('CACHE_LOCATION', default='isd'),
+    }
+}
+
+REPORT_FRAGMENT_CACHE_SECONDS = config('REPORT_FRAGMENT_CACHE_SECONDS', default=300, cast=int)
+ADMIN_FACET_CACHE_SECONDS = config('ADMIN_FACET_CACHE_SECONDS', default=60, cast=int)
+FINANCIAL_YEAR_CHOICES_CACHE_SECONDS = config('FINANCIAL_YEAR_CHOICES_CACHE_SECONDS', default=300, cast=int)
+TICKET_INTAKE_MAX_BATCH = config('TICKET_INTAKE_MAX_BATCH', default=5000, cast=int)
+# How long a work-queue claim (services.queue) holds an open ticket before others can claim it.
+TICKET_CLAIM_SECONDS = config('TICKET_CLAIM_SECONDS', default=1800, cast=int)
+
+# Ticket notifications (services.outbox), sent by `manage.py dispatch_outbox`.
+TICKET_SUPERVISOR_GROUP = config('TICKET_SUPERVISOR_GROUP', default='Supervisors')
+OUTBOX_BACKEND = config('OUTBOX_BACKEND', default='services.outbox.EmailBackend')
+OUTBOX_MAX_ATTEMPTS = config('OUTBOX_MAX_ATTEMPTS', default=8, cast=int)
+OUTBOX_RETRY_SECONDS = config('OUTBOX_RETRY_SECONDS', default=60, cast=int)
+OUTBOX_RETRY_MAX_SECONDS = config('OUTBOX_RETRY_MAX_SECONDS', default=3600, cast=int)
+OUTBOX_LEASE_SECONDS = config('OUTBOX_LEASE_SECONDS', default=300, cast=int)
+
+# Locally, EMAIL_BACKEND=django.core.mail.backends.filebased.EmailBackend writes each message to EMAIL_FILE_PATH.
+EMAIL_BACKEND = config('EMAIL_BACKEND', default='django.core.mail.backends.smtp.EmailBackend')
+EMAIL_FILE_PATH = config('EMAIL_FILE_PATH', default=os.path.join(os.path.dirname(BASE_DIR), 'sent-mail'))
+EMAIL_HOST = config('EMAIL_HOST', default='localhost')
+EMAIL_PORT = config('EMAIL_PORT', default=25, cast=int)
+EMAIL_HOST_USER = config('EMAIL_HOST_USER', default='')
+EMAIL_HOST_PASSWORD = config('EMAIL_HOST_PASSWORD', default='')
+EMAIL_USE_TLS = config('EMAIL_USE_TLS', default=False, cast=bool)
+DEFAULT_FROM_EMAIL = config('DEFAULT_FROM_EMAIL', default='isd@localhost')
+
+# Concurrent report/export jobs (isd.admission); more are turned away with 429.
+ADMISSION_GLOBAL_LIMIT = config('ADMISSION_GLOBAL_LIMIT', default=4, cast=int)
+ADMISSION_USER_LIMIT = config('ADMISSION_USER_LIMIT', default=1, cast=int)
+ADMISSION_SLOT_SECONDS = config('ADMISSION_SLOT_SECONDS', default=300, cast=int)
+ADMISSION_RETRY_AFTER = config('ADMISSION_RETRY_AFTER', default=5, cast=int)
+ADMISSION_COALESCE_SECONDS = config('ADMISSION_COALESCE_SECONDS', default=30, cast=int)
+# How long a duplicate of a running request waits for its response before getting a 429.
+ADMISSION_COALESCE_WAIT_SECONDS = config('ADMISSION_COALESCE_WAIT_SECONDS', default=10, cast=float)
+
+# Request profiles (monitoring.profiling): superusers add ?_profile=1 or an X-Profile header;
+# PROFILE_SAMPLE_RATE profiles that share of all requests.
+PROFILE_DIR = config('PROFILE_DIR', default=os.path.join(os.path.dirname(BASE_DIR), 'profiles'))
+PROFILE_SAMPLE_RATE = config('PROFILE_SAMPLE_RATE', default=0.0, cast=float)
+PROFILE_INTERVAL = config('PROFILE_INTERVAL', default=0.005, cast=float)
+PROFILE_KEEP = config('PROFILE_KEEP', default=200, cast=int)
+
+# Prometheus metrics (monitoring.metrics), shared by the workers on a host through files in METRICS_DIR.
+METRICS_DIR = config('METRICS_DIR', default=os.path.join(tempfile.gettempdir(), 'isd-metrics'))
+# With METRICS_TOKEN set, scrapers must send `Authorization: Bearer <token>`. Without it, only clients in
+# METRICS_ALLOWED_NETWORKS are answered; behind a reverse proxy in METRICS_TRUSTED_PROXIES the client is
+# taken from X-Forwarded-For, so requests relayed by a proxy on the same host are not mistaken for local ones.
+METRICS_TOKEN = config('METRICS_TOKEN', default='')
+METRICS_ALLOWED_NETWORKS = config('METRICS_ALLOWED_NETWORKS', default='127.0.0.0/8,::1/128', cast=Csv())
+METRICS_TRUSTED_PROXIES = config('METRICS_TRUSTED_PROXIES', default='127.0.0.0/8,::1/128', cast=Csv())
+
 SECURE_PERMISSIONS_POLICY = {
     "unload": []
 }
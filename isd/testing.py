@@ -0,0 +1,122 @@
+"""
+Helpers for the admin query-budget tests.
+
+`seed_dataset` builds a small but realistic organisation (departments,
+sections, units, two financial years, activities with budgets and
+expenditures, services, systems, tickets, statistics, staff users in every
+scope). `QueryBudgetTestCase` loads admin pages as those users and checks that
+the number of SQL queries stays under a fixed budget and does not grow when
+more rows are added.
+"""
+
+import datetime
+
+from django.contrib.auth.models import Permission
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from activities.models import FinancialYear, Activity, Budget, Expenditure
+from authentication.models import CustomUser
+from office.models import Department, Section, Unit
+from services.models import (
+    SupportedSystem, SupportService, SupportTicket, StatisticType, StatisticsRecord,
+)
+
+STAFF_APPS = ('services', 'activities', 'office', 'authentication', 'report')
+
+
+def seed_dataset(rows=5, prefix='seed'):
+    """Create a department, two sections and a unit with `rows` activities (and related rows) each."""
+    department = Department.objects.create(name=f'{prefix} ICT', short_name='ICT')
+    section = Section.objects.create(name=f'{prefix} Systems', department=department, short_name='SYS')
+    other_section = Section.objects.create(name=f'{prefix} Networks', department=department, short_name='NET')
+    unit = Unit.objects.create(name=f'{prefix} Audit', short_name='AU')
+    previous_year, _ = FinancialYear.objects.get_or_create(start_date=datetime.date(2024, 7, 1), end_date=datetime.date(2025, 6, 30))
+    financial_year, _ = FinancialYear.objects.get_or_create(start_date=datetime.date(2025, 7, 1), end_date=datetime.date(2026, 6, 30))
+
+    for i in range(rows):
+        for owner in ({'section': section}, {'section': other_section}, {'unit': unit}):
+            scope = next(iter(owner.values()))
+            for year in (previous_year, financial_year):
+                activity = Activity.objects.create(name=f'{prefix} activity {i} {scope.name}', financial_year=year, **owner)
+                Budget.objects.create(financial_year=year, activity=activity, budget_type='Own Source', amount=1000)
+                Budget.objects.create(financial_year=year, activity=activity, budget_type='Other Charges', amount=500)
+                Expenditure.objects.create(financial_year=year, activity=activity, budget_type='Own Source',
+                                           amount=100, expenditure_date=year.start_date + datetime.timedelta(days=30))
+            service = SupportService.objects.create(name=f'{prefix} service {i} {scope.name}', activities=activity)
+            system = SupportedSystem.objects.create(name=f'{prefix} system {i} {scope.name}')
+            statistic_type = StatisticType.objects.create(name=f'{prefix} statistic {i} {scope.name}', activities=activity)
+            user = CustomUser.objects.create_user(f'{prefix}-{i}-{scope.short_name}@example.com'.lower(), None,
+                                                  full_name=f'{prefix} user {i}', department=department if 'section' in owner else None,
+                                                  **owner)
+            for status in ('open', 'in_progress', 'resolved', 'closed'):
+                SupportTicket.objects.create(user_type='internal', internal_user_name=user.full_name, system=system,
+                                             service=service, description=f'{prefix} {status} ticket ' * 20,
+                                             status=status, resolved_by=user)
+            StatisticsRecord.objects.create(title=f'{prefix} statistics {i}', statistic_type=statistic_type, description='Monthly figures',
+                                            prepared_by=user, start_date=financial_year.start_date,
+                                            end_date=financial_year.start_date + datetime.timedelta(days=30))
+    return {
+        'department': department, 'section': section, 'unit': unit,
+        'financial_year': financial_year, 'previous_year': previous_year,
+    }
+
+
+def staff_user(email, **scope):
+    user = CustomUser.objects.create_user(email, None, full_name=email, is_staff=True, **scope)
+    user.user_permissions.set(
+        Permission.objects.filter(content_type__app_label__in=STAFF_APPS).exclude(codename='view_all_activities')
+    )
+    return user
+
+
+class QueryBudgetTestCase(TestCase):
+    rows = 3
+    grow_rows = 4
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.data = seed_dataset(cls.rows)
+        cls.superuser = CustomUser.objects.create_superuser('admin@example.com', None, full_name='Admin')
+        cls.section_user = staff_user('section@example.com', department=cls.data['department'], section=cls.data['section'])
+        cls.unit_user = staff_user('unit@example.com', unit=cls.data['unit'])
+
+    def users(self):
+        return [self.superuser, self.section_user, self.unit_user]
+
+    def count_queries(self, user, url, method='get', data=None):
+        cache.clear()
+        self.client.force_login(user)
+        with CaptureQueriesContext(connection) as queries:
+            response = getattr(self.client, method)(url, data)
+        self.assertEqual(response.status_code, 200, f"{url} as {user}")
+        return len(queries)
+
+    def assertQueryBudget(self, url, budget, method='get', data=None, users=None):
+        """
+        Load `url` as every user, grow the dataset and load it again: the query
+        count must stay within `budget` and must not change with the row count.
+        `url` may be a callable returning the URL, for pages tied to a row.
+        """
+        users = users or self.users()
+        resolve = url if callable(url) else (lambda: url)
+        for user in users:
+            self.count_queries(user, resolve(), method, data)  # warm per-process caches (content types, templates)
+        before = {user.email: self.count_queries(user, resolve(), method, data) for user in users}
+        seed_dataset(self.grow_rows, prefix='grow')
+        after = {user.email: self.count_queries(user, resolve(), method, data) for user in users}
+        for email, count in after.items():
+            self.assertLessEqual(count, budget, f"{resolve()} as {email} ran {count} queries (budget {budget})")
+        self.assertEqual(before, after, f"{resolve()} query count grows with the number of rows")
+
+    def assertFacetsCached(self, url, users=None):
+        """Once its facet counts are cached, a changelist with facets runs no more queries than one without."""
+        for user in users or self.users():
+            plain = self.count_queries(user, url)
+            self.count_queries(user, f'{url}?_facets=1')
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(url, {'_facets': '1'})
+            self.assertEqual(response.status_code, 200)
+            self.assertLessEqual(len(queries), plain, f"{url} with cached facets as {user.email}")
@@ -21,9 +21,13 @@ from django.contrib import admin
 from django.urls import path, include
 from django.conf.urls.static import static
 
+from monitoring.views import metrics_view
+
 urlpatterns = [
 
     path('ai/', include('services.urls')),
+    path('api/report/', include('report.urls')),
+    path('metrics/', metrics_view, name='metrics'),
     path('', admin.site.urls),
 ]
 
@@ -0,0 +1,82 @@
+from collections import Counter
+
+from django.contrib import admin
+from django.core.exceptions import PermissionDenied
+from django.http import Http404, HttpResponse
+from django.template.response import TemplateResponse
+from django.urls import path
+
+from .models import RequestProfile
+from .profiling import load_profile, load_stacks, stored_profiles
+
+TOP_FRAMES = 30
+
+
+def frame_totals(folded):
+    """(self, total) sample counts per frame from folded stacks, heaviest total first."""
+    own, total = Counter(), Counter()
+    for line in folded.splitlines():
+        stack, _, count = line.rpartition(' ')
+        frames = stack.split(';')
+        own[frames[-1]] += int(count)
+        for frame in set(frames):
+            total[frame] += int(count)
+    return [{'frame': frame, 'self': own[frame], 'total': count} for frame, count in total.most_common()]
+
+
+@admin.register(RequestProfile)
+class RequestProfileAdmin(admin.ModelAdmin):
+    def has_module_permission(self, request):
+        return request.user.is_superuser
+
+    def has_view_permission(self, request, obj=None):
+        return request.user.is_superuser
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+    def get_urls(self):
+        custom_urls = [
+            path('<str:profile_id>/folded/', self.admin_site.admin_view(self.folded_view), name='monitoring_profile_folded'),
+            path('<str:profile_id>/', self.admin_site.admin_view(self.detail_view), name='monitoring_profile_detail'),
+        ]
+        return custom_urls + super().get_urls()
+
+    def context(self, request, title, **extra):
+        return {**self.admin_site.each_context(request), 'title': title, 'opts': self.model._meta, **extra}
+
+    def changelist_view(self, request, extra_context=None):
+        if not self.has_view_permission(request):
+            raise PermissionDenied
+        return TemplateResponse(request, 'admin/profile_list.html', self.context(
+            request, 'Request Profiles', profiles=stored_profiles(),
+        ))
+
+    def load(self, request, profile_id):
+        if not self.has_view_permission(request):
+            raise PermissionDenied
+        try:
+            profile, folded = load_profile(profile_id), load_stacks(profile_id)
+        except ValueError:
+            raise Http404
+        if profile is None or folded is None:
+            raise Http404
+        return profile, folded
+
+    def detail_view(self, request, profile_id):
+        profile, folded = self.load(request, profile_id)
+        return TemplateResponse(request, 'admin/profile_detail.html', self.context(
+            request, f"Profile {profile_id}", profile=profile, frames=frame_totals(folded)[:TOP_FRAMES],
+        ))
+
+    def folded_view(self, request, profile_id):
+        _, folded = self.load(request, profile_id)
+        response = HttpResponse(folded, content_type='text/plain; charset=utf-8')
+        response['Content-Disposition'] = f'attachment; filename="{profile_id}.folded"'
+        return response
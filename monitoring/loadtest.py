@@ -0,0 +1,278 @@
+"""
+Mixed-workload load test against a running server.
+
+`seed` fills a disposable database with a section and a unit of activities,
+services and tickets, and one scoped staff login per simulated user, and
+returns the plan (users, ticket ids, report parameters) the clients work from. Each
+`Client` is one member of staff with their own session: it logs in through
+the admin login form and then, until the deadline, picks operations from the
+weighted `WORKLOAD` (ticket adds and edits, filtered changelists, sub-service
+lookups, on-screen reports and Word exports) and times them. `summarise`
+turns the timings into throughput, latency percentiles and error rates per
+operation.
+
+Redirects are not followed, so a successful admin save is timed without the
+changelist it redirects to. A 429 from admission control is counted as
+rejected rather than as an error.
+"""
+
+import http.cookiejar
+import random
+import secrets
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+
+# operation: (relative weight, expected status)
+WORKLOAD = {
+    'ticket_add': (3, 302),
+    'ticket_edit': (2, 302),
+    'ticket_changelist': (4, 200),
+    'get_sub_services': (4, 200),
+    'generate_report': (1, 200),
+    'export_word': (1, 200),
+}
+
+# Apps whose permissions the simulated staff get, as members of a section or unit would.
+STAFF_APPS = ('services', 'activities', 'office', 'authentication', 'report')
+
+FILTERS = [
+    {},
+    {'status__exact': 'open'},
+    {'status__exact': 'resolved', 'o': '-2'},
+    {'submitted_at__gte': '2025-07-01'},
+    {'status__exact': 'in_progress', 'p': '1'},
+]
+
+
+def seed(users, rows):
+    """
+    Create a section and a unit with `rows` activities each (budget, spending,
+    a service with sub-services, a system and a ticket per status) and `users`
+    staff logins scoped to one or the other; returns the plan the clients need.
+    """
+    import datetime
+
+    from django.contrib.auth.models import Permission
+    from django.db import transaction
+
+    from activities.models import Activity, Budget, Expenditure, FinancialYear
+    from authentication.models import CustomUser
+    from office.models import Department, Section, Unit
+    from services.models import SubService, SupportedSystem, SupportService, SupportTicket
+
+    start = FinancialYear.start_for(datetime.date.today())
+    with transaction.atomic():
+        financial_year = FinancialYear.objects.create(start_date=start, end_date=start.replace(year=start.year + 1) - datetime.timedelta(days=1))
+        department = Department.objects.create(name='Load ICT', short_name='ICT')
+        section = Section.objects.create(name='Load Systems', department=department, short_name='SYS')
+        unit = Unit.objects.create(name='Load Audit', short_name='AU')
+        for owner in ({'section': section}, {'unit': unit}):
+            scope = next(iter(owner.values()))
+            for i in range(rows):
+                activity = Activity.objects.create(name=f'Load activity {i} {scope.name}', financial_year=financial_year, **owner)
+                Budget.objects.create(financial_year=financial_year, activity=activity, budget_type='Own Source', amount=1000)
+                Expenditure.objects.create(financial_year=financial_year, activity=activity, budget_type='Own Source',
+                                           amount=100, expenditure_date=start + datetime.timedelta(days=30))
+                service = SupportService.objects.create(name=f'Load service {i} {scope.name}', activities=activity)
+                SubService.objects.bulk_create(SubService(service=service, name=f'Load sub-service {j}') for j in range(3))
+                system = SupportedSystem.objects.create(name=f'Load system {i} {scope.name}')
+                for status in ('open', 'in_progress', 'resolved', 'closed'):
+                    SupportTicket.objects.create(user_type='internal', internal_user_name='Load test', system=system,
+                                                 service=service, description=f'Load {status} ticket ' * 20, status=status)
+
+        CustomUser.objects.create_superuser('load-admin@example.com', None, full_name='Load test admin')
+        permissions = Permission.objects.filter(content_type__app_label__in=STAFF_APPS).exclude(codename='view_all_activities')
+        logins = []
+        for i in range(users):
+            email = f'load-{i}@example.com'
+            scope = {'unit': unit} if i % 2 else {'department': department, 'section': section}
+            password = secrets.token_urlsafe(16)
+            user = CustomUser.objects.create_user(email, password, full_name=email, is_staff=True, **scope)
+            user.user_permissions.set(permissions)
+            report = {'grouping': 'unit', 'unit': unit.pk} if i % 2 else {'grouping': 'section', 'section': section.pk}
+            logins.append({
+                'email': email,
+                'password': password,
+                'report': {
+                    **report,
+                    'financial_year': financial_year.pk,
+                    'start_date': financial_year.start_date.isoformat(),
+                    'end_date': financial_year.end_date.isoformat(),
+                },
+            })
+    return {
+        'users': logins,
+        'tickets': list(SupportTicket.objects.values_list('pk', flat=True)),
+        'services': list(SupportService.objects.values_list('pk', flat=True)),
+        'systems': list(SupportedSystem.objects.values_list('pk', flat=True)),
+    }
+
+
+def parse_mix(text):
+    """'ticket_add=5,export_word=0' -> WORKLOAD weights with those operations changed."""
+    weights = {name: weight for name, (weight, _) in WORKLOAD.items()}
+    for item in filter(None, (part.strip() for part in (text or '').split(','))):
+        name, _, weight = item.partition('=')
+        if name not in WORKLOAD:
+            raise ValueError(f"Unknown operation {name!r}; choose from {', '.join(WORKLOAD)}")
+        try:
+            weights[name] = int(weight)
+        except ValueError:
+            raise ValueError(f"Weight of {name} must be a whole number, not {weight!r}")
+        if weights[name] < 0:
+            raise ValueError(f"Weight of {name} cannot be negative")
+    if not any(weights.values()):
+        raise ValueError("At least one operation needs a positive weight")
+    return weights
+
+
+class NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        return None
+
+
+class Client:
+    """One simulated member of staff with their own session cookie."""
+
+    def __init__(self, base_url, login, plan, timeout=60):
+        self.base_url = base_url.rstrip('/')
+        self.login = login
+        self.plan = plan
+        self.timeout = timeout
+        self.cookies = http.cookiejar.CookieJar()
+        self.opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(self.cookies), NoRedirect)
+
+    def csrf_token(self):
+        return next((cookie.value for cookie in self.cookies if cookie.name == 'csrftoken'), '')
+
+    def request(self, path, data=None, params=None):
+        """(status, body) of a GET, or of a POST when `data` is given; HTTP errors are returned, not raised."""
+        url = self.base_url + path + (f'?{urllib.parse.urlencode(params)}' if params else '')
+        body = None
+        if data is not None:
+            body = urllib.parse.urlencode({**data, 'csrfmiddlewaretoken': self.csrf_token()}, doseq=True).encode()
+        request = urllib.request.Request(url, data=body, headers={'Referer': self.base_url + path})
+        try:
+            with self.opener.open(request, timeout=self.timeout) as response:
+                return response.status, response.read()
+        except urllib.error.HTTPError as error:
+            with error:
+                return error.code, error.read()
+
+    def sign_in(self):
+        self.request('/login/')
+        status, _ = self.request('/login/', {
+            'username': self.login['email'], 'password': self.login['password'], 'next': '/',
+        })
+        if status != 302:
+            raise RuntimeError(f"Could not log in as {self.login['email']} (HTTP {status})")
+
+    def ticket_fields(self):
+        return {
+            'user_type': 'internal',
+            'internal_user_name': self.login['email'],
+            'system': random.choice(self.plan['systems']),
+            'service': random.choice(self.plan['services']),
+            'description': f'Load test ticket {secrets.token_hex(4)}',
+            'status': random.choice(['open', 'in_progress', 'resolved']),
+        }
+
+    def ticket_add(self):
+        return self.request('/services/supportticket/add/', self.ticket_fields())
+
+    def ticket_edit(self):
+        return self.request(f"/services/supportticket/{random.choice(self.plan['tickets'])}/change/", self.ticket_fields())
+
+    def ticket_changelist(self):
+        return self.request('/services/supportticket/', params=random.choice(FILTERS))
+
+    def get_sub_services(self):
+        return self.request('/ai/get_sub_services/', params={'service': random.choice(self.plan['services'])})
+
+    def generate_report(self):
+        return self.request('/report/report/generate-report/', self.login['report'])
+
+    def export_word(self):
+        return self.request('/report/report/export-word/', self.login['report'])
+
+    def run(self, weights, deadline, results):
+        """Run weighted random operations until `deadline`, appending (operation, status, seconds) to `results`."""
+        operations = [name for name in weights if weights[name]]
+        choices = [weights[name] for name in operations]
+        while time.monotonic() < deadline:
+            operation = random.choices(operations, choices)[0]
+            started = time.perf_counter()
+            try:
+                status, _ = getattr(self, operation)()
+            except OSError:
+                status = None  # connection refused, reset or timed out
+            results.append((operation, status, time.perf_counter() - started))
+
+
+def run_clients(base_url, plan, weights, duration):
+    """Log every planned user in, then let them all run for `duration` seconds; returns (results, elapsed)."""
+    clients = [Client(base_url, login, plan) for login in plan['users']]
+    for client in clients:
+        client.sign_in()
+    results = []
+    deadline = time.monotonic() + duration
+    threads = [threading.Thread(target=client.run, args=(weights, deadline, results), daemon=True) for client in clients]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results, time.perf_counter() - started
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    rank = max(1, -(-len(sorted_values) * fraction // 1))
+    return sorted_values[int(rank) - 1]
+
+
+def summarise_group(samples, elapsed, expected=None):
+    durations = sorted(seconds for _, _, seconds in samples)
+    rejected = sum(1 for _, status, _ in samples if status == 429)
+    if expected is None:
+        errors = sum(1 for _, status, _ in samples if status is None or status >= 400 and status != 429)
+    else:
+        errors = sum(1 for _, status, _ in samples if status not in (expected, 429))
+
+    statuses = {}
+    for _, status, _ in samples:
+        statuses[str(status or 'failed')] = statuses.get(str(status or 'failed'), 0) + 1
+
+    def ms(value):
+        return None if value is None else round(value * 1000, 1)
+
+    return {
+        'requests': len(samples),
+        'throughput_rps': round(len(samples) / elapsed, 2) if elapsed else None,
+        'errors': errors,
+        'error_rate': round(errors / len(samples), 4) if samples else 0,
+        'rejected': rejected,
+        'statuses': dict(sorted(statuses.items())),
+        'p50_ms': ms(percentile(durations, 0.50)),
+        'p95_ms': ms(percentile(durations, 0.95)),
+        'p99_ms': ms(percentile(durations, 0.99)),
+        'max_ms': ms(durations[-1] if durations else None),
+    }
+
+
+def summarise(results, elapsed):
+    """Totals and per-operation throughput, latency percentiles and error rates."""
+    by_operation = {}
+    for sample in results:
+        by_operation.setdefault(sample[0], []).append(sample)
+    endpoints = {name: summarise_group(samples, elapsed, WORKLOAD[name][1])
+                 for name, samples in sorted(by_operation.items())}
+    total = summarise_group(results, elapsed)
+    total['errors'] = sum(endpoint['errors'] for endpoint in endpoints.values())
+    total['error_rate'] = round(total['errors'] / len(results), 4) if results else 0
+    return {'elapsed_seconds': round(elapsed, 2), 'total': total, 'endpoints': endpoints}
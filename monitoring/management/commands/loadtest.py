@@ -0,0 +1,134 @@
+import json
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from monitoring.loadtest import WORKLOAD, parse_mix, run_clients, summarise
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_server(base_url, server, timeout):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            return False
+        try:
+            with urllib.request.urlopen(f'{base_url}/login/', timeout=2):
+                return True
+        except urllib.error.HTTPError:
+            return True
+        except OSError:
+            time.sleep(0.2)
+    return False
+
+
+class Command(BaseCommand):
+    help = (
+        "Start the app on a scratch database, drive it with concurrent simulated staff (ticket entry, "
+        "changelists, sub-service lookups, reports and Word exports) and print per-operation throughput, "
+        "p50/p95/p99 latency and error rates as JSON."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=8, help="Concurrent simulated staff.")
+        parser.add_argument('--duration', type=float, default=30, help="Seconds of load after everyone has logged in.")
+        parser.add_argument('--rows', type=int, default=5, help="Activities seeded for each of the section and the unit.")
+        parser.add_argument('--database-url', default='',
+                            help="URL of an empty, disposable database, e.g. a local MySQL-compatible server "
+                                 "(default: a temporary SQLite file). It is migrated and seeded.")
+        parser.add_argument('--mix', default='',
+                            help=f"Operation weights to change, e.g. 'export_word=3,ticket_add=0'. "
+                                 f"Operations: {', '.join(WORKLOAD)}.")
+        parser.add_argument('--port', type=int, default=0, help="Port for the server (default: any free port).")
+        parser.add_argument('--output', help="Also write the results to this file.")
+
+    def handle(self, *args, **options):
+        if options['users'] < 1 or options['duration'] <= 0:
+            raise CommandError("--users and --duration must be positive.")
+        try:
+            weights = parse_mix(options['mix'])
+        except ValueError as error:
+            raise CommandError(error)
+        database_url = options['database_url']
+        if database_url and database_url == os.environ.get('DATABASE_URL'):
+            raise CommandError("Refusing to seed the database this project is configured to use.")
+
+        workdir = tempfile.mkdtemp(prefix='isd-loadtest-')
+        env = {
+            **os.environ,
+            # Writers wait for SQLite's lock instead of failing at once with "database is locked".
+            'DATABASE_URL': database_url or (f"sqlite:///{os.path.join(workdir, 'loadtest.sqlite3')}"
+                                             "?timeout=30&transaction_mode=IMMEDIATE"),
+            'DATABASE_URL_REPLICA': '',
+            'METRICS_DIR': os.path.join(workdir, 'metrics'),
+            'PROFILE_SAMPLE_RATE': '0',
+        }
+        server = None
+        try:
+            self.stderr.write("Migrating and seeding the load test database...")
+            self.manage(env, 'migrate', '--noinput')
+            plan_path = os.path.join(workdir, 'plan.json')
+            self.manage(env, 'shell', '-c', (
+                "import json; from monitoring.loadtest import seed; "
+                f"json.dump(seed({options['users']}, {options['rows']}), open({plan_path!r}, 'w'))"
+            ))
+            with open(plan_path) as f:
+                plan = json.load(f)
+
+            port = options['port'] or free_port()
+            base_url = f'http://127.0.0.1:{port}'
+            log = open(os.path.join(workdir, 'server.log'), 'w')
+            server = subprocess.Popen(
+                [sys.executable, 'manage.py', 'runserver', '--noreload', f'127.0.0.1:{port}'],
+                cwd=settings.BASE_DIR, env=env, stdout=log, stderr=subprocess.STDOUT,
+            )
+            if not wait_for_server(base_url, server, timeout=30):
+                log.flush()
+                with open(log.name) as f:
+                    raise CommandError(f"The server did not start:\n{f.read()[-2000:]}")
+
+            self.stderr.write(f"Running {options['users']} users for {options['duration']:g}s against {base_url}...")
+            try:
+                results, elapsed = run_clients(base_url, plan, weights, options['duration'])
+            except RuntimeError as error:
+                raise CommandError(error)
+        finally:
+            if server is not None:
+                server.terminate()
+                server.wait(timeout=10)
+                log.close()
+            shutil.rmtree(workdir, ignore_errors=True)
+
+        report = {
+            'users': options['users'],
+            'duration_seconds': options['duration'],
+            'database': 'sqlite' if not database_url else database_url.split(':', 1)[0],
+            'weights': weights,
+            **summarise(results, elapsed),
+        }
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(output + '\n')
+        self.stdout.write(output)
+
+    def manage(self, env, *args):
+        result = subprocess.run([sys.executable, 'manage.py', *args], cwd=settings.BASE_DIR, env=env,
+                                capture_output=True, text=True)
+        if result.returncode != 0:
+            raise CommandError(f"manage.py {args[0]} failed:\n{result.stderr[-2000:]}")
+        return result
@@ -0,0 +1,223 @@
+"""
+Prometheus metrics shared by every worker process.
+
+Each process writes its own values into memory-mapped files in
+``METRICS_DIR`` (``counters-<pid>.db`` and ``gauges-<pid>.db``); updating a
+value is a dict lookup and a ``struct.pack_into`` under a per-process lock,
+with no system call. The ``/metrics`` view reads every file and adds the
+values up, so the output covers all workers on the host. Counters and
+histograms of workers that have exited are kept (they are cumulative);
+gauges are only read from live processes. Empty ``METRICS_DIR`` when
+deploying, as restarted workers would otherwise add to stale totals.
+
+A file is an 8-byte header holding the number of bytes in use, followed by
+entries of a 4-byte key length, the UTF-8 key padded to 8 bytes and an 8-byte
+float. The header is written after the entry, so readers never see half an
+entry.
+"""
+
+import bisect
+import glob
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+
+INITIAL_SIZE = 1 << 16
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+# name: (type, help, histogram buckets)
+METRICS = {
+    'isd_http_requests_total': ('counter', "HTTP requests by view, method and status.", None),
+    'isd_http_request_duration_seconds': ('histogram', "HTTP request latency by view.", LATENCY_BUCKETS),
+    'isd_http_request_db_queries': ('histogram', "SQL queries per HTTP request by view.", QUERY_BUCKETS),
+    'isd_http_requests_in_flight': ('gauge', "HTTP requests being processed.", None),
+    'isd_report_step_duration_seconds': ('histogram', "Duration of report generation and export steps.", LATENCY_BUCKETS),
+    'isd_cache_requests_total': ('counter', "Cache lookups by cache and result (hit or miss).", None),
+}
+
+
+class MmapStore:
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.positions = {}
+        self.file = open(path, 'a+b')
+        if os.fstat(self.file.fileno()).st_size < INITIAL_SIZE:
+            self.file.truncate(INITIAL_SIZE)
+        self.map = mmap.mmap(self.file.fileno(), 0)
+        self.used = struct.unpack_from('q', self.map, 0)[0] or 8
+        for key, _, position in read_entries(self.map, self.used):
+            self.positions[key] = position
+
+    def _position(self, key):
+        position = self.positions.get(key)
+        if position is None:
+            encoded = key.encode()
+            padded = encoded + b' ' * (-(4 + len(encoded)) % 8)
+            size = 4 + len(padded) + 8
+            if self.used + size > len(self.map):
+                new_size = max(len(self.map) * 2, self.used + size)
+                self.map.close()
+                self.file.truncate(new_size)
+                self.map = mmap.mmap(self.file.fileno(), 0)
+            struct.pack_into(f'i{len(padded)}sd', self.map, self.used, len(encoded), padded, 0.0)
+            position = self.used + 4 + len(padded)
+            self.used += size
+            struct.pack_into('q', self.map, 0, self.used)
+            self.positions[key] = position
+        return position
+
+    def add(self, key, amount):
+        with self.lock:
+            position = self._position(key)
+            struct.pack_into('d', self.map, position, struct.unpack_from('d', self.map, position)[0] + amount)
+
+
+def read_entries(buffer, used):
+    """Yield (key, value, value position) for the entries of a store."""
+    position = 8
+    while position < used:
+        length = struct.unpack_from('i', buffer, position)[0]
+        key_end = position + 4 + length
+        value_position = key_end + (-(4 + length) % 8)
+        yield (bytes(buffer[position + 4:key_end]).decode(),
+               struct.unpack_from('d', buffer, value_position)[0], value_position)
+        position = value_position + 8
+
+
+def read_file(path):
+    with open(path, 'rb') as f:
+        data = f.read()
+    if len(data) < 8:
+        return {}
+    return {key: value for key, value, _ in read_entries(data, struct.unpack_from('q', data, 0)[0])}
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def store(kind):
+    """This process's store of `kind` ('counters' or 'gauges'), reopened after a fork or a METRICS_DIR change."""
+    path = os.path.join(settings.METRICS_DIR, f'{kind}-{os.getpid()}.db')
+    current = _stores.get(kind)
+    if current is None or current.path != path:
+        with _stores_lock:
+            current = _stores.get(kind)
+            if current is None or current.path != path:
+                os.makedirs(settings.METRICS_DIR, exist_ok=True)
+                current = _stores[kind] = MmapStore(path)
+    return current
+
+
+def metric_key(name, labels):
+    return json.dumps([name, sorted(labels.items())])
+
+
+def inc(name, amount=1, **labels):
+    store('counters').add(metric_key(name, labels), amount)
+
+
+def gauge_add(name, amount, **labels):
+    store('gauges').add(metric_key(name, labels), amount)
+
+
+def observe(name, value, **labels):
+    buckets = METRICS[name][2]
+    counters = store('counters')
+    # Only the first bucket the value fits in is stored; exposition makes them cumulative.
+    index = bisect.bisect_left(buckets, value)
+    le = str(float(buckets[index])) if index < len(buckets) else '+Inf'
+    counters.add(metric_key(f'{name}_bucket', {**labels, 'le': le}), 1)
+    counters.add(metric_key(f'{name}_sum', labels), value)
+    counters.add(metric_key(f'{name}_count', labels), 1)
+
+
+@contextmanager
+def timed(step):
+    """Record the duration of a report step in isd_report_step_duration_seconds."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe('isd_report_step_duration_seconds', time.perf_counter() - started, step=step)
+
+
+def record_cache(cache_name, hit):
+    inc('isd_cache_requests_total', cache=cache_name, result='hit' if hit else 'miss')
+
+
+def pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def collect():
+    """{key: value} summed over the counters of every process and the gauges of live ones."""
+    totals = {}
+    for path in glob.glob(os.path.join(settings.METRICS_DIR, '*-*.db')):
+        kind, _, pid = os.path.basename(path)[:-len('.db')].partition('-')
+        if kind == 'gauges' and not (pid.isdigit() and pid_alive(int(pid))):
+            continue
+        for key, value in read_file(path).items():
+            totals[key] = totals.get(key, 0) + value
+    return totals
+
+
+def format_value(value):
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    return '{%s}' % ','.join(
+        '%s="%s"' % (name, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for name, value in labels
+    )
+
+
+def exposition():
+    """All metrics in the Prometheus text format (version 0.0.4)."""
+    samples = {}
+    for key, value in collect().items():
+        name, labels = json.loads(key)
+        samples.setdefault(name, []).append((tuple(map(tuple, labels)), value))
+
+    lines = []
+    for name, (kind, help_text, bounds) in METRICS.items():
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {kind}')
+        if kind != 'histogram':
+            for labels, value in sorted(samples.get(name, [])):
+                lines.append(f'{name}{format_labels(labels)} {format_value(value)}')
+            continue
+
+        buckets = {}
+        for labels, value in samples.get(f'{name}_bucket', []):
+            series = tuple(label for label in labels if label[0] != 'le')
+            buckets.setdefault(series, {})[dict(labels)['le']] = value
+        sums = dict(samples.get(f'{name}_sum', []))
+        counts = dict(samples.get(f'{name}_count', []))
+        for series in sorted(counts):
+            cumulative = 0
+            found = buckets.get(series, {})
+            for le in [str(float(bound)) for bound in bounds] + ['+Inf']:
+                cumulative += found.get(le, 0)
+                lines.append(f'{name}_bucket{format_labels(series + (("le", le),))} {format_value(cumulative)}')
+            lines.append(f'{name}_sum{format_labels(series)} {format_value(sums.get(series, 0))}')
+            lines.append(f'{name}_count{format_labels(series)} {format_value(counts[series])}')
+    return '\n'.join(lines) + '\n'
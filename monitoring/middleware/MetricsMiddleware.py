@@ -0,0 +1,37 @@
+import time
+from contextlib import ExitStack
+
+from django.db import connections
+
+from monitoring import metrics
+from monitoring.profiling import QueryTimer
+
+
+class MetricsMiddleware:
+    """
+    Request count, latency and SQL queries per URL name, and the number of
+    requests in flight. Goes first in MIDDLEWARE so the latency covers the
+    whole middleware stack.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        queries = QueryTimer()
+        started = time.perf_counter()
+        metrics.gauge_add('isd_http_requests_in_flight', 1)
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(queries))
+                response = self.get_response(request)
+        finally:
+            metrics.gauge_add('isd_http_requests_in_flight', -1)
+
+        match = getattr(request, 'resolver_match', None)
+        view = match.view_name if match else 'unmatched'
+        metrics.inc('isd_http_requests_total', view=view, method=request.method, status=str(response.status_code))
+        metrics.observe('isd_http_request_duration_seconds', time.perf_counter() - started, view=view)
+        metrics.observe('isd_http_request_db_queries', queries.count, view=view)
+        return response
@@ -0,0 +1,76 @@
+import random
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+from django.utils import timezone
+
+from monitoring.profiling import QueryTimer, StackSampler, new_profile_id, save_profile
+
+PROFILE_PARAM = '_profile'
+PROFILE_HEADER = 'X-Profile'
+
+
+class ProfilingMiddleware:
+    """
+    Profile a request with the stack sampler when a superuser asks for it
+    (``?_profile=1`` or an ``X-Profile: 1`` header), or for a random
+    PROFILE_SAMPLE_RATE share of all requests. The profile id is returned in
+    the ``X-Profile-Id`` header. Only the view is profiled: the body of a
+    streaming response is produced after this middleware returns.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def trigger(self, request):
+        # Look at the flags before request.user, which costs a session and user query.
+        if request.GET.get(PROFILE_PARAM) and request.user.is_superuser:
+            return 'query'
+        if request.headers.get(PROFILE_HEADER) and request.user.is_superuser:
+            return 'header'
+        if settings.PROFILE_SAMPLE_RATE and random.random() < settings.PROFILE_SAMPLE_RATE:
+            return 'sampled'
+        return None
+
+    def __call__(self, request):
+        trigger = self.trigger(request)
+        if trigger is None:
+            return self.get_response(request)
+
+        if PROFILE_PARAM in request.GET:
+            # Keep the flag away from views that validate their query string (admin changelists do).
+            request.GET = request.GET.copy()
+            del request.GET[PROFILE_PARAM]
+            request.META['QUERY_STRING'] = request.GET.urlencode()
+
+        queries = QueryTimer()
+        started_at = timezone.now()
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(queries))
+            sampler = stack.enter_context(StackSampler(settings.PROFILE_INTERVAL))
+            response = self.get_response(request)
+        duration = time.perf_counter() - started
+
+        profile_id = new_profile_id()
+        save_profile({
+            'id': profile_id,
+            'started_at': started_at.isoformat(),
+            'method': request.method,
+            'path': request.get_full_path(),
+            'view': getattr(request.resolver_match, 'view_name', None),
+            'user': request.user.get_username() if request.user.is_authenticated else None,
+            'trigger': trigger,
+            'status': response.status_code,
+            'streaming': response.streaming,
+            'duration_ms': round(duration * 1000, 1),
+            'interval_ms': settings.PROFILE_INTERVAL * 1000,
+            'samples': sum(sampler.stacks.values()),
+            'sql_queries': queries.count,
+            'sql_ms': round(queries.seconds * 1000, 1),
+        }, sampler.stacks)
+        response['X-Profile-Id'] = profile_id
+        return response
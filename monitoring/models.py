@@ -0,0 +1,10 @@
+from django.db import models
+
+
+class RequestProfile(models.Model):
+    """Admin entry for the request profiles stored on disk by ProfilingMiddleware; there is no table."""
+
+    class Meta:
+        managed = False
+        verbose_name = 'Request Profile'
+        verbose_name_plural = 'Request Profiles'
@@ -0,0 +1,135 @@
+"""
+Opt-in stack-sampling profiler for single requests.
+
+While a profiled request runs, a background thread records the request
+thread's Python stack every ``PROFILE_INTERVAL`` seconds; identical stacks are
+counted, which gives collapsed-stack ("folded") output that flame graph tools
+read directly. SQL statements are counted and timed alongside. Each profile is
+written to ``PROFILE_DIR`` as ``<id>.json`` (request metadata) and
+``<id>.folded`` (the stacks); the newest ``PROFILE_KEEP`` are kept.
+"""
+
+import json
+import os
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+
+from django.conf import settings
+from django.utils import timezone
+
+PROFILE_ID_RE = re.compile(r'^[0-9]{8}T[0-9]{12}-[0-9a-f]{8}$')
+
+
+class StackSampler:
+    def __init__(self, interval, thread_id=None):
+        self.interval = interval
+        self.thread_id = thread_id or threading.get_ident()
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='profile-sampler', daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                stack.append(f"{frame.f_globals.get('__name__', '?')}:{frame.f_code.co_name}")
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+
+
+class QueryTimer:
+    """connection.execute_wrapper() that counts and times SQL statements."""
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.seconds += time.perf_counter() - started
+
+
+def collapsed(stacks):
+    """Folded stacks, one 'frame;frame;frame count' line each, heaviest first."""
+    return ''.join(f'{stack} {count}\n' for stack, count in sorted(stacks.items(), key=lambda item: -item[1]))
+
+
+def new_profile_id():
+    # Sorts by time, so the newest profiles are the last ids.
+    return f"{timezone.now():%Y%m%dT%H%M%S%f}-{uuid.uuid4().hex[:8]}"
+
+
+def profile_path(profile_id, extension='json'):
+    if not PROFILE_ID_RE.match(profile_id):
+        raise ValueError(f"Invalid profile id {profile_id!r}")
+    return os.path.join(settings.PROFILE_DIR, f'{profile_id}.{extension}')
+
+
+def write_atomic(path, text):
+    with open(f'{path}.tmp', 'w') as f:
+        f.write(text)
+    os.replace(f'{path}.tmp', path)
+
+
+def save_profile(metadata, stacks):
+    """Store a profile as <id>.folded (the stacks) and <id>.json (the metadata), then prune old ones."""
+    os.makedirs(settings.PROFILE_DIR, exist_ok=True)
+    write_atomic(profile_path(metadata['id'], 'folded'), collapsed(stacks))
+    write_atomic(profile_path(metadata['id']), json.dumps(metadata))
+    for old in list_profile_ids()[settings.PROFILE_KEEP:]:
+        for extension in ('json', 'folded'):
+            try:
+                os.remove(profile_path(old, extension))
+            except FileNotFoundError:
+                pass
+
+
+def list_profile_ids():
+    """Stored profile ids, newest first."""
+    try:
+        names = os.listdir(settings.PROFILE_DIR)
+    except FileNotFoundError:
+        return []
+    ids = [name[:-len('.json')] for name in names if name.endswith('.json')]
+    return sorted((i for i in ids if PROFILE_ID_RE.match(i)), reverse=True)
+
+
+def load_profile(profile_id):
+    """The stored metadata of a profile, or None when it does not exist."""
+    try:
+        with open(profile_path(profile_id)) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def load_stacks(profile_id):
+    """The folded stacks of a profile, or None when it does not exist."""
+    try:
+        with open(profile_path(profile_id, 'folded')) as f:
+            return f.read()
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def stored_profiles():
+    """Metadata of every stored profile, newest first."""
+    return [profile for profile in map(load_profile, list_profile_ids()) if profile is not None]
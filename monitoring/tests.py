@@ -0,0 +1,171 @@
+import datetime
+import json
+import os
+import tempfile
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from activities.models import Activity, Budget, FinancialYear
+from authentication.models import CustomUser
+from monitoring import metrics
+from monitoring.loadtest import parse_mix, percentile, summarise
+from monitoring.profiling import list_profile_ids, load_profile, load_stacks
+from office.models import Department, Section
+
+
+class ProfilingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.superuser = CustomUser.objects.create_superuser('admin@example.com', None, full_name='Admin')
+        cls.staff = CustomUser.objects.create_user('staff@example.com', None, full_name='Staff', is_staff=True)
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings = override_settings(PROFILE_DIR=directory.name, PROFILE_INTERVAL=0.001, PROFILE_KEEP=2)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def test_superuser_profiles_request(self):
+        self.client.force_login(self.superuser)
+        url = reverse('admin:services_supportticket_changelist')
+        response = self.client.get(url, {'_profile': '1', 'status__exact': 'open'})
+        self.assertEqual(response.status_code, 200)  # the flag does not reach the changelist's filters
+        profile_id = response['X-Profile-Id']
+
+        profile = load_profile(profile_id)
+        self.assertEqual(profile['path'], f'{url}?status__exact=open')
+        self.assertEqual(profile['trigger'], 'query')
+        self.assertGreater(profile['sql_queries'], 0)
+        for line in load_stacks(profile_id).splitlines():
+            stack, count = line.rsplit(' ', 1)
+            self.assertGreater(int(count), 0)
+
+        self.assertContains(self.client.get(reverse('admin:monitoring_requestprofile_changelist')), profile_id)
+        self.assertEqual(self.client.get(reverse('admin:monitoring_profile_detail', args=[profile_id])).status_code, 200)
+        folded = self.client.get(reverse('admin:monitoring_profile_folded', args=[profile_id]))
+        self.assertEqual(folded.content.decode(), load_stacks(profile_id))
+        self.assertEqual(self.client.get(reverse('admin:monitoring_profile_detail', args=['20250101T000000000000-nothere'])).status_code, 404)
+
+    def test_only_superusers_and_keeps_newest(self):
+        self.client.force_login(self.staff)
+        response = self.client.get(reverse('admin:index'), HTTP_X_PROFILE='1')
+        self.assertNotIn('X-Profile-Id', response)
+        self.assertEqual(self.client.get(reverse('admin:monitoring_requestprofile_changelist')).status_code, 403)
+
+        self.client.force_login(self.superuser)
+        ids = [self.client.get(reverse('admin:index'), HTTP_X_PROFILE='1')['X-Profile-Id'] for _ in range(3)]
+        self.assertEqual(sorted(list_profile_ids()), sorted(ids)[1:])
+
+
+class MetricsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.superuser = CustomUser.objects.create_superuser('admin@example.com', None, full_name='Admin')
+        department = Department.objects.create(name='ICT', short_name='ICT')
+        cls.section = Section.objects.create(name='Systems', department=department, short_name='SYS')
+        cls.financial_year = FinancialYear.objects.create(start_date=datetime.date(2025, 7, 1), end_date=datetime.date(2026, 6, 30))
+        activity = Activity.objects.create(name='Helpdesk', section=cls.section, financial_year=cls.financial_year)
+        Budget.objects.create(financial_year=cls.financial_year, activity=activity, budget_type='Own Source', amount=1000)
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        settings = override_settings(METRICS_DIR=directory.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def scrape(self):
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, 200)
+        return response.content.decode()
+
+    def test_request_metrics(self):
+        self.client.force_login(self.superuser)
+        for _ in range(2):
+            self.client.get(reverse('admin:services_supportticket_changelist'))
+        text = self.scrape()
+        view = 'admin:services_supportticket_changelist'
+        self.assertIn(f'isd_http_requests_total{{method="GET",status="200",view="{view}"}} 2', text)
+        self.assertIn(f'isd_http_request_duration_seconds_bucket{{view="{view}",le="+Inf"}} 2', text)
+        self.assertIn(f'isd_http_request_db_queries_count{{view="{view}"}} 2', text)
+        self.assertIn('isd_http_requests_in_flight 1', text)  # the scrape itself
+
+    def test_report_steps_and_cache(self):
+        self.client.force_login(self.superuser)
+        data = {
+            'grouping': 'section',
+            'section': self.section.pk,
+            'start_date': '2025-07-01',
+            'end_date': '2026-06-30',
+            'financial_year': self.financial_year.pk,
+        }
+        self.client.post(reverse('admin:export_report', args=['docx']), data)
+        text = self.scrape()
+        for step in ('financials', 'implementations', 'docx_build', 'docx_save', 'export_docx'):
+            self.assertIn(f'isd_report_step_duration_seconds_count{{step="{step}"}} 1', text)
+        self.assertIn('isd_cache_requests_total{cache="coalesced_response",result="miss"} 1', text)
+
+    def test_counters_of_all_processes_are_added(self):
+        metrics.inc('isd_cache_requests_total', cache='admin_facets', result='hit')
+        other = metrics.MmapStore(os.path.join(self.directory, 'counters-1.db'))  # a worker that has exited
+        for _ in range(5000):  # grows the file past its initial size
+            other.add(metrics.metric_key('isd_cache_requests_total', {'cache': 'admin_facets', 'result': 'hit'}), 1)
+        text = metrics.exposition()
+        self.assertIn('isd_cache_requests_total{cache="admin_facets",result="hit"} 5001', text)
+
+    def test_only_internal_clients(self):
+        self.assertEqual(self.client.get(reverse('metrics'), REMOTE_ADDR='10.1.2.3').status_code, 404)
+        with override_settings(METRICS_ALLOWED_NETWORKS=['10.0.0.0/8']):
+            self.assertEqual(self.client.get(reverse('metrics'), REMOTE_ADDR='10.1.2.3').status_code, 200)
+
+    def test_clients_behind_a_local_proxy(self):
+        def status(forwarded_for):
+            return self.client.get(reverse('metrics'), REMOTE_ADDR='127.0.0.1',
+                                   HTTP_X_FORWARDED_FOR=forwarded_for).status_code
+
+        self.assertEqual(status('203.0.113.9'), 404)
+        self.assertEqual(status('127.0.0.1, 203.0.113.9'), 404)  # the left-most entry is the client's own
+        self.assertEqual(status('not an address'), 404)
+        self.assertEqual(status(''), 200)
+        with override_settings(METRICS_TRUSTED_PROXIES=[]):
+            self.assertEqual(status('203.0.113.9'), 200)
+
+    def test_bearer_token(self):
+        with override_settings(METRICS_TOKEN='s3cret'):
+            self.assertEqual(self.client.get(reverse('metrics')).status_code, 404)
+            self.assertEqual(self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer wrong').status_code, 404)
+            response = self.client.get(reverse('metrics'), REMOTE_ADDR='203.0.113.9', HTTP_AUTHORIZATION='Bearer s3cret')
+            self.assertEqual(response.status_code, 200)
+
+
+class LoadTestTests(SimpleTestCase):
+    def test_summarise(self):
+        results = [('ticket_add', 302, i / 1000) for i in range(1, 101)]
+        results += [('ticket_add', 500, 0.2), ('export_word', 429, 0.01), ('export_word', None, 30.0)]
+        summary = summarise(results, elapsed=10)
+        ticket_add = summary['endpoints']['ticket_add']
+        self.assertEqual((ticket_add['requests'], ticket_add['errors'], ticket_add['rejected']), (101, 1, 0))
+        self.assertEqual((ticket_add['p50_ms'], ticket_add['p99_ms'], ticket_add['max_ms']), (51.0, 100.0, 200.0))
+        self.assertEqual(summary['endpoints']['export_word']['statuses'], {'429': 1, 'failed': 1})
+        self.assertEqual((summary['total']['requests'], summary['total']['errors']), (103, 2))
+        self.assertEqual(summary['total']['throughput_rps'], 10.3)
+        self.assertIsNone(percentile([], 0.5))
+
+    def test_parse_mix(self):
+        self.assertEqual(parse_mix('export_word=5, ticket_add=0')['export_word'], 5)
+        for mix in ('nope=1', 'export_word=x', 'export_word=-1',
+                    'ticket_add=0,ticket_edit=0,ticket_changelist=0,get_sub_services=0,generate_report=0,export_word=0'):
+            with self.assertRaises(ValueError, msg=mix):
+                parse_mix(mix)
+
+    def test_command(self):
+        out = StringIO()
+        call_command('loadtest', users=2, duration=1, rows=1, stdout=out, stderr=StringIO())
+        report = json.loads(out.getvalue())
+        self.assertGreater(report['total']['requests'], 0)
+        self.assertEqual(report['total']['errors'], 0, report['endpoints'])
@@ -0,0 +1,51 @@
+import ipaddress
+
+from django.conf import settings
+from django.http import Http404, HttpResponse
+from django.utils.crypto import constant_time_compare
+from django.views.decorators.http import require_GET
+
+from .metrics import exposition
+
+
+def in_networks(address, networks):
+    return any(address in ipaddress.ip_network(network) for network in networks)
+
+
+def client_address(request):
+    """
+    The address of the client: REMOTE_ADDR, or for a request relayed by a
+    proxy in METRICS_TRUSTED_PROXIES the right-most X-Forwarded-For entry that
+    is not itself a trusted proxy. Entries further left are client-supplied
+    and never trusted. None when an address does not parse.
+    """
+    forwarded = [part.strip() for part in request.META.get('HTTP_X_FORWARDED_FOR', '').split(',') if part.strip()]
+    address = None
+    for value in reversed(forwarded + [request.META.get('REMOTE_ADDR', '')]):
+        try:
+            address = ipaddress.ip_address(value)
+        except ValueError:
+            return None
+        if not in_networks(address, settings.METRICS_TRUSTED_PROXIES):
+            break
+    return address
+
+
+def internal_client(request):
+    address = client_address(request)
+    return address is not None and in_networks(address, settings.METRICS_ALLOWED_NETWORKS)
+
+
+def authorised_scraper(request):
+    if settings.METRICS_TOKEN:
+        scheme, _, token = request.META.get('HTTP_AUTHORIZATION', '').partition(' ')
+        return scheme.lower() == 'bearer' and constant_time_compare(token.strip(), settings.METRICS_TOKEN)
+    return internal_client(request)
+
+
+@require_GET
+def metrics_view(request):
+    """Prometheus scrape endpoint; needs METRICS_TOKEN when set, otherwise a client in METRICS_ALLOWED_NETWORKS."""
+    if not authorised_scraper(request):
+        raise Http404
+    return HttpResponse(exposition(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -1,12 +1,14 @@
 from django.contrib import admin
+from isd.facets import CachedFacetsMixin
 from .models import Department, Section, Unit
 
 class DepartmentAdmin(admin.ModelAdmin):
     list_display = ('name','short_name')
     search_fields = ('name','short_name')
 
-class SectionAdmin(admin.ModelAdmin):
+class SectionAdmin(CachedFacetsMixin, admin.ModelAdmin):
     list_display = ('name', 'department', 'short_name')
+    list_select_related = ('department',)
     search_fields = ('name','department', 'short_name')
     list_filter = ('department','short_name')
 
@@ -8,11 +8,19 @@ class Department(models.Model):
         return self.name
 
 
+class SectionManager(models.Manager):
+    # __str__ includes the department name, so always fetch it with the section.
+    def get_queryset(self):
+        return super().get_queryset().select_related('department')
+
+
 class Section(models.Model):
     name = models.CharField(max_length=255)
     department = models.ForeignKey(Department, related_name='sections', on_delete=models.CASCADE)
     short_name = models.CharField(max_length=50, null=True)
 
+    objects = SectionManager()
+
 
     def __str__(self):
         return f"{self.department.name} - {self.name}"
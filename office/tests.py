@@ -1,3 +1,17 @@
-from django.test import TestCase
+from django.urls import reverse
 
-# Create your tests here.
+from isd.testing import QueryBudgetTestCase
+
+
+class SectionAdminQueryBudgetTests(QueryBudgetTestCase):
+    def test_changelist(self):
+        self.assertQueryBudget(reverse('admin:office_section_changelist'), 10)
+
+    def test_changelist_facets(self):
+        self.assertFacetsCached(reverse('admin:office_section_changelist'))
+
+    def test_add_form(self):
+        self.assertQueryBudget(reverse('admin:office_section_add'), 10)
+
+    def test_change_form(self):
+        self.assertQueryBudget(lambda: reverse('admin:office_section_change', args=[self.data['section'].pk]), 10)
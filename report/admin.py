@@ -1,21 +1,25 @@
-from io import BytesIO
-
 from django.contrib import admin
 from django import forms
-from django.db.models import Sum
+from django.conf import settings
+from django.core.cache import cache
+from django.shortcuts import get_object_or_404
 from django.urls import path
 from django.http import HttpResponse
+from django.utils.http import urlencode
 from django.template.loader import render_to_string
+from django.template.response import TemplateResponse
 import datetime
-from docx import Document
-from docx.shared import Inches
-from docx.oxml.ns import qn
-from docx.oxml import OxmlElement
-from django.http import HttpResponse
 
-from activities.models import FinancialYear, Activity, Budget, Expenditure
-from office.models import Unit, Section
-from services.models import SupportService, SupportTicket, StatisticType, StatisticsRecord
+from activities.models import FinancialYear, Activity
+from isd.admission import admission_controlled
+from isd.routers import read_from_replica, use_replica
+from monitoring.metrics import record_cache, timed
+from office.models import Department, Unit, Section
+from report.comparison import comparison_periods, comparison_rows
+from report.exporters import get_exporter
+from report.freshness import last_modified
+from report.projection import STATUS_CHOICES, cached_projection, current_financial_year
+from report.queries import activity_implementations, build_report
 from django.db import models
 class Report(Activity):
     class Meta:
@@ -23,15 +27,22 @@ class Report(Activity):
         verbose_name = 'Activity Report'
         verbose_name_plural = 'Activity Reports'
 
+class ReportPeriodForm(forms.Form):
+    start_date = forms.DateField(required=True)
+    end_date = forms.DateField(required=True)
+
+
 class ReportForm(forms.Form):
     UNIT_SECTION_CHOICES = [
         ('unit', 'By Unit'),
         ('section', 'By Section'),
+        ('department', 'By Department'),
     ]
 
     grouping = forms.ChoiceField(choices=UNIT_SECTION_CHOICES, required=True)
     unit = forms.ModelChoiceField(queryset=Unit.objects.all(), required=False)
     section = forms.ModelChoiceField(queryset=Section.objects.all(), required=False)  # Fixed: changed models to forms
+    department = forms.ModelChoiceField(queryset=Department.objects.all(), required=False)
     start_date = forms.DateField(required=True, widget=forms.DateInput(attrs={'type': 'date'}))
     end_date = forms.DateField(required=True, widget=forms.DateInput(attrs={'type': 'date'}))
     financial_year = forms.ModelChoiceField(queryset=FinancialYear.objects.all(), required=True)
@@ -46,6 +57,8 @@ class ReportForm(forms.Form):
             raise forms.ValidationError("Please select a unit when grouping by unit")
         if grouping == 'section' and not section:
             raise forms.ValidationError("Please select a section when grouping by section")
+        if grouping == 'department' and not cleaned_data.get('department'):
+            raise forms.ValidationError("Please select a department when grouping by department")
 
         start_date = cleaned_data.get('start_date')
         end_date = cleaned_data.get('end_date')
@@ -55,23 +68,37 @@ class ReportForm(forms.Form):
 
         return cleaned_data
 
-def set_cell_width(cell, width):  # width must be Inches object or float inches
-    tc = cell._tc
-    tcPr = tc.get_or_add_tcPr()
-    # Remove existing width tags
-    for child in tcPr.findall(qn('w:tcW')):
-        tcPr.remove(child)
-    w = OxmlElement('w:tcW')
-    w.set(qn('w:type'), 'dxa')
+class ComparisonForm(forms.Form):
+    PERIOD_CHOICES = [
+        ('year', 'Financial years'),
+        ('quarter', 'Quarters'),
+    ]
 
-    # If width is Inches, convert to dxa; if float assume inches
-    if hasattr(width, 'inches'):
-        width_value = int(width.inches * 1440)
-    else:
-        width_value = int(width * 1440)  # width is float inches
+    grouping = forms.ChoiceField(choices=ReportForm.UNIT_SECTION_CHOICES, required=True)
+    unit = forms.ModelChoiceField(queryset=Unit.objects.all(), required=False)
+    section = forms.ModelChoiceField(queryset=Section.objects.all(), required=False)
+    department = forms.ModelChoiceField(queryset=Department.objects.all(), required=False)
+    period_type = forms.ChoiceField(choices=PERIOD_CHOICES, initial='year')
+    financial_years = forms.ModelMultipleChoiceField(queryset=FinancialYear.objects.order_by('-start_date'), required=True)
+
+    def clean(self):
+        cleaned_data = super().clean()
+        grouping = cleaned_data.get('grouping')
+        if grouping and not cleaned_data.get(grouping):
+            raise forms.ValidationError(f"Please select a {grouping} when grouping by {grouping}")
+
+        years = cleaned_data.get('financial_years')
+        if cleaned_data.get('period_type') == 'year' and years is not None and len(years) < 2:
+            raise forms.ValidationError("Select at least two financial years to compare")
+        return cleaned_data
+
+
+class ProjectionForm(forms.Form):
+    financial_year = forms.ModelChoiceField(queryset=FinancialYear.objects.order_by('-start_date'), required=True)
+    status = forms.ChoiceField(choices=[('', 'All')] + list(STATUS_CHOICES), required=False)
+    as_of = forms.DateField(required=False, label="As of", help_text="Defaults to today.",
+                            widget=forms.DateInput(attrs={'type': 'date'}))
 
-    w.set(qn('w:w'), str(width_value))
-    tcPr.append(w)
 
 class ReportAdmin(admin.ModelAdmin):
     change_list_template = 'admin/report_change_list.html'
@@ -86,10 +113,18 @@ class ReportAdmin(admin.ModelAdmin):
         return False
 
     def get_urls(self):
+        def heavy(view):
+            # Report jobs share one pool of worker slots; see isd.admission.
+            return self.admin_site.admin_view(admission_controlled('report', version=last_modified)(read_from_replica(view)))
+
         urls = super().get_urls()
         custom_urls = [
-            path('generate-report/', self.admin_site.admin_view(self.generate_report), name='generate_report'),
-            path('export-word/', self.admin_site.admin_view(self.export_word), name='export_word'),
+            path('generate-report/', heavy(self.generate_report), name='generate_report'),
+            path('export-word/', heavy(self.export_word), name='export_word'),
+            path('export/<str:fmt>/', heavy(self.export_report), name='export_report'),
+            path('compare/', heavy(self.compare_report), name='compare_report'),
+            path('projection/', heavy(self.projection_report), name='projection_report'),
+            path('fragment/<int:activity_id>/', self.admin_site.admin_view(read_from_replica(self.report_fragment)), name='report_fragment'),
 
         ]
         return custom_urls + urls
@@ -97,7 +132,11 @@ class ReportAdmin(admin.ModelAdmin):
     def changelist_view(self, request, extra_context=None):
         extra_context = extra_context or {}
         extra_context['report_form'] = ReportForm()
-        return super().changelist_view(request, extra_context=extra_context)
+        with use_replica():
+            response = super().changelist_view(request, extra_context=extra_context)
+            if hasattr(response, 'render'):
+                response.render()
+        return response
 
     def generate_report(self, request):
         if request.method != 'POST':
@@ -107,237 +146,87 @@ class ReportAdmin(admin.ModelAdmin):
         if not form.is_valid():
             return HttpResponse("Invalid form data", status=400)
 
-        data = form.cleaned_data
-        grouping = data['grouping']
-        unit = data.get('unit')
-        section = data.get('section')
-        start_date = data['start_date']
-        end_date = data['end_date']
-        financial_year = data['financial_year']
-
-        end_date = end_date + datetime.timedelta(days=1)
-
-        if grouping == 'unit':
-            activities = Activity.objects.filter(unit=unit, financial_year=financial_year)
-        else:
-            activities = Activity.objects.filter(section=section, financial_year=financial_year)
-
-        report_data = []
-
-        for activity in activities:
-            # Implementation part (unchanged)
-            support_services = SupportService.objects.filter(activities=activity)
-            ticket_implementations = []
-            for service in support_services:
-                tickets = SupportTicket.objects.filter(service=service,
-                                                       submitted_at__gte=start_date,
-                                                       submitted_at__lt=end_date)
-                if not tickets.exists():
-                    continue
-                ticket_implementations.append({
-                    'service': service.name,
-                    'description': "\n".join(f"- {t.description} (Status: {t.get_status_display()})" for t in tickets)
-                })
-
-            # Statistics fallback
-            if not ticket_implementations:
-                statistic_types = StatisticType.objects.filter(activities=activity)
-                stats = StatisticsRecord.objects.filter(statistic_type__in=statistic_types,
-                                                        start_date__gte=start_date,
-                                                        end_date__lte=end_date)
-                if stats.exists():
-                    description = "\n".join(f"- {stat.title}: {stat.description}" for stat in stats)
-                    ticket_implementations.append({
-                        'service': "Statistics Records",
-                        'description': description
-                    })
-
-            # --- Financial data ---
-            budgets_qs = Budget.objects.filter(activity=activity, financial_year=financial_year) \
-                .values('budget_type') \
-                .annotate(total_budget=Sum('amount'))
-            expenditures_qs = Expenditure.objects.filter(activity=activity, financial_year=financial_year) \
-                .values('budget_type') \
-                .annotate(total_expenditure=Sum('amount'))
-
-            # Prepare dictionaries per budget type
-            budgets = list(budgets_qs)
-            exp_map = {e['budget_type']: e['total_expenditure'] for e in expenditures_qs}
-            bal_map = {b['budget_type']: b['total_budget'] - exp_map.get(b['budget_type'], 0) for b in budgets}
-            total_budget = sum(b['total_budget'] for b in budgets)
-            total_expenditure = sum(exp_map.values())
-            total_balance = total_budget - total_expenditure
-
-            report_data.append({
-                'activity': activity,
-                'implementations': ticket_implementations,
-                'budgets': budgets,
-                'exp_map': exp_map,
-                'balance_map': bal_map,
-                'total_budget': total_budget,
-                'total_expenditure': total_expenditure,
-                'balance_total': total_balance,
-            })
+        context = build_report(form.cleaned_data, implementations=False)
+        context['period_query'] = urlencode({'start_date': context['start_date'], 'end_date': context['end_date']})
+        projections = {row['activity_id']: row for row in cached_projection(context['financial_year'])['rows']}
+        for item in context['report_data']:
+            item['projection'] = projections.get(item['activity'].pk)
+
+        with timed('render_html'):
+            return HttpResponse(render_to_string('admin/report_output.html', context))
 
+    def compare_report(self, request):
+        form = ComparisonForm(request.GET or None)
         context = {
-            'report_data': report_data,
-            'grouping': grouping,
-            'unit': unit,
-            'section': section,
-            'start_date': start_date,
-            'end_date': end_date - datetime.timedelta(days=1),
-            'financial_year': financial_year,
-            'generated_on': datetime.datetime.now(),
-            'total_budget': sum(item['total_budget'] for item in report_data),
-            'total_expenditure': sum(item['total_expenditure'] for item in report_data),
-            'total_balance': sum(item['balance_total'] for item in report_data),
+            **self.admin_site.each_context(request),
+            'title': 'Compare Periods',
+            'opts': self.model._meta,
+            'form': form,
         }
-
-        return HttpResponse(render_to_string('admin/report_output.html', context))
-
-
-    def export_word(self, request):
+        if form.is_valid():
+            data = form.cleaned_data
+            periods = comparison_periods(data['period_type'], data['financial_years'])
+            context['periods'] = periods
+            context['rows'] = comparison_rows(periods, data['grouping'], data.get('unit'), data.get('section'),
+                                              data.get('department'))
+        return TemplateResponse(request, 'admin/report_compare.html', context)
+
+    def projection_report(self, request):
+        current = current_financial_year()
+        form = ProjectionForm(request.GET or {'financial_year': current.pk if current else None})
+        context = {
+            **self.admin_site.each_context(request),
+            'title': 'Year-end Projection',
+            'opts': self.model._meta,
+            'form': form,
+        }
+        if form.is_valid():
+            projection = cached_projection(form.cleaned_data['financial_year'], form.cleaned_data['as_of'])
+            rows = projection['rows']
+            if form.cleaned_data['status']:
+                rows = [row for row in rows if row['status'] == form.cleaned_data['status']]
+            context.update(projection=projection, rows=rows)
+        return TemplateResponse(request, 'admin/report_projection.html', context)
+
+    def report_fragment(self, request, activity_id):
+        """Implementation details for one activity of the on-screen report, loaded on demand."""
+        form = ReportPeriodForm(request.GET)
+        if not form.is_valid():
+            return HttpResponse("Invalid form data", status=400)
+        start_date = form.cleaned_data['start_date']
+        end_date = form.cleaned_data['end_date'] + datetime.timedelta(days=1)
+
+        # Keyed by the report data stamp, so any change to tickets, budgets or statistics drops cached fragments.
+        cache_key = f"report:fragment:{activity_id}:{start_date:%Y%m%d}:{end_date:%Y%m%d}:{last_modified()}"
+        html = cache.get(cache_key)
+        record_cache('report_fragment', html is not None)
+        if html is None:
+            activity = get_object_or_404(Activity, pk=activity_id)
+            implementations = activity_implementations(activity, start_date, end_date)
+            html = render_to_string('admin/report_implementation_fragment.html', {'implementations': implementations})
+            cache.set(cache_key, html, settings.REPORT_FRAGMENT_CACHE_SECONDS)
+        return HttpResponse(html)
+
+
+    def export_report(self, request, fmt):
         if request.method != 'POST':
             return HttpResponse("Method not allowed", status=405)
 
+        try:
+            exporter = get_exporter(fmt)
+        except LookupError:
+            return HttpResponse("Unknown export format", status=404)
+
         form = ReportForm(request.POST)
         if not form.is_valid():
             return HttpResponse("Invalid form data", status=400)
 
-        data = form.cleaned_data
-        grouping = data['grouping']
-        unit = data.get('unit')
-        section = data.get('section')
-        start_date = data['start_date']
-        end_date = data['end_date']
-        financial_year = data['financial_year']
-
-        # Include full last day
-        end_date = end_date + datetime.timedelta(days=1)
-
-        # Get activities based on grouping
-        if grouping == 'unit':
-            activities = Activity.objects.filter(unit=unit, financial_year=financial_year)
-        else:
-            activities = Activity.objects.filter(section=section, financial_year=financial_year)
-
-        doc = Document()
-        sections = doc.sections[0]
-        header = sections.header
-        header_para = header.paragraphs[0]
-
-        if grouping == 'unit':
-            unit_name = unit.name if unit else 'N/A'
-            heading = f"\t {unit_name} Activities Implementation Report from {start_date} to {end_date - datetime.timedelta(days=1)} in Financial Year: {financial_year}"
-            header_para.text = heading
-        else:
-            section_name = section.name if section else 'N/A'
-            doc.add_heading(f"{section_name} Activities Implementation Report {start_date} to {end_date - datetime.timedelta(days=1)} in Financial Year: {financial_year}", level=0)
-
-        # Create table with extra columns
-        table = doc.add_table(rows=1, cols=6)
-        table.style = 'Table Grid'
-        hdr_cells = table.rows[0].cells
-        hdr_cells[0].text = 'SN'
-        hdr_cells[1].text = 'Activity'
-        hdr_cells[2].text = 'Implementation'
-        hdr_cells[3].text = 'Budget'
-        hdr_cells[4].text = 'Expenditure'
-        hdr_cells[5].text = 'Balance'
-
-        total_width_inches = 9
-        col_widths = [
-            Inches(total_width_inches * 0.05),  # SN
-            Inches(total_width_inches * 0.20),  # Activity
-            Inches(total_width_inches * 0.35),  # Implementation
-            Inches(total_width_inches * 0.13),  # Budget
-            Inches(total_width_inches * 0.13),  # Expenditure
-            Inches(total_width_inches * 0.14),  # Balance
-        ]
-        for cell, width in zip(hdr_cells, col_widths):
-            set_cell_width(cell, width)
-
-        for idx, activity in enumerate(activities, 1):
-            support_services = SupportService.objects.filter(activities=activity)
-            ticket_implementations = []
-            for service in support_services:
-                tickets = SupportTicket.objects.filter(
-                    service=service,
-                    submitted_at__gte=start_date,
-                    submitted_at__lt=end_date
-                )
-                if not tickets.exists():
-                    continue
-                ticket_implementations.append({
-                    'service': service.name,
-                    'description': "\n".join(f"- {t.description} (Status: {t.get_status_display()})" for t in tickets)
-                })
-
-            # ---- Financial Data ----
-            budgets = Budget.objects.filter(activity=activity, financial_year=financial_year) \
-                .values("budget_type") \
-                .annotate(total_budget=Sum("amount"))
-
-            total_budget = sum(b["total_budget"] for b in budgets)
-
-            expenditures = Expenditure.objects.filter(activity=activity, financial_year=financial_year) \
-                .values("budget_type") \
-                .annotate(total_expenditure=Sum("amount"))
-
-            exp_map = {e["budget_type"]: e["total_expenditure"] or 0 for e in expenditures}
-            total_expenditure = sum(exp_map.values())
-
-            balance_map = {b["budget_type"]: b["total_budget"] - exp_map.get(b["budget_type"], 0) for b in budgets}
-            balance_total = total_budget - total_expenditure
-
-            # Add row
-            row_cells = table.add_row().cells
-            row_cells[0].text = str(idx)
-            row_cells[1].text = str(activity)
-
-            # Implementation cell
-            impl_cell = row_cells[2]
-            if ticket_implementations:
-                for impl in ticket_implementations:
-                    impl_cell.add_paragraph(impl['service'], style='Heading4')
-                    impl_cell.add_paragraph(impl['description'])
-            else:
-                impl_cell.text = "No records"
-
-            # Budget
-            budget_cell = row_cells[3]
-            for b in budgets:
-                budget_cell.add_paragraph(f"{b['budget_type']}: {b['total_budget']}")
-            budget_cell.add_paragraph(f"TOTAL: {total_budget}")
-
-            # Expenditure
-            exp_cell = row_cells[4]
-            for b in budgets:
-                exp_cell.add_paragraph(f"{b['budget_type']}: {exp_map.get(b['budget_type'], 0)}")
-            exp_cell.add_paragraph(f"TOTAL: {total_expenditure}")
-
-            # Balance
-            bal_cell = row_cells[5]
-            for b in budgets:
-                bal_cell.add_paragraph(f"{b['budget_type']}: {balance_map.get(b['budget_type'], 0)}")
-            bal_cell.add_paragraph(f"TOTAL: {balance_total}")
-
-            # Adjust column widths
-            for cell, width in zip(row_cells, col_widths):
-                set_cell_width(cell, width)
-
-        # Export DOCX
-        buffer = BytesIO()
-        doc.save(buffer)
-        buffer.seek(0)
-        filename = f"report_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.docx"
-        response = HttpResponse(
-            buffer.getvalue(),
-            content_type='application/vnd.openxmlformats-officedocument.wordprocessingml.document'
-        )
-        response['Content-Disposition'] = f'attachment; filename="{filename}"'
-        buffer.close()
-        return response
+        report = build_report(form.cleaned_data, statistics_fallback=exporter.statistics_fallback)
+        with timed(f'export_{fmt}'):
+            return exporter.export(report)
+
+    def export_word(self, request):
+        return self.export_report(request, 'docx')
 
 
     # def export_word(self, request):
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class ReportConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'report'
+
+    def ready(self):
+        from .freshness import connect_signals
+        connect_signals()
@@ -0,0 +1,161 @@
+"""
+Period-over-period comparison of activities.
+
+Activities are matched across financial years by (name, unit, section), so
+"Network maintenance" in 2024/2025 and in 2025/2026 become one row. Every
+measure is computed for all periods at once with conditional aggregation
+(``Sum``/``Count`` with ``filter=Q(...)``), one grouped query per source table,
+so the number of queries does not depend on the number of periods or rows.
+"""
+
+import datetime
+
+from django.db.models import Count, Min, Q, Sum
+from django.db.models.functions import Lower, Trim
+from django.utils import timezone
+
+from activities.models import Budget, Expenditure
+from services.archive import ticket_querysets
+from services.models import StatisticsRecord
+
+MEASURES = (
+    ('tickets', 'Tickets'),
+    ('statistics', 'Statistics Records'),
+    ('budget', 'Budget'),
+    ('expenditure', 'Expenditure'),
+    ('balance', 'Balance'),
+)
+
+
+def add_months(date, months):
+    month = date.month - 1 + months
+    return date.replace(year=date.year + month // 12, month=month % 12 + 1, day=1)
+
+
+def comparison_periods(period_type, financial_years):
+    """
+    Periods to compare, oldest first: each financial year, or each quarter of
+    the selected financial years. `end` is inclusive.
+    """
+    periods = []
+    for fy in sorted(financial_years, key=lambda fy: fy.start_date):
+        if period_type == 'quarter':
+            for quarter in range(4):
+                start = add_months(fy.start_date, quarter * 3)
+                end = min(add_months(start, 3) - datetime.timedelta(days=1), fy.end_date)
+                periods.append({'label': f"{fy} Q{quarter + 1}", 'start': start, 'end': end, 'financial_year': fy})
+        else:
+            periods.append({'label': str(fy), 'start': fy.start_date, 'end': fy.end_date, 'financial_year': fy})
+    return periods
+
+
+def scope_filter(prefix, grouping, unit=None, section=None, department=None):
+    if grouping == 'unit':
+        return Q(**{f'{prefix}unit': unit})
+    if grouping == 'department':
+        return Q(**{f'{prefix}section__department': department})
+    return Q(**{f'{prefix}section': section})
+
+
+def ticket_scope_filter(grouping, unit=None, section=None, department=None):
+    # Tickets carry their owner, so scoping them needs no join to the activity.
+    if grouping == 'unit':
+        return Q(owning_unit=unit)
+    if grouping == 'department':
+        return Q(owning_department=department)
+    return Q(owning_section=section)
+
+
+def grouped(queryset, prefix, **aggregates):
+    """Rows of `queryset` grouped by matched activity, with `aggregates` per group."""
+    return queryset \
+        .annotate(match_name=Lower(Trim(f'{prefix}name'))) \
+        .values('match_name', f'{prefix}unit_id', f'{prefix}section_id') \
+        .annotate(display_name=Min(f'{prefix}name'), **aggregates) \
+        .order_by()
+
+
+def comparison_rows(periods, grouping, unit=None, section=None, department=None):
+    """
+    One row per matched activity: {'name', 'measures': [{'measure', 'label', 'cells'}]}
+    with one {'value', 'delta'} cell per period; `delta` is the change from the
+    previous period.
+    """
+    financial_years = {period['financial_year'] for period in periods}
+    first_start = min(period['start'] for period in periods)
+    last_end = max(period['end'] for period in periods) + datetime.timedelta(days=1)
+
+    def midnight(date):
+        return timezone.make_aware(datetime.datetime.combine(date, datetime.time.min))
+
+    def scoped(prefix):
+        return scope_filter(prefix, grouping, unit, section, department)
+
+    activity = 'activity__'
+    statistic_activity = 'statistic_type__activities__'
+    ticket_activity = 'service__activities__'
+    sources = []
+    sources.append(('budget', activity, grouped(
+        Budget.objects.filter(scoped(activity), financial_year__in=financial_years),
+        activity,
+        **{f'p{i}': Sum('amount', filter=Q(financial_year=p['financial_year'])) for i, p in enumerate(periods)},
+    )))
+    sources.append(('expenditure', activity, grouped(
+        Expenditure.objects.filter(scoped(activity), financial_year__in=financial_years),
+        activity,
+        **{f'p{i}': Sum('amount', filter=Q(financial_year=p['financial_year'],
+                                           expenditure_date__gte=p['start'], expenditure_date__lte=p['end']))
+           for i, p in enumerate(periods)},
+        # Spent from the start of the financial year up to the end of each period, for the balance.
+        **{f'c{i}': Sum('amount', filter=Q(financial_year=p['financial_year'], expenditure_date__lte=p['end']))
+           for i, p in enumerate(periods)},
+    )))
+    sources.append(('statistics', statistic_activity, grouped(
+        StatisticsRecord.objects.filter(scoped(statistic_activity), start_date__gte=first_start, start_date__lt=last_end),
+        statistic_activity,
+        **{f'p{i}': Count('id', filter=Q(start_date__gte=p['start'], start_date__lte=p['end']))
+           for i, p in enumerate(periods)},
+    )))
+    for qs in ticket_querysets(midnight(first_start), midnight(last_end)):
+        sources.append(('tickets', ticket_activity, grouped(
+            qs.filter(ticket_scope_filter(grouping, unit, section, department)),
+            ticket_activity,
+            **{f'p{i}': Count('id', filter=Q(submitted_at__gte=midnight(p['start']),
+                                                  submitted_at__lt=midnight(p['end'] + datetime.timedelta(days=1))))
+               for i, p in enumerate(periods)},
+        )))
+
+    rows = {}
+    for measure, prefix, results in sources:
+        for result in results:
+            key = (result['match_name'], result[f'{prefix}unit_id'], result[f'{prefix}section_id'])
+            row = rows.setdefault(key, {'name': result['display_name'], 'totals': {}})
+            totals = row['totals'].setdefault(measure, [0] * len(periods))
+            for i in range(len(periods)):
+                totals[i] += result[f'p{i}'] or 0
+            if measure == 'expenditure':
+                row['totals'].setdefault('spent_to_date', [0] * len(periods))
+                for i in range(len(periods)):
+                    row['totals']['spent_to_date'][i] += result[f'c{i}'] or 0
+
+    result = []
+    for key in sorted(rows, key=lambda k: (rows[k]['name'].lower(), k[1] or 0, k[2] or 0)):
+        totals = rows[key]['totals']
+        budget = totals.get('budget', [0] * len(periods))
+        spent = totals.get('spent_to_date', [0] * len(periods))
+        totals['balance'] = [b - s for b, s in zip(budget, spent)]
+        result.append({
+            'name': rows[key]['name'],
+            'measures': [
+                {'measure': measure, 'label': label, 'cells': with_deltas(totals.get(measure, [0] * len(periods)))}
+                for measure, label in MEASURES
+            ],
+        })
+    return result
+
+
+def with_deltas(values):
+    return [
+        {'value': value, 'delta': None if i == 0 else value - values[i - 1]}
+        for i, value in enumerate(values)
+    ]
@@ -0,0 +1,48 @@
+"""
+Report exporters, looked up by format name.
+
+Each backend lives in its own module and is only imported the first time its
+format is requested, so heavy dependencies such as python-docx stay out of
+worker startup. Projects can add or replace backends through the
+``REPORT_EXPORTERS`` setting ({format: dotted path to the exporter class}).
+
+An exporter is a class with a ``statistics_fallback`` flag (whether activities
+without tickets list their statistics records) and an ``export(report)`` method
+taking the dict from ``report.queries.build_report`` and returning an
+HttpResponse.
+"""
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+EXPORTERS = {
+    'docx': 'report.exporters.docx_exporter.DocxExporter',
+    'csv': 'report.exporters.csv_exporter.CsvExporter',
+    'json': 'report.exporters.json_exporter.JsonExporter',
+    'html': 'report.exporters.html_exporter.HtmlExporter',
+}
+
+_loaded = {}
+
+
+def exporter_paths():
+    return {**EXPORTERS, **getattr(settings, 'REPORT_EXPORTERS', {})}
+
+
+def register(format, path):
+    EXPORTERS[format] = path
+    _loaded.pop(format, None)
+
+
+def formats():
+    return list(exporter_paths())
+
+
+def get_exporter(format):
+    """Return the exporter instance for `format`, importing its module on first use."""
+    if format not in _loaded:
+        paths = exporter_paths()
+        if format not in paths:
+            raise LookupError(f"No report exporter registered for {format!r}")
+        _loaded[format] = import_string(paths[format])()
+    return _loaded[format]
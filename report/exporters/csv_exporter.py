@@ -0,0 +1,41 @@
+import csv
+import datetime
+
+from django.http import HttpResponse
+
+
+def implementation_text(implementations):
+    return "\n".join(f"{impl['service']}:\n{impl['description']}" for impl in implementations) or "No records"
+
+
+class CsvExporter:
+    statistics_fallback = True
+
+    def export(self, report):
+        filename = f"report_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
+        response = HttpResponse(content_type='text/csv; charset=utf-8')
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+
+        writer = csv.writer(response)
+        writer.writerow(['SN', 'Activity', 'Implementation', 'Budget', 'Expenditure', 'Balance'])
+        if report.get('section_groups'):
+            for group in report['section_groups']:
+                writer.writerow(['', group['section'].name, '', '', '', ''])
+                self.write_rows(writer, group['rows'])
+                writer.writerow(['', f"{group['section'].name} Subtotal", '', group['total_budget'],
+                                 group['total_expenditure'], group['total_balance']])
+        else:
+            self.write_rows(writer, report['report_data'])
+        writer.writerow(['', 'Total', '', report['total_budget'], report['total_expenditure'], report['total_balance']])
+        return response
+
+    def write_rows(self, writer, rows):
+        for idx, item in enumerate(rows, 1):
+            writer.writerow([
+                idx,
+                str(item['activity']),
+                implementation_text(item['implementations']),
+                item['total_budget'],
+                item['total_expenditure'],
+                item['balance_total'],
+            ])
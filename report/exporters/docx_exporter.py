@@ -0,0 +1,162 @@
+import datetime
+from io import BytesIO
+
+from django.http import HttpResponse
+from docx import Document
+from docx.oxml import OxmlElement
+from docx.oxml.ns import qn
+from docx.shared import Inches
+
+from monitoring.metrics import timed
+
+
+def set_cell_width(cell, width):  # width must be Inches object or float inches
+    tc = cell._tc
+    tcPr = tc.get_or_add_tcPr()
+    # Remove existing width tags
+    for child in tcPr.findall(qn('w:tcW')):
+        tcPr.remove(child)
+    w = OxmlElement('w:tcW')
+    w.set(qn('w:type'), 'dxa')
+
+    # If width is Inches, convert to dxa; if float assume inches
+    if hasattr(width, 'inches'):
+        width_value = int(width.inches * 1440)
+    else:
+        width_value = int(width * 1440)  # width is float inches
+
+    w.set(qn('w:w'), str(width_value))
+    tcPr.append(w)
+
+
+class DocxExporter:
+    statistics_fallback = False
+    content_type = 'application/vnd.openxmlformats-officedocument.wordprocessingml.document'
+
+    def export(self, report):
+        with timed('docx_build'):
+            doc = self.build(report)
+
+        # Export DOCX
+        with timed('docx_save'):
+            buffer = BytesIO()
+            doc.save(buffer)
+        buffer.seek(0)
+        filename = f"report_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.docx"
+        response = HttpResponse(buffer.getvalue(), content_type=self.content_type)
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        buffer.close()
+        return response
+
+    def build(self, report):
+        grouping = report['grouping']
+        unit = report['unit']
+        section = report['section']
+        start_date = report['start_date']
+        end_date = report['end_date']
+        financial_year = report['financial_year']
+
+        doc = Document()
+        sections = doc.sections[0]
+        header = sections.header
+        header_para = header.paragraphs[0]
+
+        if grouping == 'unit':
+            unit_name = unit.name if unit else 'N/A'
+            heading = f"\t {unit_name} Activities Implementation Report from {start_date} to {end_date} in Financial Year: {financial_year}"
+            header_para.text = heading
+        elif grouping == 'department':
+            department_name = report['department'].name if report['department'] else 'N/A'
+            doc.add_heading(f"{department_name} Activities Implementation Report {start_date} to {end_date} in Financial Year: {financial_year}", level=0)
+        else:
+            section_name = section.name if section else 'N/A'
+            doc.add_heading(f"{section_name} Activities Implementation Report {start_date} to {end_date} in Financial Year: {financial_year}", level=0)
+
+        # Create table with extra columns
+        table = doc.add_table(rows=1, cols=6)
+        table.style = 'Table Grid'
+        hdr_cells = table.rows[0].cells
+        hdr_cells[0].text = 'SN'
+        hdr_cells[1].text = 'Activity'
+        hdr_cells[2].text = 'Implementation'
+        hdr_cells[3].text = 'Budget'
+        hdr_cells[4].text = 'Expenditure'
+        hdr_cells[5].text = 'Balance'
+
+        total_width_inches = 9
+        col_widths = [
+            Inches(total_width_inches * 0.05),  # SN
+            Inches(total_width_inches * 0.20),  # Activity
+            Inches(total_width_inches * 0.35),  # Implementation
+            Inches(total_width_inches * 0.13),  # Budget
+            Inches(total_width_inches * 0.13),  # Expenditure
+            Inches(total_width_inches * 0.14),  # Balance
+        ]
+        for cell, width in zip(hdr_cells, col_widths):
+            set_cell_width(cell, width)
+
+        if report.get('section_groups'):
+            for group in report['section_groups']:
+                header_cells = table.add_row().cells
+                merged = header_cells[0].merge(header_cells[-1])
+                merged.text = ''
+                merged.paragraphs[0].add_run(group['section'].name).bold = True
+                for idx, item in enumerate(group['rows'], 1):
+                    self.add_activity_row(table, idx, item, col_widths)
+                self.add_total_row(table, f"{group['section'].name} Subtotal", group, col_widths)
+            self.add_total_row(table, f"{report['department'].name} Total", report, col_widths)
+        else:
+            for idx, item in enumerate(report['report_data'], 1):
+                self.add_activity_row(table, idx, item, col_widths)
+        return doc
+
+    def add_activity_row(self, table, idx, item, col_widths):
+        budgets = item['budgets']
+        exp_map = item['exp_map']
+        balance_map = item['balance_map']
+
+        # Add row
+        row_cells = table.add_row().cells
+        row_cells[0].text = str(idx)
+        row_cells[1].text = str(item['activity'])
+
+        # Implementation cell
+        impl_cell = row_cells[2]
+        if item['implementations']:
+            for impl in item['implementations']:
+                impl_cell.add_paragraph(impl['service'], style='Heading4')
+                impl_cell.add_paragraph(impl['description'])
+        else:
+            impl_cell.text = "No records"
+
+        # Budget
+        budget_cell = row_cells[3]
+        for b in budgets:
+            budget_cell.add_paragraph(f"{b['budget_type']}: {b['total_budget']}")
+        budget_cell.add_paragraph(f"TOTAL: {item['total_budget']}")
+
+        # Expenditure
+        exp_cell = row_cells[4]
+        for b in budgets:
+            exp_cell.add_paragraph(f"{b['budget_type']}: {exp_map.get(b['budget_type'], 0)}")
+        exp_cell.add_paragraph(f"TOTAL: {item['total_expenditure']}")
+
+        # Balance
+        bal_cell = row_cells[5]
+        for b in budgets:
+            bal_cell.add_paragraph(f"{b['budget_type']}: {balance_map.get(b['budget_type'], 0)}")
+        bal_cell.add_paragraph(f"TOTAL: {item['balance_total']}")
+
+        # Adjust column widths
+        for cell, width in zip(row_cells, col_widths):
+            set_cell_width(cell, width)
+
+    def add_total_row(self, table, label, totals, col_widths):
+        row_cells = table.add_row().cells
+        label_cell = row_cells[0].merge(row_cells[2])
+        label_cell.text = ''
+        label_cell.paragraphs[0].add_run(label).bold = True
+        for cell, key in zip(row_cells[3:], ('total_budget', 'total_expenditure', 'total_balance')):
+            cell.paragraphs[0].add_run(f"TOTAL: {totals[key]}").bold = True
+        for cell, width in zip(row_cells, col_widths):
+            set_cell_width(cell, width)
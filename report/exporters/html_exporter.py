@@ -0,0 +1,14 @@
+import datetime
+
+from django.http import HttpResponse
+from django.template.loader import render_to_string
+
+
+class HtmlExporter:
+    statistics_fallback = True
+
+    def export(self, report):
+        filename = f"report_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.html"
+        response = HttpResponse(render_to_string('admin/report_export.html', report))
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
@@ -0,0 +1,48 @@
+import datetime
+
+from django.http import JsonResponse
+
+
+def activity_json(item):
+    activity = item['activity']
+    return {
+        'activity': {'id': activity.pk, 'name': activity.name},
+        'implementations': item.get('implementations', []),
+        'budgets': {b['budget_type']: b['total_budget'] for b in item['budgets']},
+        'expenditures': item['exp_map'],
+        'balances': item['balance_map'],
+        'total_budget': item['total_budget'],
+        'total_expenditure': item['total_expenditure'],
+        'total_balance': item['balance_total'],
+    }
+
+
+def section_json(group):
+    return {
+        'section': {'id': group['section'].pk, 'name': group['section'].name},
+        'activities': [item['activity'].pk for item in group['rows']],
+        'total_budget': group['total_budget'],
+        'total_expenditure': group['total_expenditure'],
+        'total_balance': group['total_balance'],
+    }
+
+
+class JsonExporter:
+    statistics_fallback = True
+
+    def export(self, report):
+        filename = f"report_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+        data = {
+            'start_date': report['start_date'],
+            'end_date': report['end_date'],
+            'financial_year': str(report['financial_year']),
+            'activities': [activity_json(item) for item in report['report_data']],
+            'total_budget': report['total_budget'],
+            'total_expenditure': report['total_expenditure'],
+            'total_balance': report['total_balance'],
+        }
+        if 'section_groups' in report:
+            data['sections'] = [section_json(group) for group in report['section_groups']]
+        response = JsonResponse(data)
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
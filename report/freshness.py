@@ -0,0 +1,61 @@
+"""
+A single "report data last changed" timestamp, kept in the cache.
+
+Every save or delete of a model the activity report reads bumps the stamp, so
+the report API can answer conditional GETs (ETag / Last-Modified) without
+touching the database. Bulk ``update()``/``bulk_create`` callers that change
+report data should call ``touch()`` themselves. With several workers the cache
+backend must be shared, otherwise a worker can miss another worker's change.
+"""
+
+import hashlib
+import time
+
+from django.apps import apps
+from django.core.cache import cache
+from django.db.models.signals import post_delete, post_save
+
+CACHE_KEY = 'report:last_modified'
+
+REPORT_MODELS = (
+    'activities.Activity',
+    'activities.Budget',
+    'activities.Expenditure',
+    'activities.FinancialYear',
+    'services.SupportService',
+    'services.SupportTicket',
+    'services.ArchivedSupportTicket',
+    'services.StatisticType',
+    'services.StatisticsRecord',
+    'services.StatisticValue',
+    'office.Section',
+    'office.Unit',
+)
+
+
+def touch(**kwargs):
+    cache.set(CACHE_KEY, time.time(), None)
+
+
+def last_modified():
+    """Timestamp of the latest change to report data."""
+    stamp = cache.get(CACHE_KEY)
+    if stamp is None:
+        # Nothing recorded (fresh or flushed cache): treat the data as changed now.
+        stamp = time.time()
+        if not cache.add(CACHE_KEY, stamp, None):
+            stamp = cache.get(CACHE_KEY, stamp)
+    return stamp
+
+
+def report_etag(stamp, params):
+    """ETag for a report request: the data stamp plus the request's parameters."""
+    query = '&'.join(f"{key}={value}" for key, value in sorted(params.items()))
+    return '"%s"' % hashlib.sha256(f"{stamp}|{query}".encode()).hexdigest()[:32]
+
+
+def connect_signals():
+    for label in REPORT_MODELS:
+        model = apps.get_model(label)
+        post_save.connect(touch, sender=model, dispatch_uid=f'report-freshness-save-{label}')
+        post_delete.connect(touch, sender=model, dispatch_uid=f'report-freshness-delete-{label}')
@@ -0,0 +1,84 @@
+import json
+import os
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+ENTRY_POINTS = {
+    'manage': ['manage.py', 'check'],
+    'wsgi': ['-c', 'import isd.wsgi'],
+    'asgi': ['-c', 'import isd.asgi'],
+}
+
+
+def parse_importtime(stderr):
+    """Return [{'module', 'depth', 'self_us', 'cumulative_us'}] from `python -X importtime` output."""
+    modules = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        parts = line[len('import time:'):].split('|')
+        if len(parts) != 3 or not parts[0].strip().isdigit():
+            continue  # header line
+        name = parts[2].rstrip()
+        modules.append({
+            'module': name.strip(),
+            'depth': (len(name) - len(name.lstrip()) - 1) // 2,
+            'self_us': int(parts[0]),
+            'cumulative_us': int(parts[1]),
+        })
+    return modules
+
+
+def profile_entry_point(args):
+    env = {**os.environ, 'DJANGO_SETTINGS_MODULE': os.environ.get('DJANGO_SETTINGS_MODULE', 'isd.settings')}
+    result = subprocess.run([sys.executable, '-X', 'importtime', *args], cwd=settings.BASE_DIR,
+                            env=env, capture_output=True, text=True)
+    modules = parse_importtime(result.stderr)
+    return {
+        'returncode': result.returncode,
+        'modules': len(modules),
+        # Top-level imports' cumulative times add up to the whole import cost.
+        'total_us': sum(m['cumulative_us'] for m in modules if m['depth'] == 0),
+        'by_cumulative': sorted(modules, key=lambda m: -m['cumulative_us']),
+        'by_self': sorted(modules, key=lambda m: -m['self_us']),
+    }
+
+
+class Command(BaseCommand):
+    help = "Report per-module import time for manage.py and the WSGI/ASGI entry points (python -X importtime)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('entry_points', nargs='*',
+                            help=f"Entry points to profile: {', '.join(ENTRY_POINTS)} (default: all).")
+        parser.add_argument('--top', type=int, default=20, help="Number of modules to list per ranking.")
+        parser.add_argument('--json', action='store_true', help="Print the results as JSON.")
+
+    def handle(self, *args, **options):
+        top = options['top']
+        unknown = set(options['entry_points']) - set(ENTRY_POINTS)
+        if unknown:
+            raise CommandError(f"Unknown entry points: {', '.join(sorted(unknown))}")
+
+        results = {}
+        for name in options['entry_points'] or ENTRY_POINTS:
+            profile = profile_entry_point(ENTRY_POINTS[name])
+            profile['by_cumulative'] = profile['by_cumulative'][:top]
+            profile['by_self'] = profile['by_self'][:top]
+            results[name] = profile
+
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+
+        for name, profile in results.items():
+            status = '' if profile['returncode'] == 0 else self.style.ERROR(f" (exit code {profile['returncode']})")
+            self.stdout.write(self.style.MIGRATE_HEADING(
+                f"{name}: {profile['modules']} modules, {profile['total_us'] / 1000:.1f} ms{status}"
+            ))
+            for ranking, key in (('cumulative', 'cumulative_us'), ('self', 'self_us')):
+                self.stdout.write(f"  Top {top} by {ranking} time:")
+                for module in profile[f'by_{ranking}']:
+                    self.stdout.write(f"    {module[key] / 1000:9.1f} ms  {module['module']}")
@@ -0,0 +1,51 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.core.serializers.json import DjangoJSONEncoder
+
+from activities.models import FinancialYear
+from report.projection import STATUS_CHOICES, cached_projection, current_financial_year
+
+
+class Command(BaseCommand):
+    help = "Project year-end spending and balance for every activity of a financial year."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--financial-year', type=int, help="Financial year id (default: the current year).")
+        parser.add_argument('--status', choices=[value for value, _ in STATUS_CHOICES],
+                            help="Only list activities with this projected status.")
+        parser.add_argument('--json', action='store_true', help="Print the projection as JSON.")
+
+    def handle(self, *args, **options):
+        if options['financial_year']:
+            try:
+                financial_year = FinancialYear.objects.get(pk=options['financial_year'])
+            except FinancialYear.DoesNotExist:
+                raise CommandError(f"Financial year {options['financial_year']} does not exist.")
+        else:
+            financial_year = current_financial_year()
+            if financial_year is None:
+                raise CommandError("No financial years defined.")
+
+        projection = cached_projection(financial_year)
+        rows = [row for row in projection['rows'] if not options['status'] or row['status'] == options['status']]
+
+        if options['json']:
+            self.stdout.write(json.dumps({**projection, 'rows': rows}, cls=DjangoJSONEncoder, indent=2))
+            return
+
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            f"{projection['financial_year']}: spending up to {projection['as_of']} "
+            f"({projection['elapsed_months']} of {len(projection['months'])} months)"
+        ))
+        self.stdout.write(f"  {'Activity':40} {'Budget':>15} {'Spent':>15} {'Projected':>15} {'Balance':>15}  Status")
+        for row in rows:
+            self.stdout.write(
+                f"  {row['name'][:40]:40} {row['budget']:15,.2f} {row['spent']:15,.2f} "
+                f"{row['projected_spend']:15,.2f} {row['projected_balance']:15,.2f}  {row['status_label']}"
+            )
+        totals = projection['totals']
+        self.stdout.write(
+            f"  {'Total':40} {totals['budget']:15,.2f} {totals['spent']:15,.2f} "
+            f"{totals['projected_spend']:15,.2f} {totals['projected_balance']:15,.2f}"
+        )
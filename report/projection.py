@@ -0,0 +1,132 @@
+"""
+Year-end spending projection for every activity of a financial year.
+
+Monthly expenditure for all activities comes from one grouped query and is
+laid out as an (activities x months) array; burn rate, projected year-end
+spend and projected balance are then whole-array NumPy operations. NumPy is
+imported inside ``project_financial_year`` so that loading the admin or the
+WSGI entry point does not pay for it.
+"""
+
+import calendar
+import datetime
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Sum
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+
+from activities.models import Activity, Budget, Expenditure, FinancialYear
+from monitoring.metrics import record_cache, timed
+from report.freshness import last_modified
+
+# Projected spend within this fraction of the budget counts as on track.
+TOLERANCE = 0.1
+
+STATUS_CHOICES = (
+    ('overspend', 'Overspend'),
+    ('underspend', 'Underspend'),
+    ('on_track', 'On track'),
+    ('unbudgeted', 'No budget'),
+)
+
+
+def month_index(start, date):
+    return (date.year - start.year) * 12 + date.month - start.month
+
+
+def current_financial_year(today=None):
+    """The financial year containing `today`, else the latest one; None when there are none."""
+    today = today or timezone.localdate()
+    years = FinancialYear.objects.order_by('-start_date')
+    return years.filter(start_date__lte=today, end_date__gte=today).first() or years.first()
+
+
+def project_financial_year(financial_year, as_of=None):
+    """
+    Projection for every activity of `financial_year` from spending up to
+    `as_of` (default today, clamped to the year): the average monthly burn so
+    far, carried on to the end of the year. Returns {'financial_year', 'as_of',
+    'months', 'elapsed_months', 'rows', 'totals'}; each row has activity_id,
+    name, budget, spent, monthly, burn_rate, projected_spend, projected_balance
+    and status.
+    """
+    import numpy as np
+
+    start, end = financial_year.start_date, financial_year.end_date
+    as_of = min(max(as_of or timezone.localdate(), start), end)
+    months = [datetime.date(start.year + (start.month - 1 + i) // 12, (start.month - 1 + i) % 12 + 1, 1)
+              for i in range(month_index(start, end) + 1)]
+    # Whole months before `as_of`'s month, plus the part of that month up to `as_of`.
+    elapsed = month_index(start, as_of) + as_of.day / calendar.monthrange(as_of.year, as_of.month)[1]
+
+    activities = list(Activity.objects.filter(financial_year=financial_year)
+                      .order_by('name', 'pk').values_list('pk', 'name'))
+    row_of = {pk: i for i, (pk, _) in enumerate(activities)}
+
+    budget = np.zeros(len(activities))
+    for activity_id, total in Budget.objects.filter(financial_year=financial_year) \
+            .values_list('activity_id').annotate(total=Sum('amount')).order_by():
+        if activity_id in row_of:
+            budget[row_of[activity_id]] = total
+
+    spending = np.zeros((len(activities), len(months)))
+    for activity_id, month, total in Expenditure.objects \
+            .filter(financial_year=financial_year, expenditure_date__gte=start, expenditure_date__lte=as_of) \
+            .annotate(month=TruncMonth('expenditure_date')) \
+            .values_list('activity_id', 'month').annotate(total=Sum('amount')).order_by():
+        if activity_id in row_of:
+            spending[row_of[activity_id], month_index(start, month)] = total
+
+    spent = spending.sum(axis=1)
+    burn_rate = spent / elapsed
+    projected = burn_rate * len(months)
+    balance = budget - projected
+    status = np.select(
+        [(budget <= 0) & (projected > 0), projected > budget * (1 + TOLERANCE), projected < budget * (1 - TOLERANCE)],
+        ['unbudgeted', 'overspend', 'underspend'],
+        'on_track',
+    )
+
+    rows = [
+        {
+            'activity_id': pk,
+            'name': name,
+            'budget': round(float(budget[i]), 2),
+            'spent': round(float(spent[i]), 2),
+            'monthly': [round(float(value), 2) for value in spending[i]],
+            'burn_rate': round(float(burn_rate[i]), 2),
+            'projected_spend': round(float(projected[i]), 2),
+            'projected_balance': round(float(balance[i]), 2),
+            'status': str(status[i]),
+            'status_label': dict(STATUS_CHOICES)[str(status[i])],
+        }
+        for i, (pk, name) in enumerate(activities)
+    ]
+    return {
+        'financial_year': str(financial_year),
+        'as_of': as_of,
+        'months': months,
+        'elapsed_months': round(elapsed, 2),
+        'rows': rows,
+        'totals': {
+            'budget': round(float(budget.sum()), 2),
+            'spent': round(float(spent.sum()), 2),
+            'projected_spend': round(float(projected.sum()), 2),
+            'projected_balance': round(float(balance.sum()), 2),
+        },
+    }
+
+
+def cached_projection(financial_year, as_of=None):
+    """project_financial_year(), cached per financial year and day until report data changes."""
+    as_of = as_of or timezone.localdate()
+    key = f'report:projection:{financial_year.pk}:{as_of:%Y%m%d}:{last_modified()}'
+    projection = cache.get(key)
+    record_cache('report_projection', projection is not None)
+    if projection is None:
+        with timed('projection'):
+            projection = project_financial_year(financial_year, as_of)
+        cache.set(key, projection, settings.REPORT_FRAGMENT_CACHE_SECONDS)
+    return projection
@@ -0,0 +1,187 @@
+import datetime
+
+from django.db.models import Sum
+
+from activities.models import Activity, Budget, Expenditure
+from monitoring.metrics import timed
+from office.models import Section
+from report.summaries import summarise_tickets
+from services.archive import ticket_querysets
+from services.models import SupportService, SupportTicket, StatisticType, StatisticsRecord, StatisticValue
+
+
+def activity_implementations(activity, start_date, end_date, statistics_fallback=True, tickets=None):
+    """
+    Implementation entries for one activity over [start_date, end_date): one per
+    support service with tickets, or the activity's statistics records when it
+    has no tickets. A report covering many activities passes `tickets`, the
+    ticket_querysets() of its period, so the archive is only checked once.
+    """
+    if tickets is None:
+        tickets = ticket_querysets(start_date, end_date)
+    ticket_implementations = []
+    for service in SupportService.objects.filter(activities=activity):
+        description = summarise_tickets(
+            [qs.filter(service=service) for qs in tickets],
+            SupportTicket.STATUS_CHOICES,
+        )
+        if not description:
+            continue
+        ticket_implementations.append({
+            'service': service.name,
+            'description': description
+        })
+
+    # Statistics fallback
+    if not ticket_implementations and statistics_fallback:
+        statistic_types = StatisticType.objects.filter(activities=activity)
+        stats = StatisticsRecord.objects.filter(statistic_type__in=statistic_types,
+                                                start_date__gte=start_date,
+                                                end_date__lte=end_date)
+        if stats.exists():
+            description = "\n".join(f"- {stat.title}: {stat.description}" for stat in stats)
+            totals = StatisticValue.objects.filter(record__in=stats) \
+                .values('metric') \
+                .annotate(total=Sum('value')) \
+                .order_by('metric')
+            if totals:
+                description += "\n" + "\n".join(f"- Total {t['metric']}: {t['total'].normalize():,f}" for t in totals)
+            ticket_implementations.append({
+                'service': "Statistics Records",
+                'description': description
+            })
+    return ticket_implementations
+
+
+def activity_financials(activities, financial_year):
+    """
+    Budget, expenditure and balance per budget type for every activity, from two
+    grouped queries. Returns {activity_id: {...}} with the keys the report
+    templates use.
+    """
+    budgets_qs = Budget.objects.filter(activity__in=activities, financial_year=financial_year) \
+        .values('activity_id', 'budget_type') \
+        .annotate(total_budget=Sum('amount')) \
+        .order_by('activity_id', 'budget_type')
+    expenditures_qs = Expenditure.objects.filter(activity__in=activities, financial_year=financial_year) \
+        .values('activity_id', 'budget_type') \
+        .annotate(total_expenditure=Sum('amount')) \
+        .order_by()
+
+    budgets_by_activity = {}
+    for b in budgets_qs:
+        budgets_by_activity.setdefault(b['activity_id'], []).append({'budget_type': b['budget_type'], 'total_budget': b['total_budget']})
+    exp_by_activity = {}
+    for e in expenditures_qs:
+        exp_by_activity.setdefault(e['activity_id'], {})[e['budget_type']] = e['total_expenditure'] or 0
+
+    financials = {}
+    for activity in activities:
+        budgets = budgets_by_activity.get(activity.pk, [])
+        exp_map = exp_by_activity.get(activity.pk, {})
+        total_budget = sum(b['total_budget'] for b in budgets)
+        total_expenditure = sum(exp_map.values())
+        financials[activity.pk] = {
+            'budgets': budgets,
+            'exp_map': exp_map,
+            'balance_map': {b['budget_type']: b['total_budget'] - exp_map.get(b['budget_type'], 0) for b in budgets},
+            'total_budget': total_budget,
+            'total_expenditure': total_expenditure,
+            'balance_total': total_budget - total_expenditure,
+        }
+    return financials
+
+
+def report_activities(grouping, unit=None, section=None, financial_year=None, department=None):
+    if grouping == 'unit':
+        return Activity.objects.filter(unit=unit, financial_year=financial_year)
+    if grouping == 'department':
+        return Activity.objects.filter(section__department=department, financial_year=financial_year) \
+            .order_by('section__name', 'section_id', 'pk')
+    return Activity.objects.filter(section=section, financial_year=financial_year)
+
+
+def section_subtotals(activities, financial_year):
+    """
+    Budget and expenditure totals per section for the given activities, from two
+    grouped queries. Returns {section_id: {total_budget, total_expenditure, total_balance}}.
+    """
+    budgets = Budget.objects.filter(activity__in=activities, financial_year=financial_year) \
+        .values('activity__section_id') \
+        .annotate(total=Sum('amount')) \
+        .order_by()
+    expenditures = Expenditure.objects.filter(activity__in=activities, financial_year=financial_year) \
+        .values('activity__section_id') \
+        .annotate(total=Sum('amount')) \
+        .order_by()
+
+    budget_map = {b['activity__section_id']: b['total'] or 0 for b in budgets}
+    exp_map = {e['activity__section_id']: e['total'] or 0 for e in expenditures}
+    return {
+        section_id: {
+            'total_budget': budget_map.get(section_id, 0),
+            'total_expenditure': exp_map.get(section_id, 0),
+            'total_balance': budget_map.get(section_id, 0) - exp_map.get(section_id, 0),
+        }
+        for section_id in budget_map.keys() | exp_map.keys()
+    }
+
+
+def section_groups(report_data, department, financial_year):
+    """Split department report rows by section, with each section's subtotals."""
+    sections = Section.objects.filter(department=department).order_by('name', 'pk')
+    subtotals = section_subtotals([item['activity'] for item in report_data], financial_year)
+    rows_by_section = {}
+    for item in report_data:
+        rows_by_section.setdefault(item['activity'].section_id, []).append(item)
+
+    empty = {'total_budget': 0, 'total_expenditure': 0, 'total_balance': 0}
+    return [
+        {'section': section, 'rows': rows_by_section[section.pk], **subtotals.get(section.pk, empty)}
+        for section in sections if section.pk in rows_by_section
+    ]
+
+
+def build_report(data, implementations=True, statistics_fallback=True):
+    """
+    Report rows and totals for cleaned ReportForm data, in the shape the report
+    templates and exporters use. `end_date` is inclusive.
+    """
+    start_date = data['start_date']
+    end_date = data['end_date']
+    financial_year = data['financial_year']
+    activities = report_activities(data['grouping'], data.get('unit'), data.get('section'), financial_year,
+                                   data.get('department'))
+
+    with timed('financials'):
+        financials = activity_financials(activities, financial_year)
+    if implementations:
+        tickets = ticket_querysets(start_date, end_date + datetime.timedelta(days=1))
+    report_data = []
+    with timed('implementations' if implementations else 'rows'):
+        for activity in activities:
+            row = {'activity': activity, **financials[activity.pk]}
+            if implementations:
+                row['implementations'] = activity_implementations(
+                    activity, start_date, end_date + datetime.timedelta(days=1), statistics_fallback, tickets
+                )
+            report_data.append(row)
+
+    report = {
+        'report_data': report_data,
+        'grouping': data['grouping'],
+        'unit': data.get('unit'),
+        'section': data.get('section'),
+        'department': data.get('department'),
+        'start_date': start_date,
+        'end_date': end_date,
+        'financial_year': financial_year,
+        'generated_on': datetime.datetime.now(),
+        'total_budget': sum(item['total_budget'] for item in report_data),
+        'total_expenditure': sum(item['total_expenditure'] for item in report_data),
+        'total_balance': sum(item['balance_total'] for item in report_data),
+    }
+    if data['grouping'] == 'department':
+        with timed('section_groups'):
+            report['section_groups'] = section_groups(report_data, data['department'], financial_year)
+    return report
@@ -0,0 +1,122 @@
+"""
+Collapse identical and near-identical ticket descriptions for reports.
+
+Exact duplicates are grouped in SQL and then by normalised text; the remaining
+distinct texts are clustered with MinHash signatures over their word sets,
+bucketed with LSH so each text is only compared with likely matches. Each cluster becomes a
+single line with its occurrence and status counts.
+"""
+
+import hashlib
+import random
+import re
+import unicodedata
+from collections import Counter, defaultdict
+
+from django.db.models import Count
+
+NUM_PERMUTATIONS = 64
+BANDS = 16
+ROWS_PER_BAND = NUM_PERMUTATIONS // BANDS
+SIMILARITY_THRESHOLD = 0.6
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_rng = random.Random(20240701)
+_PERMUTATIONS = [(_rng.randrange(1, _MERSENNE_PRIME), _rng.randrange(0, _MERSENNE_PRIME)) for _ in range(NUM_PERMUTATIONS)]
+
+_DIGITS = re.compile(r'\d+')
+_NON_WORD = re.compile(r'[^\w\s]+')
+_SPACES = re.compile(r'\s+')
+
+
+def normalise(text):
+    text = unicodedata.normalize('NFKC', text or '').lower()
+    text = _DIGITS.sub('#', text)
+    text = _NON_WORD.sub(' ', text)
+    return _SPACES.sub(' ', text).strip()
+
+
+def _token_hash(token):
+    return int.from_bytes(hashlib.blake2b(token.encode(), digest_size=8).digest(), 'big')
+
+
+def minhash(tokens):
+    hashes = [_token_hash(token) for token in tokens] or [0]
+    return tuple(min((a * h + b) % _MERSENNE_PRIME for h in hashes) for a, b in _PERMUTATIONS)
+
+
+def similarity(signature_a, signature_b):
+    return sum(1 for a, b in zip(signature_a, signature_b) if a == b) / NUM_PERMUTATIONS
+
+
+def cluster_descriptions(rows, threshold=SIMILARITY_THRESHOLD):
+    """
+    Cluster (description, status, occurrences) rows. Returns clusters sorted by
+    size, each a dict with the representative `text`, the total `count` and a
+    Counter of `statuses`.
+    """
+    groups = {}
+    for description, status, occurrences in rows:
+        key = normalise(description)
+        group = groups.setdefault(key, {'count': 0, 'statuses': Counter(), 'texts': Counter()})
+        group['count'] += occurrences
+        group['statuses'][status] += occurrences
+        group['texts'][(description or '').strip()] += occurrences
+
+    # Leader clustering: the most frequent texts become cluster leaders and every
+    # other text joins the first leader it is similar to. Comparing against
+    # leaders only (rather than union-find over all pairs) avoids chaining
+    # unrelated texts together through intermediate ones.
+    keys = sorted(groups, key=lambda k: -groups[k]['count'])
+    buckets = defaultdict(list)
+    clusters = {}
+    for key in keys:
+        signature = minhash(set(key.split()))
+        band_keys = [(band, signature[band * ROWS_PER_BAND:(band + 1) * ROWS_PER_BAND]) for band in range(BANDS)]
+        leader = next(
+            (candidate for band_key in band_keys for candidate in buckets.get(band_key, ())
+             if similarity(signature, clusters[candidate]['signature']) >= threshold),
+            None,
+        )
+        if leader is None:
+            leader = key
+            clusters[key] = {'signature': signature, 'count': 0, 'statuses': Counter(), 'texts': Counter()}
+            for band_key in band_keys:
+                buckets[band_key].append(key)
+        cluster = clusters[leader]
+        group = groups[key]
+        cluster['count'] += group['count']
+        cluster['statuses'].update(group['statuses'])
+        cluster['texts'].update(group['texts'])
+
+    result = []
+    for cluster in clusters.values():
+        result.append({
+            'text': cluster['texts'].most_common(1)[0][0],
+            'count': cluster['count'],
+            'statuses': cluster['statuses'],
+        })
+    result.sort(key=lambda c: (-c['count'], c['text']))
+    return result
+
+
+def format_clusters(clusters, status_labels):
+    lines = []
+    for cluster in clusters:
+        counts = [(label, cluster['statuses'][status]) for status, label in status_labels if cluster['statuses'][status]]
+        if cluster['count'] == 1:
+            lines.append(f"- {cluster['text']} (Status: {counts[0][0] if counts else '-'})")
+        else:
+            statuses = ", ".join(f"{label}: {n}" for label, n in counts)
+            lines.append(f"- {cluster['text']} (Occurrence: {cluster['count']}; {statuses})")
+    return "\n".join(lines)
+
+
+def summarise_tickets(querysets, status_labels):
+    """One line per cluster of similar descriptions across the given ticket querysets."""
+    rows = []
+    for qs in querysets:
+        rows.extend(qs.values_list('description', 'status').annotate(occurrences=Count('id')).order_by())
+    if not rows:
+        return ""
+    return format_clusters(cluster_descriptions(rows), status_labels)
@@ -1,3 +1,324 @@
-from django.test import TestCase
+import datetime
+import json
+import subprocess
+import sys
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.db import connection
+from django.core.cache import cache
+from django.core.management import call_command
+from django.http import HttpResponse
+from django.test import override_settings
+from django.test import SimpleTestCase, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from activities.models import Activity, Budget, Expenditure, FinancialYear
+from authentication.models import CustomUser
+from isd.admission import acquire_slot
+from isd.testing import QueryBudgetTestCase, seed_dataset
+from office.models import Department, Section
+from report.projection import project_financial_year
+from report.summaries import cluster_descriptions, format_clusters
+from services.archive import archive_tickets
+from services.models import SupportTicket
+
+
+class ReportTestCase(QueryBudgetTestCase):
+    def report_data(self):
+        return {
+            'grouping': 'section',
+            'section': self.data['section'].pk,
+            'start_date': '2025-07-01',
+            'end_date': '2026-06-30',
+            'financial_year': self.data['financial_year'].pk,
+        }
+
+
+class ReportAdminQueryBudgetTests(ReportTestCase):
+    def test_changelist(self):
+        self.assertQueryBudget(reverse('admin:report_report_changelist'), 12)
+
+    def test_generate_report(self):
+        self.assertQueryBudget(reverse('admin:generate_report'), 12, method='post', data=self.report_data())
+
+    def test_report_fragment(self):
+        activity = Activity.objects.filter(section=self.data['section']).first()
+        self.assertQueryBudget(reverse('admin:report_fragment', args=[activity.pk]), 20,
+                               data={'start_date': '2025-07-01', 'end_date': '2026-06-30'})
+
+
+class ReportExportTests(ReportTestCase):
+    def test_export_formats(self):
+        self.client.force_login(self.superuser)
+        for fmt, content_type in (('csv', 'text/csv'), ('json', 'application/json'), ('html', 'text/html'),
+                                  ('docx', 'application/vnd.openxmlformats')):
+            response = self.client.post(reverse('admin:export_report', args=[fmt]), self.report_data())
+            self.assertEqual(response.status_code, 200, fmt)
+            self.assertTrue(response['Content-Type'].startswith(content_type), fmt)
+            self.assertIn('attachment;', response['Content-Disposition'])
+
+    def test_unknown_format(self):
+        self.client.force_login(self.superuser)
+        response = self.client.post(reverse('admin:export_report', args=['pdf']), self.report_data())
+        self.assertEqual(response.status_code, 404)
+
+
+class ArchiveBoundaryTests(ReportTestCase):
+    def test_boundary_checked_once_per_report(self):
+        SupportTicket.objects.filter(status='closed').update(submitted_at=datetime.datetime(2025, 8, 1, tzinfo=datetime.timezone.utc))
+        archive_tickets(datetime.datetime(2025, 9, 1, tzinfo=datetime.timezone.utc))
+        self.client.force_login(self.superuser)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(reverse('admin:export_report', args=['csv']), self.report_data())
+        self.assertEqual(response.status_code, 200)
+        boundary = [q['sql'] for q in queries if 'MAX(' in q['sql'] and 'archivedsupportticket' in q['sql']]
+        self.assertEqual(len(boundary), 1)
+
+
+class DescriptionClusterTests(SimpleTestCase):
+    statuses = [('open', 'Open'), ('in_progress', 'In Progress'), ('resolved', 'Resolved'), ('closed', 'Closed')]
+
+    def clusters(self, rows):
+        return {cluster['text']: (cluster['count'], dict(cluster['statuses'])) for cluster in cluster_descriptions(rows)}
+
+    def test_near_duplicates_are_grouped(self):
+        self.assertEqual(self.clusters([
+            ('Printer on the second floor is jammed and not printing', 'open', 3),
+            ('printer on the second floor jammed and not printing!', 'resolved', 1),
+            ('Printer jam on floor 3', 'open', 1),
+            ('PRINTER JAM ON FLOOR 4.', 'closed', 2),  # equal once case, punctuation and digits are normalised
+            ('Network outage in the finance building', 'in_progress', 1),
+            ('Network outage in the finance block', 'open', 1),
+        ]), {
+            'Printer on the second floor is jammed and not printing': (4, {'open': 3, 'resolved': 1}),
+            'PRINTER JAM ON FLOOR 4.': (3, {'open': 1, 'closed': 2}),
+            'Network outage in the finance building': (2, {'in_progress': 1, 'open': 1}),
+        })
+
+    def test_distinct_descriptions_are_kept_apart(self):
+        rows = [
+            ('Email password reset request', 'open', 1),
+            ('Network outage in the finance building', 'open', 1),
+            ('Printer on the second floor is jammed', 'open', 1),
+            ('New laptop for the audit unit', 'closed', 1),
+            ('', 'open', 1),
+        ]
+        self.assertEqual(len(cluster_descriptions(rows)), len(rows))
+
+    def test_format(self):
+        text = format_clusters(cluster_descriptions([
+            ('Printer jammed', 'open', 3), ('printer jammed.', 'resolved', 1), ('Email password reset', 'open', 1),
+        ]), self.statuses)
+        self.assertEqual(text.splitlines(), [
+            '- Printer jammed (Occurrence: 4; Open: 3, Resolved: 1)',
+            '- Email password reset (Status: Open)',
+        ])
+
+
+class StartupImportTests(SimpleTestCase):
+    def test_wsgi_startup_does_not_import_docx(self):
+        code = "import sys, isd.wsgi; print('docx' in sys.modules, 'numpy' in sys.modules)"
+        result = subprocess.run([sys.executable, '-c', code], cwd=settings.BASE_DIR, capture_output=True, text=True)
+        self.assertEqual(result.stdout.strip(), 'False False', result.stderr)
+
+
+class ReportApiTests(ReportTestCase):
+    def test_conditional_get(self):
+        self.client.force_login(self.superuser)
+        url = reverse('report_api')
+        response = self.client.get(url, self.report_data())
+        self.assertEqual(response.status_code, 200)
+        body = json.loads(b''.join(response.streaming_content))
+        self.assertEqual(len(body['activities']), Activity.objects.filter(
+            section=self.data['section'], financial_year=self.data['financial_year']).count())
+
+        with self.assertNumQueries(2):  # session and user only
+            response = self.client.get(url, self.report_data(), HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+        Activity.objects.filter(section=self.data['section']).first().save()
+        response = self.client.get(url, self.report_data(), HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 200)
+        b''.join(response.streaming_content)
+
+
+class DepartmentReportTests(ReportTestCase):
+    def department_data(self):
+        return {**self.report_data(), 'grouping': 'department', 'department': self.data['department'].pk}
+
+    def test_generate_report(self):
+        self.assertQueryBudget(reverse('admin:generate_report'), 15, method='post', data=self.department_data())
+
+    def test_section_subtotals(self):
+        self.client.force_login(self.superuser)
+        response = self.client.post(reverse('admin:export_report', args=['json']), self.department_data())
+        body = json.loads(response.content)
+        self.assertEqual(len(body['sections']), 2)
+        for section in body['sections']:
+            rows = [a for a in body['activities'] if a['activity']['id'] in section['activities']]
+            self.assertEqual(Decimal(section['total_budget']), sum(Decimal(a['total_budget']) for a in rows))
+        self.assertEqual(Decimal(body['total_budget']), sum(Decimal(s['total_budget']) for s in body['sections']))
+
+
+class ComparisonReportTests(ReportTestCase):
+    def comparison_data(self, period_type='year'):
+        return {
+            'grouping': 'section',
+            'section': self.data['section'].pk,
+            'period_type': period_type,
+            'financial_years': [self.data['previous_year'].pk, self.data['financial_year'].pk],
+        }
+
+    def test_compare_years(self):
+        self.assertQueryBudget(reverse('admin:compare_report'), 15, data=self.comparison_data())
+
+    def test_compare_quarters(self):
+        self.assertQueryBudget(reverse('admin:compare_report'), 15, data=self.comparison_data('quarter'))
+
+    def test_activities_matched_across_years(self):
+        self.client.force_login(self.superuser)
+        response = self.client.get(reverse('admin:compare_report'), self.comparison_data())
+        rows = response.context['rows']
+        self.assertEqual(len(rows), self.rows)
+        budget = next(m for m in rows[0]['measures'] if m['measure'] == 'budget')
+        self.assertEqual([cell['value'] for cell in budget['cells']], [1500, 1500])
+        self.assertEqual(budget['cells'][1]['delta'], 0)
+
+
+class ProjectionTests(ReportTestCase):
+    def setUp(self):
+        self.financial_year = self.data['financial_year']
+        self.busy = Activity.objects.create(name='Busy activity', section=self.data['section'], financial_year=self.financial_year)
+        Budget.objects.create(financial_year=self.financial_year, activity=self.busy, budget_type='Own Source', amount=1200)
+        for month in (7, 8, 9):
+            Expenditure.objects.create(financial_year=self.financial_year, activity=self.busy, budget_type='Own Source',
+                                       amount=300, expenditure_date=datetime.date(2025, month, 15))
+
+    def test_projection(self):
+        projection = project_financial_year(self.financial_year, as_of=datetime.date(2025, 9, 30))
+        self.assertEqual(projection['elapsed_months'], 3.0)
+        busy = next(row for row in projection['rows'] if row['activity_id'] == self.busy.pk)
+        self.assertEqual((busy['spent'], busy['burn_rate'], busy['projected_spend']), (900, 300, 3600))
+        self.assertEqual((busy['projected_balance'], busy['status']), (-2400, 'overspend'))
+        self.assertEqual(busy['monthly'][:4], [300, 300, 300, 0])
+        seeded = [row for row in projection['rows'] if row['activity_id'] != self.busy.pk]
+        self.assertEqual({row['status'] for row in seeded}, {'underspend'})
+
+    def test_queries_do_not_grow_with_activities(self):
+        with self.assertNumQueries(3):
+            project_financial_year(self.financial_year)
+        seed_dataset(self.grow_rows, prefix='grow')
+        with self.assertNumQueries(3):
+            project_financial_year(self.financial_year)
+
+    def test_admin_and_command(self):
+        self.client.force_login(self.superuser)
+        response = self.client.get(reverse('admin:projection_report'), {
+            'financial_year': self.financial_year.pk, 'status': 'overspend', 'as_of': '2025-09-30',
+        })
+        self.assertContains(response, 'Busy activity')
+        self.assertNotContains(response, 'seed activity')
+
+        out = StringIO()
+        call_command('project_spending', '--financial-year', str(self.financial_year.pk), '--json', stdout=out)
+        self.assertEqual(len(json.loads(out.getvalue())['rows']),
+                         Activity.objects.filter(financial_year=self.financial_year).count())
+
+
+    def test_api_validates_financial_year(self):
+        self.client.force_login(self.superuser)
+        url = reverse('projection_api')
+        response = self.client.get(url, {'financial_year': self.financial_year.pk})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(self.busy.pk, [row['activity_id'] for row in response.json()['rows']])
+        self.assertEqual(self.client.get(url, {'financial_year': self.financial_year.pk, 'status': 'x'}).status_code, 400)
+        for value in ('', 'abc', '1.5', '999999'):
+            response = self.client.get(url, {'financial_year': value})
+            self.assertEqual(response.status_code, 400, value)
+            self.assertIn('financial_year', response.json()['errors'])
+
+
+@override_settings(ADMISSION_GLOBAL_LIMIT=2, ADMISSION_USER_LIMIT=1)
+class AdmissionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.superuser = CustomUser.objects.create_superuser('admin@example.com', None, full_name='Admin')
+        department = Department.objects.create(name='ICT', short_name='ICT')
+        cls.section = Section.objects.create(name='Systems', department=department, short_name='SYS')
+        cls.financial_year = FinancialYear.objects.create(start_date=datetime.date(2025, 7, 1), end_date=datetime.date(2026, 6, 30))
+        activity = Activity.objects.create(name='Helpdesk', section=cls.section, financial_year=cls.financial_year)
+        Budget.objects.create(financial_year=cls.financial_year, activity=activity, budget_type='Own Source', amount=1000)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.superuser)
+
+    def report_data(self):
+        return {
+            'grouping': 'section',
+            'section': self.section.pk,
+            'start_date': '2025-07-01',
+            'end_date': '2026-06-30',
+            'financial_year': self.financial_year.pk,
+        }
+
+    def generate(self, **data):
+        return self.client.post(reverse('admin:generate_report'), {**self.report_data(), **data})
+
+    def test_user_limit(self):
+        slot = acquire_slot(f'report:user:{self.superuser.pk}', 1)
+        response = self.generate()
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], str(settings.ADMISSION_RETRY_AFTER))
+        cache.delete(slot)
+        self.assertEqual(self.generate().status_code, 200)
+
+    def test_global_limit(self):
+        slots = [acquire_slot('report:global', 2) for _ in range(2)]
+        self.assertEqual(self.generate().status_code, 429)
+        cache.delete(slots[0])
+        self.assertEqual(self.generate().status_code, 200)
+        self.assertIsNotNone(acquire_slot('report:global', 2), "slot not released")
+
+    def test_duplicates_are_coalesced(self):
+        first = self.generate()
+        with self.assertNumQueries(2):  # session and user only
+            second = self.generate()
+        self.assertEqual(second.content, first.content)
+        self.assertEqual(self.generate(end_date='2026-03-31').status_code, 200)
+
+    def test_duplicates_in_flight_wait_for_the_response(self):
+        expected = self.generate().content
+        cache.clear()
+
+        def finish_first(seconds):
+            cache.set('admission:result:same', HttpResponse(expected), 30)
+            cache.delete('admission:running:same')
+
+        with mock.patch('isd.admission.request_fingerprint', return_value='same'):
+            cache.add('admission:running:same', 1)  # the first request is still running
+            with mock.patch('isd.admission.time.sleep', side_effect=finish_first) as sleep, self.assertNumQueries(2):
+                self.assertEqual(self.generate().content, expected)
+            sleep.assert_called_once()
+
+            # The first request failed: the duplicate runs the report itself.
+            cache.clear()
+            cache.add('admission:running:same', 1)
+            with mock.patch('isd.admission.time.sleep', side_effect=lambda seconds: cache.delete('admission:running:same')):
+                self.assertEqual(self.generate().content, expected)
+
+            # Not done in time.
+            cache.clear()
+            cache.add('admission:running:same', 1)
+            with override_settings(ADMISSION_COALESCE_WAIT_SECONDS=0):
+                self.assertEqual(self.generate().status_code, 429)
+
+    def test_streaming_holds_slot_until_closed(self):
+        response = self.client.get(reverse('report_api'), self.report_data())
+        self.assertEqual(self.generate().status_code, 429)
+        b''.join(response.streaming_content)
+        self.assertEqual(self.generate().status_code, 200)
@@ -0,0 +1,7 @@
+from django.urls import path
+from .views import projection_api, report_api
+
+urlpatterns = [
+    path('', report_api, name='report_api'),
+    path('projection/', projection_api, name='projection_api'),
+]
@@ -1,3 +1,113 @@
-from django.shortcuts import render
+import datetime
 
-# Create your views here.
+from django.core.exceptions import PermissionDenied
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import JsonResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from django.views.decorators.http import require_GET
+
+from isd.admission import admission_controlled
+from isd.routers import use_replica
+from report.admin import ProjectionForm, ReportForm
+from report.exporters.json_exporter import activity_json, section_json
+from report.freshness import last_modified, report_etag
+from report.projection import cached_projection, current_financial_year
+from report.queries import activity_financials, activity_implementations, report_activities, section_groups
+from services.archive import ticket_querysets
+
+
+def stream_report(data):
+    """Yield the report as JSON text, one activity at a time."""
+    encoder = DjangoJSONEncoder()
+    start_date = data['start_date']
+    end_date = data['end_date']
+    financial_year = data['financial_year']
+
+    with use_replica():
+        activities = list(report_activities(data['grouping'], data.get('unit'), data.get('section'), financial_year,
+                                             data.get('department')))
+        financials = activity_financials(activities, financial_year)
+        tickets = ticket_querysets(start_date, end_date + datetime.timedelta(days=1))
+
+        yield '{"start_date": %s, "end_date": %s, "financial_year": %s, "activities": [' % (
+            encoder.encode(start_date), encoder.encode(end_date), encoder.encode(str(financial_year)))
+        for idx, activity in enumerate(activities):
+            item = {
+                'activity': activity,
+                'implementations': activity_implementations(activity, start_date, end_date + datetime.timedelta(days=1),
+                                                            tickets=tickets),
+                **financials[activity.pk],
+            }
+            if idx:
+                yield ', '
+            yield from encoder.iterencode(activity_json(item))
+        yield ']'
+
+        if data['grouping'] == 'department':
+            groups = section_groups([{'activity': activity} for activity in activities], data['department'], financial_year)
+            yield ', "sections": %s' % encoder.encode([section_json(group) for group in groups])
+
+    totals = {
+        'total_budget': sum(f['total_budget'] for f in financials.values()),
+        'total_expenditure': sum(f['total_expenditure'] for f in financials.values()),
+        'total_balance': sum(f['balance_total'] for f in financials.values()),
+    }
+    yield ', %s' % encoder.encode(totals)[1:]
+
+
+@admission_controlled('report', version=last_modified)
+def streamed_report(request):
+    form = ReportForm(request.GET)
+    if not form.is_valid():
+        return JsonResponse({'errors': form.errors.get_json_data()}, status=400)
+    return StreamingHttpResponse(stream_report(form.cleaned_data), content_type='application/json')
+
+
+@require_GET
+def report_api(request):
+    """
+    Read-only JSON version of the activity report, taking the same parameters as
+    the report form. Unchanged polls get a 304 before any database work.
+    """
+    if not request.user.has_perm('activities.view_activity'):
+        raise PermissionDenied
+
+    stamp = last_modified()
+    etag = report_etag(stamp, request.GET)
+    response = get_conditional_response(request, etag=etag, last_modified=int(stamp))
+    if response is None:
+        response = streamed_report(request)
+        if response.status_code == 429:
+            return response
+
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(int(stamp))
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+@require_GET
+def projection_api(request):
+    """
+    Year-end spending projection for `financial_year` (id) as JSON; without the
+    parameter, for the current year. A blank, non-integer or unknown id is a 400.
+    """
+    if not request.user.has_perm('activities.view_activity'):
+        raise PermissionDenied
+
+    data = request.GET.copy()
+    if 'financial_year' not in data:
+        current = current_financial_year()
+        if current is None:
+            return JsonResponse({'error': "No financial years defined."}, status=404)
+        data['financial_year'] = current.pk
+    form = ProjectionForm(data)
+    if not form.is_valid():
+        return JsonResponse({'errors': form.errors.get_json_data()}, status=400)
+
+    projection = cached_projection(form.cleaned_data['financial_year'])
+    status = form.cleaned_data['status']
+    if status:
+        projection = {**projection, 'rows': [row for row in projection['rows'] if row['status'] == status]}
+    return JsonResponse(projection)
@@ -72,20 +72,46 @@
 #     readonly_fields = ('date_prepared',)
 
 
-from django.contrib import admin
+from django.conf import settings
+from django.contrib import admin, messages
+from django.core.exceptions import PermissionDenied
+from django.db.models import Count, Q
+from django.db.models.functions import Length, Substr
+from django.http import HttpResponseNotAllowed, HttpResponseRedirect
+from django.urls import path, reverse
+from django.utils.dateparse import parse_date
+from django.utils import timezone
+from django.utils.html import format_html
+from activities.admin import FinancialYearListFilter
+from isd.autocomplete import PrefixAutocompleteMixin, activity_scope, financial_year_filter
+from isd.facets import CachedFacetsChangeList, CachedFacetsMixin
+from .archive import reaches_archive
+from .outbox import record_events
+from .queue import claim_next, release_claims
+from .reporters import get_or_create_reporter
+from .transitions import transition_tickets
 from .models import (
     SupportedSystem,
     SupportService,
     SupportTicket,
+    ArchivedSupportTicket,
     StatisticType,
     StatisticsRecord, SubService,
-
+    ApiToken, ExternalReporter, OutboxEvent, Technician,
 )
 from django import forms
 
+
+def scoped_to_activity(request, field):
+    # Rows not tied to an activity stay available to everyone.
+    prefix = f'{field}__'
+    return Q(**{f'{field}__isnull': True}) | (activity_scope(request.user, prefix) & financial_year_filter(request, prefix))
+
+
 @admin.register(SupportedSystem)
-class SystemAdmin(admin.ModelAdmin):
+class SystemAdmin(PrefixAutocompleteMixin, admin.ModelAdmin):
     list_display = ['name']
+    search_fields = ['name']
 
     def has_add_permission(self, request, obj=None):
         return request.user.is_superuser or request.user.has_perm('services.add_supportedsystem')
@@ -96,8 +122,14 @@ class SystemAdmin(admin.ModelAdmin):
 
 
 @admin.register(SupportService)
-class ServiceAdmin(admin.ModelAdmin):
+class ServiceAdmin(PrefixAutocompleteMixin, admin.ModelAdmin):
     list_display = ['name']
+    search_fields = ['name']
+    autocomplete_fields = ['activities']
+
+    def get_autocomplete_queryset(self, request, queryset):
+        return queryset.filter(scoped_to_activity(request, 'activities'))
+
     def has_add_permission(self, request, obj=None):
         return request.user.is_superuser  or request.user.has_perm('services.add_supportservice')
     def has_change_permission(self, request, obj=None):
@@ -109,8 +141,14 @@ class ServiceAdmin(admin.ModelAdmin):
 
 
 @admin.register(StatisticType)
-class StatisticTypeAdmin(admin.ModelAdmin):
+class StatisticTypeAdmin(PrefixAutocompleteMixin, admin.ModelAdmin):
     list_display = ['name']
+    search_fields = ['name']
+    autocomplete_fields = ['activities']
+
+    def get_autocomplete_queryset(self, request, queryset):
+        return queryset.filter(scoped_to_activity(request, 'activities'))
+
     def has_add_permission(self, request, obj=None):
         return request.user.is_superuser or request.user.is_staff or request.user.has_perm('services.add_statistictype')
     def has_change_permission(self, request, obj=None):
@@ -122,9 +160,17 @@ class StatisticTypeAdmin(admin.ModelAdmin):
 
 @admin.register(StatisticsRecord)
 class StatisticRecordAdmin(admin.ModelAdmin):
-    list_display = ['title', 'statistic_type', 'start_date', 'end_date', 'prepared_by']
+    list_display = ['title', 'statistic_type', 'start_date', 'end_date', 'prepared_by', 'download']
+    list_select_related = ['statistic_type', 'prepared_by']
+    autocomplete_fields = ['statistic_type']
     exclude = ['prepared_by']
 
+    @admin.display(description='File')
+    def download(self, obj):
+        if not obj.file:
+            return '-'
+        return format_html('<a href="{}">Download</a>', reverse('download_statistics_file', args=[obj.pk]))
+
     def save_model(self, request, obj, form, change):
         if not obj.pk:
             obj.prepared_by = request.user
@@ -140,6 +186,55 @@ class StatisticRecordAdmin(admin.ModelAdmin):
         return request.user.has_perm('services.view_statisticsrecord')
 
 
+DESCRIPTION_PREVIEW_LENGTH = 100
+
+
+def ticket_owner_scope(user):
+    """(label, Q) selecting the tickets owned by the user's section, unit or department; None for users without one."""
+    if user.section_id:
+        return 'My section', Q(owning_section=user.section_id)
+    if user.unit_id:
+        return 'My unit', Q(owning_unit=user.unit_id)
+    if user.department_id:
+        return 'My department', Q(owning_department=user.department_id)
+    return None
+
+
+class TicketOwnerListFilter(admin.SimpleListFilter):
+    title = 'owner'
+    parameter_name = 'owner'
+
+    def lookups(self, request, model_admin):
+        scope = ticket_owner_scope(request.user)
+        return [('mine', scope[0])] if scope else []
+
+    def queryset(self, request, queryset):
+        scope = ticket_owner_scope(request.user)
+        if self.value() == 'mine' and scope:
+            return queryset.filter(scope[1])
+        return queryset
+
+
+class TicketChangeList(CachedFacetsChangeList):
+    # The changelist only shows the start of each description; let the database cut it instead of loading full texts.
+    def get_queryset(self, request, exclude_parameters=None):
+        return super().get_queryset(request, exclude_parameters).defer('description').annotate(
+            description_preview=Substr('description', 1, DESCRIPTION_PREVIEW_LENGTH),
+            description_length=Length('description'),
+        )
+
+
+class TicketPreviewMixin:
+    def get_changelist(self, request, **kwargs):
+        return TicketChangeList
+
+    @admin.display(description='Description', ordering='description')
+    def description_preview(self, obj):
+        if obj.description_length > DESCRIPTION_PREVIEW_LENGTH:
+            return f"{obj.description_preview}…"
+        return obj.description_preview
+
+
 class SupportTicketAdminForm(forms.ModelForm):
     class Meta:
         model = SupportTicket
@@ -150,20 +245,89 @@ class SupportTicketAdminForm(forms.ModelForm):
 
 
 @admin.register(SupportTicket)
-class TicketAdmin(admin.ModelAdmin):
+class TicketAdmin(TicketPreviewMixin, CachedFacetsMixin, admin.ModelAdmin):
     form = SupportTicketAdminForm
-    list_display = ['system', 'service', 'status', 'resolved_by', 'description']
-    exclude = ['resolved_by']
+    change_list_template = 'admin/ticket_change_list.html'
+    list_display = ['system', 'service', 'status', 'resolved_by', 'claimed_by', 'description_preview']
+    list_select_related = ['system', 'service', 'resolved_by', 'claimed_by']
+    list_filter = ['status', 'submitted_at', FinancialYearListFilter, TicketOwnerListFilter]
+    autocomplete_fields = ['system', 'service']
+    exclude = ['resolved_by', 'reporter']
+    actions = ['mark_in_progress', 'mark_resolved', 'mark_closed', 'reopen', 'release']
 
     class Meta:
         widgets = {
             'service': forms.Select(attrs={'onchange': 'console.log("HTML ONCHANGE:", this.value)'}),
         }
 
+    def changelist_view(self, request, extra_context=None):
+        # Old closed tickets live in ArchivedSupportTicket; point at them when the requested range reaches that far back.
+        try:
+            start = parse_date(request.GET.get('submitted_at__gte', '')[:10])
+        except ValueError:
+            start = None
+        if start and reaches_archive(start):
+            url = f"{reverse('admin:services_archivedsupportticket_changelist')}?{request.GET.urlencode()}"
+            messages.info(request, format_html(
+                'Part of this date range has been archived. <a href="{}">View archived tickets for the same filters</a>.', url
+            ))
+        extra_context = {**(extra_context or {}), 'can_claim': self.has_change_permission(request)}
+        return super().changelist_view(request, extra_context=extra_context)
+
+    def get_urls(self):
+        return [
+            path('claim-next/', self.admin_site.admin_view(self.claim_next_view), name='services_supportticket_claim_next'),
+        ] + super().get_urls()
+
+    def claim_next_view(self, request):
+        """Claim the next ticket of the user's work queue and open it."""
+        if request.method != 'POST':
+            return HttpResponseNotAllowed(['POST'])
+        if not self.has_change_permission(request):
+            raise PermissionDenied
+        ticket = claim_next(request.user)
+        if ticket is None:
+            self.message_user(request, "There are no unclaimed open tickets in your queue.", messages.INFO)
+            return HttpResponseRedirect(reverse('admin:services_supportticket_changelist'))
+        self.message_user(request, f"Ticket claimed until {timezone.localtime(ticket.claim_expires_at):%H:%M}.", messages.SUCCESS)
+        return HttpResponseRedirect(reverse('admin:services_supportticket_change', args=[ticket.pk]))
+
     def save_model(self, request, obj, form, change):
         if not obj.pk:
             obj.resolved_by = request.user
+        obj.reporter = get_or_create_reporter(obj.external_user) if obj.user_type == 'external' else None
         super().save_model(request, obj, form, change)
+        # The admin saves inside a transaction, so the notification commits with the ticket.
+        if not change:
+            record_events('created', [obj.pk])
+        elif 'status' in form.changed_data and obj.status == 'resolved':
+            record_events('resolved', [obj.pk])
+
+    def transition(self, request, queryset, status):
+        updated = transition_tickets(queryset, status, user=request.user)
+        label = dict(SupportTicket.STATUS_CHOICES)[status]
+        self.message_user(request, f"{updated} ticket(s) marked as {label}.", messages.SUCCESS)
+
+    @admin.action(description='Mark selected tickets as In Progress', permissions=['change'])
+    def mark_in_progress(self, request, queryset):
+        self.transition(request, queryset, 'in_progress')
+
+    @admin.action(description='Mark selected tickets as Resolved', permissions=['change'])
+    def mark_resolved(self, request, queryset):
+        self.transition(request, queryset, 'resolved')
+
+    @admin.action(description='Mark selected tickets as Closed', permissions=['change'])
+    def mark_closed(self, request, queryset):
+        self.transition(request, queryset, 'closed')
+
+    @admin.action(description='Reopen selected tickets', permissions=['change'])
+    def reopen(self, request, queryset):
+        self.transition(request, queryset, 'open')
+
+    @admin.action(description='Release claims on selected tickets', permissions=['change'])
+    def release(self, request, queryset):
+        released = release_claims(queryset)
+        self.message_user(request, f"{released} claim(s) released.", messages.SUCCESS)
 
     def has_delete_permission(self, request, obj=None):
         return request.user.is_superuser or request.user.has_perm('services.delete_supportticket')
@@ -176,3 +340,135 @@ class TicketAdmin(admin.ModelAdmin):
 
     def has_view_permission(self, request, obj=None):
         return request.user.is_superuser or request.user.has_perm('services.view_supportticket')
+
+
+
+@admin.register(ArchivedSupportTicket)
+class ArchivedTicketAdmin(TicketPreviewMixin, CachedFacetsMixin, admin.ModelAdmin):
+    list_display = ['system', 'service', 'status', 'resolved_by', 'description_preview', 'submitted_at', 'archived_at']
+    list_select_related = ['system', 'service', 'resolved_by']
+    list_filter = ['status', 'submitted_at', FinancialYearListFilter, TicketOwnerListFilter]
+    search_fields = ['description']
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return request.user.is_superuser
+
+    def has_view_permission(self, request, obj=None):
+        return request.user.is_superuser or request.user.has_perm('services.view_supportticket')
+
+
+@admin.register(ExternalReporter)
+class ExternalReporterAdmin(admin.ModelAdmin):
+    list_display = ['full_name', 'email', 'phone_number', 'ticket_count']
+    search_fields = ['full_name', 'email', 'phone_number']
+    readonly_fields = ['identity_key']
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(ticket_count=Count('tickets'))
+
+    @admin.display(description='Tickets', ordering='ticket_count')
+    def ticket_count(self, obj):
+        return obj.ticket_count
+
+
+@admin.register(Technician)
+class TechnicianAdmin(admin.ModelAdmin):
+    list_display = ['user', 'service_count', 'system_count']
+    search_fields = ['user__email', 'user__full_name']
+    autocomplete_fields = ['user', 'services', 'systems']
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('user').annotate(
+            service_count=Count('services', distinct=True), system_count=Count('systems', distinct=True),
+        )
+
+    @admin.display(description='Services', ordering='service_count')
+    def service_count(self, obj):
+        return obj.service_count
+
+    @admin.display(description='Systems', ordering='system_count')
+    def system_count(self, obj):
+        return obj.system_count
+
+
+class OutboxStateListFilter(admin.SimpleListFilter):
+    title = 'state'
+    parameter_name = 'state'
+
+    def lookups(self, request, model_admin):
+        return [('pending', 'Pending'), ('sent', 'Sent'), ('failed', 'Given up')]
+
+    def queryset(self, request, queryset):
+        if self.value() == 'pending':
+            return queryset.filter(sent_at__isnull=True, attempts__lt=settings.OUTBOX_MAX_ATTEMPTS)
+        if self.value() == 'sent':
+            return queryset.filter(sent_at__isnull=False)
+        if self.value() == 'failed':
+            return queryset.filter(sent_at__isnull=True, attempts__gte=settings.OUTBOX_MAX_ATTEMPTS)
+        return queryset
+
+
+@admin.register(OutboxEvent)
+class OutboxEventAdmin(admin.ModelAdmin):
+    list_display = ['event', 'ticket_id', 'recipient', 'created_at', 'attempts', 'available_at', 'sent_at']
+    list_filter = [OutboxStateListFilter, 'event']
+    search_fields = ['recipient', '=ticket_id']
+    readonly_fields = [f.name for f in OutboxEvent._meta.fields]
+    actions = ['retry_now']
+
+    def has_module_permission(self, request):
+        return request.user.is_superuser
+
+    def has_view_permission(self, request, obj=None):
+        return request.user.is_superuser
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return request.user.is_superuser
+
+    @admin.action(description='Send selected unsent events at the next dispatch', permissions=['view'])
+    def retry_now(self, request, queryset):
+        updated = queryset.filter(sent_at__isnull=True).update(attempts=0, available_at=timezone.now(), last_error='')
+        self.message_user(request, f"{updated} event(s) queued for the next dispatch.", messages.SUCCESS)
+
+
+@admin.register(ApiToken)
+class ApiTokenAdmin(admin.ModelAdmin):
+    list_display = ['name', 'user', 'is_active', 'created_at', 'last_used_at']
+    list_filter = ['is_active']
+    search_fields = ['name', 'user__email', 'user__full_name']
+    readonly_fields = ['created_at', 'last_used_at']
+
+    def has_module_permission(self, request):
+        return request.user.is_superuser
+
+    def has_view_permission(self, request, obj=None):
+        return request.user.is_superuser
+
+    def has_add_permission(self, request):
+        return request.user.is_superuser
+
+    def has_change_permission(self, request, obj=None):
+        return request.user.is_superuser
+
+    def has_delete_permission(self, request, obj=None):
+        return request.user.is_superuser
+
+    def save_model(self, request, obj, form, change):
+        key = None if obj.pk else obj.generate_key()
+        super().save_model(request, obj, form, change)
+        if key:
+            messages.warning(request, format_html(
+                'Token for "{}": <code>{}</code> — copy it now, it will not be shown again.', obj.name, key
+            ))
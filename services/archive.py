@@ -0,0 +1,61 @@
+import datetime
+
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from activities.models import FinancialYear
+from .models import SupportTicket, ArchivedSupportTicket
+
+ARCHIVABLE_STATUSES = ('resolved', 'closed')
+
+
+def archive_cutoff(years, today=None):
+    """Start of the financial year `years` before the current one; older tickets are archivable."""
+    today = today or timezone.localdate()
+    start = FinancialYear.start_for(today)
+    cutoff = start.replace(year=start.year - years)
+    return timezone.make_aware(datetime.datetime.combine(cutoff, datetime.time.min))
+
+
+def archive_tickets(cutoff, batch_size=1000):
+    """Move closed/resolved tickets submitted before `cutoff` in batches. Returns the number moved."""
+    fields = [f.attname for f in ArchivedSupportTicket._meta.concrete_fields if f.name != 'archived_at']
+    candidates = SupportTicket.objects.filter(status__in=ARCHIVABLE_STATUSES, submitted_at__lt=cutoff).order_by('pk')
+    moved = 0
+    while True:
+        with transaction.atomic():
+            batch = list(candidates[:batch_size])
+            if not batch:
+                break
+            ArchivedSupportTicket.objects.bulk_create(
+                [ArchivedSupportTicket(**{name: getattr(ticket, name) for name in fields}) for ticket in batch]
+            )
+            SupportTicket.objects.filter(pk__in=[ticket.pk for ticket in batch]).delete()
+        moved += len(batch)
+    return moved
+
+
+def archive_boundary():
+    """Newest submitted_at in the archive, or None when nothing has been archived."""
+    return ArchivedSupportTicket.objects.aggregate(latest=Max('submitted_at'))['latest']
+
+
+def reaches_archive(start_date):
+    boundary = archive_boundary()
+    if boundary is None:
+        return False
+    if not isinstance(start_date, datetime.datetime):
+        start_date = timezone.make_aware(datetime.datetime.combine(start_date, datetime.time.min))
+    return start_date <= boundary
+
+
+def ticket_querysets(start_date, end_date):
+    """
+    Ticket querysets covering [start_date, end_date): the hot table, plus the
+    archive only when the range reaches back into archived periods.
+    """
+    querysets = [SupportTicket.objects.filter(submitted_at__gte=start_date, submitted_at__lt=end_date)]
+    if reaches_archive(start_date):
+        querysets.append(ArchivedSupportTicket.objects.filter(submitted_at__gte=start_date, submitted_at__lt=end_date))
+    return querysets
@@ -0,0 +1,108 @@
+"""
+Parse uploaded statistics files into StatisticValue rows.
+
+Two CSV layouts are understood:
+
+* long: a header with ``metric`` and ``value`` columns and an optional
+  ``period``/``date`` column, one figure per row;
+* wide: the first column is the period and every other column is a metric.
+
+Rows without a usable period fall back to the record's start date; cells that
+are not numbers are skipped.
+"""
+
+import csv
+import datetime
+import io
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction
+
+from .models import StatisticsRecord, StatisticValue
+
+BATCH_SIZE = 1000
+PERIOD_FORMATS = ('%Y-%m-%d', '%Y-%m', '%d/%m/%Y', '%m/%Y', '%Y')
+
+
+def parse_period(text, default):
+    text = (text or '').strip()
+    for fmt in PERIOD_FORMATS:
+        try:
+            return datetime.datetime.strptime(text, fmt).date()
+        except ValueError:
+            continue
+    return default
+
+
+def parse_value(text):
+    text = (text or '').strip().replace(',', '').replace(' ', '')
+    if not text:
+        return None
+    try:
+        value = Decimal(text)
+    except InvalidOperation:
+        return None
+    return value if value.is_finite() else None
+
+
+def iter_csv_values(rows, default_period):
+    """Yield (metric, period, value) tuples from csv.reader rows."""
+    header = next(rows, None)
+    if not header:
+        return
+    columns = [h.strip().lower() for h in header]
+
+    if 'metric' in columns and 'value' in columns:
+        metric_at = columns.index('metric')
+        value_at = columns.index('value')
+        period_at = next((columns.index(c) for c in ('period', 'date') if c in columns), None)
+        for row in rows:
+            if len(row) <= max(metric_at, value_at):
+                continue
+            value = parse_value(row[value_at])
+            metric = row[metric_at].strip()
+            if value is None or not metric:
+                continue
+            period = parse_period(row[period_at], default_period) if period_at is not None and period_at < len(row) else default_period
+            yield metric[:100], period, value
+        return
+
+    metrics = [h.strip()[:100] for h in header[1:]]
+    for row in rows:
+        if not row:
+            continue
+        period = parse_period(row[0], default_period)
+        for metric, cell in zip(metrics, row[1:]):
+            value = parse_value(cell)
+            if metric and value is not None:
+                yield metric, period, value
+
+
+def ingest_statistics_record(record, force=False, batch_size=BATCH_SIZE):
+    """
+    Replace the record's StatisticValue rows with the figures in its file.
+    Returns the number of values stored, or None when the current file was
+    already ingested.
+    """
+    name = record.file.name if record.file else ''
+    if not force and name == record.ingested_file:
+        return None
+
+    count = 0
+    with transaction.atomic():
+        StatisticValue.objects.filter(record=record).delete()
+        if name.lower().endswith('.csv'):
+            with record.file.storage.open(name, 'rb') as f:
+                text = io.TextIOWrapper(f.file, encoding='utf-8-sig', errors='replace', newline='')
+                batch = []
+                for metric, period, value in iter_csv_values(csv.reader(text), record.start_date):
+                    batch.append(StatisticValue(record=record, metric=metric, period=period, value=value))
+                    if len(batch) >= batch_size:
+                        StatisticValue.objects.bulk_create(batch)
+                        count += len(batch)
+                        batch = []
+                StatisticValue.objects.bulk_create(batch)
+                count += len(batch)
+        StatisticsRecord.objects.filter(pk=record.pk).update(ingested_file=name)
+    record.ingested_file = name
+    return count
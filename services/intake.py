@@ -0,0 +1,192 @@
+"""
+Batch ticket intake for the token-authenticated API.
+
+A batch is validated in memory against cached name/id maps of services and
+systems, keys already on file are looked up with one query per chunk, and the
+new tickets go in with ``bulk_create`` — the number of queries depends on the
+batch size divided by ``INTAKE_CHUNK_SIZE``, not on the number of tickets.
+Every ticket carries a client ``idempotency_key``, unique per API user; a
+retried batch reports the tickets it already created as duplicates instead of
+inserting them again, including when the retry races the original request.
+"""
+
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+
+from monitoring.metrics import record_cache
+
+from .models import ArchivedSupportTicket, SupportService, SupportTicket, SupportedSystem, service_ownership
+from .outbox import record_events
+from .reporters import resolve_reporters
+from .transitions import invalidate_ticket_caches
+
+INTAKE_CHUNK_SIZE = 1000
+LOOKUP_CACHE_SECONDS = 60
+MAX_KEY_LENGTH = SupportTicket._meta.get_field('idempotency_key').max_length
+USER_TYPES = dict(SupportTicket.USER_TYPE_CHOICES)
+STATUSES = dict(SupportTicket.STATUS_CHOICES)
+
+
+def lookup_cache_key(model):
+    return f'intake:lookup:{model._meta.label_lower}'
+
+
+def lookup_map(model):
+    """{id: id, 'lower-cased name': id} for `model`; cleared when a row changes (see signals)."""
+    key = lookup_cache_key(model)
+    mapping = cache.get(key)
+    record_cache('intake_lookup', mapping is not None)
+    if mapping is None:
+        mapping = {}
+        for pk, name in model.objects.values_list('pk', 'name').order_by('-pk'):
+            mapping[pk] = pk
+            mapping[name.strip().lower()] = pk  # the oldest row wins on duplicate names
+        cache.set(key, mapping, LOOKUP_CACHE_SECONDS)
+    return mapping
+
+
+def resolve(mapping, value):
+    # Lists and objects are not ids or names (and are unhashable).
+    if isinstance(value, bool) or not isinstance(value, (str, int)):
+        return None
+    if isinstance(value, str):
+        value = int(value) if value.strip().isdigit() else value.strip().lower()
+    return mapping.get(value)
+
+
+def validate_ticket(item, services, systems):
+    """Return (field values, errors) for one submitted ticket."""
+    if not isinstance(item, dict):
+        return None, {'__all__': "Expected an object."}
+
+    errors = {}
+    key = item.get('idempotency_key')
+    if not isinstance(key, str) or not key.strip():
+        errors['idempotency_key'] = "This field is required."
+    elif len(key.strip()) > MAX_KEY_LENGTH:
+        errors['idempotency_key'] = f"Ensure this value has at most {MAX_KEY_LENGTH} characters."
+
+    description = item.get('description')
+    if not isinstance(description, str) or not description.strip():
+        errors['description'] = "This field is required."
+
+    user_type = item.get('user_type')
+    if not isinstance(user_type, str) or user_type not in USER_TYPES:
+        errors['user_type'] = f"Must be one of: {', '.join(USER_TYPES)}."
+
+    status = item.get('status', 'open')
+    if not isinstance(status, str) or status not in STATUSES:
+        errors['status'] = f"Must be one of: {', '.join(STATUSES)}."
+
+    service_id = resolve(services, item.get('service'))
+    if service_id is None:
+        errors['service'] = "Unknown service."
+
+    system_id = None
+    if item.get('system') not in (None, ''):
+        system_id = resolve(systems, item['system'])
+        if system_id is None:
+            errors['system'] = "Unknown system."
+
+    reporter = item.get('reporter') or ''
+    if not isinstance(reporter, str) or len(reporter) > 100:
+        errors['reporter'] = "Ensure this value is a string of at most 100 characters."
+
+    if errors:
+        return None, errors
+    return {
+        'idempotency_key': key.strip(),
+        'description': description,
+        'user_type': user_type,
+        'status': status,
+        'service_id': service_id,
+        'system_id': system_id,
+        'internal_user_name': reporter if user_type == 'internal' and reporter else None,
+        'external_user': reporter if user_type == 'external' and reporter else None,
+    }, None
+
+
+def existing_keys(user, keys):
+    found = set()
+    keys = list(keys)
+    for start in range(0, len(keys), INTAKE_CHUNK_SIZE):
+        chunk = keys[start:start + INTAKE_CHUNK_SIZE]
+        for model in (SupportTicket, ArchivedSupportTicket):
+            found.update(model.objects.filter(intake_user=user, idempotency_key__in=chunk)
+                         .values_list('idempotency_key', flat=True))
+    return found
+
+
+def insert_tickets(tickets, user):
+    """
+    Insert `tickets` and return the ones that went in. A concurrent request
+    with some of the same keys may commit between the lookup and the insert;
+    the unique constraint then fails the whole insert, which is retried
+    without the keys the other request took. Every ticket in the insert that
+    succeeds was therefore created by this call.
+    """
+    while tickets:
+        try:
+            with transaction.atomic():
+                SupportTicket.objects.bulk_create(tickets, batch_size=INTAKE_CHUNK_SIZE)
+            return tickets
+        except IntegrityError:
+            taken = existing_keys(user, [ticket.idempotency_key for ticket in tickets])
+            if not taken:
+                raise
+            tickets = [ticket for ticket in tickets if ticket.idempotency_key not in taken]
+    return tickets
+
+
+def ingest_tickets(items, user):
+    """
+    Validate and insert a batch of submitted tickets. Invalid tickets are
+    reported by their index in `items` and do not stop the rest of the batch.
+    Returns {'created': [keys], 'duplicates': [keys], 'errors': [{'index', 'errors'}]}.
+    """
+    services = lookup_map(SupportService)
+    systems = lookup_map(SupportedSystem)
+
+    valid = {}
+    duplicates = []
+    errors = []
+    for index, item in enumerate(items):
+        values, item_errors = validate_ticket(item, services, systems)
+        if item_errors:
+            errors.append({'index': index, 'errors': item_errors})
+        elif values['idempotency_key'] in valid:
+            duplicates.append(values['idempotency_key'])
+        else:
+            valid[values['idempotency_key']] = values
+
+    seen = existing_keys(user, valid)
+    duplicates.extend(key for key in valid if key in seen)
+    tickets = [SupportTicket(resolved_by=user, intake_user=user, **values)
+               for key, values in valid.items() if key not in seen]
+    reporters = resolve_reporters(ticket.external_user for ticket in tickets)
+    # bulk_create() skips save(), which would set these.
+    ownership = service_ownership({ticket.service_id for ticket in tickets})
+    for ticket in tickets:
+        ticket.reporter = reporters.get(ticket.external_user)
+        for field, value in ownership.get(ticket.service_id, {}).items():
+            setattr(ticket, f'{field}_id', value)
+
+    with transaction.atomic():
+        created = insert_tickets(tickets, user)
+        created_keys = {ticket.idempotency_key for ticket in created}
+        duplicates.extend(ticket.idempotency_key for ticket in tickets if ticket.idempotency_key not in created_keys)
+        if created:
+            # Not every backend returns the new ids from a bulk insert; they are looked up by key.
+            keys = list(created_keys)
+            record_events('created', [
+                pk for start in range(0, len(keys), INTAKE_CHUNK_SIZE)
+                for pk in SupportTicket.objects.filter(intake_user=user, idempotency_key__in=keys[start:start + INTAKE_CHUNK_SIZE])
+                .values_list('pk', flat=True)
+            ])
+            transaction.on_commit(invalidate_ticket_caches)
+
+    return {
+        'created': [ticket.idempotency_key for ticket in created],
+        'duplicates': duplicates,
+        'errors': errors,
+    }
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from services.archive import archive_cutoff, archive_tickets
+
+
+class Command(BaseCommand):
+    help = "Move closed/resolved support tickets older than N financial years into the archive table."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--years', type=int, default=2,
+                            help="Keep the current and the previous N financial years in the hot table.")
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        cutoff = archive_cutoff(options['years'])
+        moved = archive_tickets(cutoff, batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Archived {moved} tickets submitted before {cutoff:%Y-%m-%d}."))
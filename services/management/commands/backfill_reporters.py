@@ -0,0 +1,31 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from services.models import ArchivedSupportTicket, SupportTicket
+from services.reporters import backfill_reporters
+
+TABLES = {'tickets': SupportTicket, 'archive': ArchivedSupportTicket}
+
+
+class Command(BaseCommand):
+    help = "Link external tickets to deduplicated ExternalReporter rows, in small batches. Safe to stop and rerun."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--table', choices=[*TABLES, 'all'], default='all')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--after', type=int, default=0,
+                            help="Resume after this ticket id (printed with each batch).")
+        parser.add_argument('--sleep', type=float, default=0,
+                            help="Seconds to wait between batches, to leave room for other writers.")
+
+    def handle(self, *args, **options):
+        tables = TABLES if options['table'] == 'all' else {options['table']: TABLES[options['table']]}
+        for name, model in tables.items():
+            linked = 0
+            for last_pk, count in backfill_reporters(model, options['batch_size'], options['after']):
+                linked += count
+                self.stdout.write(f"{name}: linked {count} tickets, up to id {last_pk}")
+                if options['sleep']:
+                    time.sleep(options['sleep'])
+            self.stdout.write(self.style.SUCCESS(f"{name}: {linked} tickets linked to reporters."))
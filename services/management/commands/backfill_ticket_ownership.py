@@ -0,0 +1,33 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from services.models import ArchivedSupportTicket, SupportTicket
+from services.ownership import backfill_ownership
+
+TABLES = {'tickets': SupportTicket, 'archive': ArchivedSupportTicket}
+
+
+class Command(BaseCommand):
+    help = ("Fill in the owning unit, section, department and financial year of tickets from their service's "
+            "activity, in small batches. Resolved and closed tickets that already have an owner are left alone. "
+            "Safe to stop and rerun.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--table', choices=[*TABLES, 'all'], default='all')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--after', type=int, default=0,
+                            help="Resume after this ticket id (printed with each batch).")
+        parser.add_argument('--sleep', type=float, default=0,
+                            help="Seconds to wait between batches, to leave room for other writers.")
+
+    def handle(self, *args, **options):
+        tables = TABLES if options['table'] == 'all' else {options['table']: TABLES[options['table']]}
+        for name, model in tables.items():
+            total = 0
+            for last_pk, count in backfill_ownership(model, options['batch_size'], options['after']):
+                total += count
+                self.stdout.write(f"{name}: updated {count} tickets, up to id {last_pk}")
+                if options['sleep']:
+                    time.sleep(options['sleep'])
+            self.stdout.write(self.style.SUCCESS(f"{name}: {total} tickets updated."))
@@ -0,0 +1,43 @@
+import datetime
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from services.models import OutboxEvent
+from services.outbox import dispatch
+
+
+class Command(BaseCommand):
+    help = ("Send queued ticket notifications in batches, one message per recipient. Runs until the outbox is "
+            "empty, or keeps polling with --loop. Several dispatchers can run at once.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100)
+        parser.add_argument('--loop', action='store_true', help="Keep running and poll for new events.")
+        parser.add_argument('--interval', type=float, default=5,
+                            help="Seconds to wait when the outbox is empty, with --loop.")
+        parser.add_argument('--purge-days', type=int,
+                            help="First delete events sent more than this many days ago.")
+
+    def handle(self, *args, **options):
+        if options['purge_days'] is not None:
+            cutoff = timezone.now() - datetime.timedelta(days=options['purge_days'])
+            deleted, _ = OutboxEvent.objects.filter(sent_at__lt=cutoff).delete()
+            self.stdout.write(f"Purged {deleted} sent events.")
+
+        total_sent = total_failed = 0
+        try:
+            while True:
+                sent, failed = dispatch(options['batch_size'])
+                total_sent += sent
+                total_failed += failed
+                if sent or failed:
+                    self.stdout.write(f"Sent {sent} events, {failed} failed.")
+                    continue
+                if not options['loop']:
+                    break
+                time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write(self.style.SUCCESS(f"{total_sent} events sent, {total_failed} failed."))
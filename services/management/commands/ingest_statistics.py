@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+from django.db.models import F
+
+from services.ingest import BATCH_SIZE, ingest_statistics_record
+from services.models import StatisticsRecord
+
+
+class Command(BaseCommand):
+    help = "Parse statistics record files into StatisticValue rows."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help="Re-parse files that were already ingested.")
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        records = StatisticsRecord.objects.exclude(file='').exclude(file__isnull=True)
+        if not options['force']:
+            records = records.exclude(ingested_file=F('file'))
+
+        ingested = failed = values = 0
+        for record in records.iterator(chunk_size=100):
+            try:
+                count = ingest_statistics_record(record, force=options['force'], batch_size=options['batch_size'])
+            except Exception as exc:
+                failed += 1
+                self.stderr.write(f"Record {record.pk}: {exc}")
+                continue
+            if count is not None:
+                ingested += 1
+                values += count
+
+        self.stdout.write(self.style.SUCCESS(f"Ingested {ingested} records ({values} values), {failed} failed."))
@@ -0,0 +1,33 @@
+import datetime
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from services.models import StatisticsRecord
+from services.storage import statistics_storage
+
+
+class Command(BaseCommand):
+    help = ("Delete uploaded statistics files that no statistics record refers to any more "
+            "(replaced uploads and deleted records).")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--grace-hours', type=float, default=24,
+                            help="Keep unreferenced files younger than this; an upload is stored before its record is saved.")
+        parser.add_argument('--dry-run', action='store_true', help="List the files instead of deleting them.")
+
+    def handle(self, *args, **options):
+        directory = StatisticsRecord._meta.get_field('file').upload_to.rstrip('/')
+        referenced = set(StatisticsRecord.objects.exclude(file='').values_list('file', flat=True))
+        cutoff = timezone.now() - datetime.timedelta(hours=options['grace_hours'])
+        removed = 0
+        for name in statistics_storage.walk(directory):
+            if name in referenced or statistics_storage.get_modified_time(name) > cutoff:
+                continue
+            if options['dry_run']:
+                self.stdout.write(name)
+            else:
+                statistics_storage.remove(name)
+            removed += 1
+        verb = "Would delete" if options['dry_run'] else "Deleted"
+        self.stdout.write(self.style.SUCCESS(f"{verb} {removed} unreferenced file(s)."))
@@ -0,0 +1,27 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from services.models import SupportTicket
+from services.queue import release_claims
+
+
+class Command(BaseCommand):
+    help = ("Release work-queue claims on tickets: by default the expired ones (which are already claimable "
+            "again, but still show their old technician), or every claim of one user.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help="Release every claim held by the user with this email address.")
+
+    def handle(self, *args, **options):
+        if options['user']:
+            User = get_user_model()
+            try:
+                user = User.objects.get(email=options['user'])
+            except User.DoesNotExist:
+                raise CommandError(f"No user with email {options['user']!r}.")
+            tickets = SupportTicket.objects.filter(claimed_by=user)
+        else:
+            tickets = SupportTicket.objects.filter(claim_expires_at__lte=timezone.now())
+        released = release_claims(tickets)
+        self.stdout.write(self.style.SUCCESS(f"{released} claim(s) released."))
@@ -0,0 +1,50 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from authentication.models import CustomUser
+from services.models import SupportTicket
+from services.transitions import transition_tickets
+
+
+class Command(BaseCommand):
+    help = "Change the status of many support tickets with a single UPDATE."
+
+    def add_arguments(self, parser):
+        parser.add_argument('status', choices=[value for value, _ in SupportTicket.STATUS_CHOICES])
+        parser.add_argument('--ids', type=lambda value: [int(pk) for pk in value.split(',')],
+                            help="Comma-separated ticket ids.")
+        parser.add_argument('--from-status', choices=[value for value, _ in SupportTicket.STATUS_CHOICES],
+                            help="Only tickets currently in this status.")
+        parser.add_argument('--service', type=int, help="Only tickets for this support service id.")
+        parser.add_argument('--submitted-before', help="Only tickets submitted before this date (YYYY-MM-DD).")
+        parser.add_argument('--resolved-by', help="Email of the user recorded as resolver.")
+        parser.add_argument('--dry-run', action='store_true', help="Only report how many tickets would change.")
+
+    def handle(self, *args, **options):
+        tickets = SupportTicket.objects.all()
+        if options['ids']:
+            tickets = tickets.filter(pk__in=options['ids'])
+        if options['from_status']:
+            tickets = tickets.filter(status=options['from_status'])
+        if options['service']:
+            tickets = tickets.filter(service_id=options['service'])
+        if options['submitted_before']:
+            before = parse_date(options['submitted_before'])
+            if before is None:
+                raise CommandError("--submitted-before must be a date (YYYY-MM-DD).")
+            tickets = tickets.filter(submitted_at__date__lt=before)
+
+        user = None
+        if options['resolved_by']:
+            user = CustomUser.objects.filter(email=options['resolved_by']).first()
+            if user is None:
+                raise CommandError(f"No user with email {options['resolved_by']}.")
+
+        status = options['status']
+        if options['dry_run']:
+            count = tickets.exclude(status=status).count()
+            self.stdout.write(f"{count} tickets would be marked {status}.")
+            return
+
+        updated = transition_tickets(tickets, status, user=user)
+        self.stdout.write(self.style.SUCCESS(f"Marked {updated} tickets {status}."))
@@ -0,0 +1,39 @@
+from django.conf import settings
+
+from isd.routers import has_written, is_replica_safe, note_write, pin_to_primary, reset_pin, watch_writes
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS', 'TRACE')
+
+
+class ReplicaPinningMiddleware:
+    """
+    Read-your-writes for the replica router: a request that wrote to the
+    primary sets a short-lived cookie so the same client keeps reading from
+    the primary until the replica has caught up. Requests with a non-safe
+    method count as writes as soon as their view is resolved, unless the view
+    is a read-only report (``read_from_replica``); those and safe requests
+    only once they save or delete a row.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.cookie_name = getattr(settings, 'REPLICA_PIN_COOKIE', 'isd_pin_primary')
+        self.pin_seconds = getattr(settings, 'REPLICA_PIN_SECONDS', 5)
+        watch_writes()
+
+    def __call__(self, request):
+        reset_pin()
+        if request.COOKIES.get(self.cookie_name):
+            pin_to_primary()
+        try:
+            response = self.get_response(request)
+            if has_written():
+                response.set_cookie(self.cookie_name, '1', max_age=self.pin_seconds, httponly=True, samesite='Lax')
+            return response
+        finally:
+            reset_pin()
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if request.method not in SAFE_METHODS and not is_replica_safe(view_func):
+            note_write()
+        return None
@@ -1,14 +1,20 @@
+import hashlib
+import re
+import secrets
+
 from django.db import models
 from django.contrib.auth import get_user_model
 from django.core.exceptions import ValidationError
 
-from activities.models import Activity
+from activities.models import Activity, FinancialYear
+from office.models import Department, Section, Unit
+from .storage import statistics_storage
 
 User = get_user_model()
 
 
 class SupportedSystem(models.Model):
-    name = models.CharField(max_length=100)
+    name = models.CharField(max_length=100, db_index=True)
     description = models.TextField(blank=True)
 
     def __str__(self):
@@ -16,7 +22,7 @@ class SupportedSystem(models.Model):
 
 
 class SupportService(models.Model):
-    name = models.CharField(max_length=100)
+    name = models.CharField(max_length=100, db_index=True)
     description = models.TextField(blank=True)
     activities = models.ForeignKey(Activity, on_delete=models.PROTECT, related_name='services', null=True)
     is_related_to_system = models.BooleanField(default=False)
@@ -25,6 +31,23 @@ class SupportService(models.Model):
         return self.name
 
 
+# Ticket field: path from SupportService to the value it is copied from.
+OWNERSHIP_FIELDS = {
+    'owning_unit': 'activities__unit',
+    'owning_section': 'activities__section',
+    'owning_department': 'activities__section__department',
+    'financial_year': 'activities__financial_year',
+}
+# Tickets that follow their service to a new owner; the rest keep the one they were worked under.
+RESYNC_STATUSES = ('open', 'in_progress')
+
+
+def service_ownership(service_ids):
+    """{service id: {ticket field: id}} with the unit, section, department and financial year of each service's activity."""
+    rows = SupportService.objects.filter(pk__in=service_ids).values('pk', *OWNERSHIP_FIELDS.values())
+    return {row['pk']: {field: row[path] for field, path in OWNERSHIP_FIELDS.items()} for row in rows}
+
+
 class SubService(models.Model):
     service = models.ForeignKey(SupportService, on_delete=models.CASCADE, related_name="sub_services")
     name = models.CharField(max_length=100)
@@ -32,16 +55,44 @@ class SubService(models.Model):
     def __str__(self):
         return f"{self.service.name} - {self.name}"
 
+def normalize_email(email):
+    return (email or '').strip().lower()
+
+
+def normalize_phone(phone):
+    digits = re.sub(r'\D', '', phone or '')
+    return digits[-15:]
+
+
+def reporter_identity(full_name='', email='', phone_number=''):
+    """
+    Identity of a reporter: the email, else the phone digits; '' without
+    either. Names are not an identity, since different people share them.
+    """
+    if normalize_email(email):
+        return f'email:{normalize_email(email)}'
+    if normalize_phone(phone_number):
+        return f'phone:{normalize_phone(phone_number)}'
+    return ''
+
+
 class ExternalReporter(models.Model):
     full_name = models.CharField(max_length=100)
-    email = models.EmailField()
-    phone_number = models.CharField(max_length=15)
+    email = models.EmailField(blank=True)
+    phone_number = models.CharField(max_length=15, blank=True)
+    # Null for reporters known only by name; each of those is a separate row.
+    identity_key = models.CharField(max_length=260, unique=True, null=True, editable=False)
 
     def __str__(self):
         return self.full_name
 
+    def save(self, *args, **kwargs):
+        self.email = normalize_email(self.email)
+        self.identity_key = reporter_identity(self.full_name, self.email, self.phone_number) or None
+        super().save(*args, **kwargs)
+
 
-class SupportTicket(models.Model):
+class BaseSupportTicket(models.Model):
     USER_TYPE_CHOICES = (
         ('internal', 'Internal User (Staff)'),
         ('external', 'External'),
@@ -64,7 +115,17 @@ class SupportTicket(models.Model):
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='open')
     submitted_at = models.DateTimeField(auto_now_add=True)
     resolved_at = models.DateTimeField(null=True, blank=True)
-    resolved_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='resolved_tickets')
+    idempotency_key = models.CharField(max_length=64, null=True, blank=True, editable=False,
+                                       help_text="Client-supplied key of tickets created through the intake API.")
+    # Keys are unique per API user, not globally: two clients may pick the same key.
+    intake_user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, editable=False, related_name='+')
+
+    # Copied from the service's activity on save and kept in sync by services.signals, so scoped
+    # ticket queries do not have to join service -> activity -> section.
+    owning_unit = models.ForeignKey(Unit, on_delete=models.SET_NULL, null=True, blank=True, editable=False, related_name='+')
+    owning_section = models.ForeignKey(Section, on_delete=models.SET_NULL, null=True, blank=True, editable=False, related_name='+')
+    owning_department = models.ForeignKey(Department, on_delete=models.SET_NULL, null=True, blank=True, editable=False, related_name='+')
+    financial_year = models.ForeignKey(FinancialYear, on_delete=models.SET_NULL, null=True, blank=True, editable=False, related_name='+')
 
     def reporter_name(self):
         if self.user_type == 'internal' and self.internal_user_name:
@@ -73,9 +134,105 @@ class SupportTicket(models.Model):
             return self.external_user
         return "NA"
 
+    def set_ownership(self):
+        ownership = service_ownership([self.service_id]).get(self.service_id, {}) if self.service_id else {}
+        for field in OWNERSHIP_FIELDS:
+            setattr(self, f'{field}_id', ownership.get(field))
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_service_id = instance.__dict__.get('service_id')
+        return instance
+
+    def follows_service(self):
+        """Whether saving recomputes the ownership fields: new, unresolved or moved to another service."""
+        if self._state.adding or self.status in RESYNC_STATUSES:
+            return True
+        return self.service_id != getattr(self, '_loaded_service_id', None)
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        if (update_fields is None or 'service' in update_fields) and self.follows_service():
+            self.set_ownership()
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, *OWNERSHIP_FIELDS}
+        super().save(*args, **kwargs)
+        self._loaded_service_id = self.service_id
+
     class Meta:
+        abstract = True
+        constraints = [
+            models.UniqueConstraint(fields=['intake_user', 'idempotency_key'], name='%(app_label)s_%(class)s_intake_key'),
+        ]
+
+
+class SupportTicket(BaseSupportTicket):
+    resolved_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='resolved_tickets')
+    reporter = models.ForeignKey(ExternalReporter, on_delete=models.SET_NULL, null=True, blank=True, related_name='tickets')
+    # Work queue claim (services.queue); an open ticket whose claim has expired can be claimed again.
+    claimed_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, editable=False, related_name='claimed_tickets')
+    claim_expires_at = models.DateTimeField(null=True, blank=True, editable=False)
+
+    class Meta(BaseSupportTicket.Meta):
         verbose_name_plural = "Services Records"
         verbose_name = "Service Record"
+        indexes = [
+            models.Index(fields=['status', 'submitted_at']),
+            models.Index(fields=['owning_section', 'submitted_at']),
+            models.Index(fields=['owning_unit', 'submitted_at']),
+            models.Index(fields=['owning_department', 'submitted_at']),
+            models.Index(fields=['claimed_by', 'claim_expires_at']),
+        ]
+
+
+class ArchivedSupportTicket(BaseSupportTicket):
+    """Closed/resolved tickets moved out of the hot table by `archive_tickets`; keeps the original id."""
+    submitted_at = models.DateTimeField(db_index=True)
+    resolved_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='archived_resolved_tickets')
+    reporter = models.ForeignKey(ExternalReporter, on_delete=models.SET_NULL, null=True, blank=True, related_name='archived_tickets')
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta(BaseSupportTicket.Meta):
+        verbose_name_plural = "Archived Services Records"
+        verbose_name = "Archived Service Record"
+
+
+class Technician(models.Model):
+    """The services and systems whose open tickets a member of staff takes from the work queue."""
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='technician')
+    services = models.ManyToManyField(SupportService, blank=True, related_name='technicians')
+    systems = models.ManyToManyField(SupportedSystem, blank=True, related_name='technicians')
+
+    def __str__(self):
+        return str(self.user)
+
+
+class OutboxEvent(models.Model):
+    """A ticket notification written in the transaction that changed the ticket; sent later by `dispatch_outbox`."""
+    EVENT_CHOICES = (
+        ('created', 'Created'),
+        ('assigned', 'Assigned'),
+        ('resolved', 'Resolved'),
+    )
+
+    event = models.CharField(max_length=20, choices=EVENT_CHOICES)
+    ticket_id = models.IntegerField(help_text="Not a foreign key: archiving moves tickets to another table.")
+    recipient = models.EmailField()
+    payload = models.JSONField(default=dict)
+    created_at = models.DateTimeField(auto_now_add=True)
+    available_at = models.DateTimeField(help_text="Not sent before this time (retry backoff and dispatcher leases).")
+    attempts = models.PositiveSmallIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['sent_at', 'available_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.get_event_display()} #{self.ticket_id} to {self.recipient}"
 
 
 class StatisticType(models.Model):
@@ -95,7 +252,9 @@ class StatisticsRecord(models.Model):
     start_date = models.DateField()
     end_date = models.DateField()
     date_prepared = models.DateField(auto_now_add=True)
-    file = models.FileField(upload_to='statistics/', blank=True, null=True)
+    file = models.FileField(upload_to='statistics/', storage=statistics_storage, blank=True, null=True)
+    ingested_file = models.CharField(max_length=255, blank=True, editable=False,
+                                     help_text="File whose figures are currently loaded into StatisticValue.")
 
     def __str__(self):
         return f"{self.title} ({self.statistic_type})"
@@ -103,3 +262,46 @@ class StatisticsRecord(models.Model):
     def clean(self):
         if self.start_date and self.end_date and self.end_date < self.start_date:
             raise ValidationError("End date cannot be earlier than start date.")
+
+
+class StatisticValue(models.Model):
+    """One numeric figure parsed from a StatisticsRecord file."""
+    record = models.ForeignKey(StatisticsRecord, on_delete=models.CASCADE, related_name='values')
+    metric = models.CharField(max_length=100)
+    period = models.DateField()
+    value = models.DecimalField(max_digits=20, decimal_places=4)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['metric', 'period']),
+        ]
+
+    def __str__(self):
+        return f"{self.metric} {self.period}: {self.value}"
+
+
+class ApiToken(models.Model):
+    """Bearer token for the ticket intake API. Only a SHA-256 of the token is stored."""
+    name = models.CharField(max_length=100)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='api_tokens')
+    key_hash = models.CharField(max_length=64, unique=True, editable=False)
+    is_active = models.BooleanField(default=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_used_at = models.DateTimeField(null=True, blank=True, editable=False)
+
+    class Meta:
+        verbose_name = "API Token"
+        verbose_name_plural = "API Tokens"
+
+    def __str__(self):
+        return self.name
+
+    @staticmethod
+    def hash_key(key):
+        return hashlib.sha256(key.encode()).hexdigest()
+
+    def generate_key(self):
+        """Set a new random key and return it; it cannot be recovered later."""
+        key = secrets.token_urlsafe(32)
+        self.key_hash = self.hash_key(key)
+        return key
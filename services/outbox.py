@@ -0,0 +1,198 @@
+"""
+Transactional outbox for ticket notifications.
+
+When a ticket is created, assigned (claimed from the work queue) or resolved,
+``record_events`` writes one ``OutboxEvent`` per recipient in the same
+transaction as the change, so a notification exists exactly when the change
+committed and saving never waits on a mail server. Recipients are the external
+reporter, the members of ``TICKET_SUPERVISOR_GROUP`` in the ticket's owning
+section or unit, and for assignments the technician.
+
+``dispatch`` (run by the ``dispatch_outbox`` command) leases a batch of due
+events, sends each recipient one message covering all of their events, and
+marks them sent. A failed send is retried with exponential backoff up to
+``OUTBOX_MAX_ATTEMPTS`` times. Several dispatchers can run at once: leasing
+uses SKIP LOCKED where the database has it and a conditional UPDATE
+elsewhere, and a dispatcher that dies mid-batch only delays its events until
+the lease runs out.
+
+Delivery goes through ``OUTBOX_BACKEND``, a class with ``open()``,
+``send(recipient, events)`` and ``close()``. The default sends mail through
+Django's ``EMAIL_BACKEND``, which is SMTP in production; locally, set it to the
+file backend and every message is written to ``EMAIL_FILE_PATH``.
+"""
+
+import datetime
+import logging
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.mail import EmailMessage, get_connection
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import OutboxEvent, SupportTicket
+
+logger = logging.getLogger(__name__)
+
+RECORD_CHUNK_SIZE = 500
+
+
+def supervisor_emails(tickets):
+    """{ticket pk: {emails}} of the active supervisors of each ticket's owning section or unit."""
+    sections = {ticket.owning_section_id for ticket in tickets} - {None}
+    units = {ticket.owning_unit_id for ticket in tickets} - {None}
+    if not settings.TICKET_SUPERVISOR_GROUP or not (sections or units):
+        return {}
+    by_section, by_unit = {}, {}
+    for email, section_id, unit_id in get_user_model().objects \
+            .filter(Q(section__in=sections) | Q(unit__in=units), is_active=True,
+                    groups__name=settings.TICKET_SUPERVISOR_GROUP) \
+            .values_list('email', 'section_id', 'unit_id').distinct():
+        by_section.setdefault(section_id, set()).add(email)
+        by_unit.setdefault(unit_id, set()).add(email)
+    return {
+        ticket.pk: by_section.get(ticket.owning_section_id, set()) | by_unit.get(ticket.owning_unit_id, set())
+        for ticket in tickets
+    }
+
+
+def ticket_payload(ticket):
+    return {
+        'ticket': ticket.pk,
+        'status': ticket.status,
+        'service': str(ticket.service) if ticket.service else None,
+        'reporter': ticket.reporter_name(),
+        'assignee': ticket.claimed_by.email if ticket.claimed_by else None,
+        'description': ticket.description[:200],
+    }
+
+
+def record_events(event, ticket_ids):
+    """Queue `event` notifications for the tickets; call it inside the transaction that changed them."""
+    ticket_ids = list(ticket_ids)
+    now = timezone.now()
+    recorded = 0
+    for start in range(0, len(ticket_ids), RECORD_CHUNK_SIZE):
+        tickets = list(SupportTicket.objects.filter(pk__in=ticket_ids[start:start + RECORD_CHUNK_SIZE])
+                       .select_related('service', 'reporter', 'claimed_by'))
+        supervisors = supervisor_emails(tickets)
+        events = []
+        for ticket in tickets:
+            recipients = set(supervisors.get(ticket.pk, ()))
+            if ticket.reporter and ticket.reporter.email:
+                recipients.add(ticket.reporter.email)
+            if event == 'assigned' and ticket.claimed_by:
+                recipients.add(ticket.claimed_by.email)
+            payload = ticket_payload(ticket)
+            events.extend(OutboxEvent(event=event, ticket_id=ticket.pk, recipient=recipient, payload=payload,
+                                      available_at=now) for recipient in sorted(recipients))
+        OutboxEvent.objects.bulk_create(events)
+        recorded += len(events)
+    return recorded
+
+
+def compose(events):
+    """(subject, body) of one message covering `events`."""
+    labels = dict(OutboxEvent.EVENT_CHOICES)
+    if len(events) == 1:
+        subject = f"Ticket #{events[0].ticket_id} {labels[events[0].event].lower()}"
+    else:
+        subject = f"{len(events)} ticket updates"
+    lines = []
+    for event in events:
+        payload = event.payload
+        lines.append(f"Ticket #{event.ticket_id} {labels[event.event].lower()}"
+                     f" ({payload.get('service') or 'no service'}, status: {payload.get('status')})")
+        if payload.get('assignee'):
+            lines.append(f"  Assigned to: {payload['assignee']}")
+        lines.append(f"  Reported by: {payload.get('reporter')}")
+        lines.append(f"  {payload.get('description', '')}")
+        lines.append('')
+    return subject, '\n'.join(lines)
+
+
+class EmailBackend:
+    """Sends through Django's EMAIL_BACKEND over one connection per batch."""
+
+    def __init__(self):
+        self.connection = get_connection()
+
+    def open(self):
+        self.connection.open()
+
+    def close(self):
+        self.connection.close()
+
+    def send(self, recipient, events):
+        subject, body = compose(events)
+        EmailMessage(subject, body, settings.DEFAULT_FROM_EMAIL, [recipient], connection=self.connection).send()
+
+
+def get_backend():
+    return import_string(settings.OUTBOX_BACKEND)()
+
+
+def retry_delay(attempts):
+    """Seconds to wait after the `attempts`th failed send: doubling from OUTBOX_RETRY_SECONDS, capped."""
+    return min(settings.OUTBOX_RETRY_SECONDS * 2 ** (attempts - 1), settings.OUTBOX_RETRY_MAX_SECONDS)
+
+
+def lease_batch(batch_size, now):
+    """Reserve up to `batch_size` due events for this dispatcher by moving them past the lease; returns them."""
+    due = OutboxEvent.objects.filter(
+        sent_at__isnull=True, available_at__lte=now, attempts__lt=settings.OUTBOX_MAX_ATTEMPTS,
+    ).order_by('available_at', 'pk')
+    lease_until = now + datetime.timedelta(seconds=settings.OUTBOX_LEASE_SECONDS)
+    with transaction.atomic():
+        if connection.features.has_select_for_update_skip_locked:
+            due = due.select_for_update(skip_locked=True)
+        ids = list(due.values_list('pk', flat=True)[:batch_size])
+        # Without row locks another dispatcher may have read the same ids; only one of the updates matches.
+        OutboxEvent.objects.filter(pk__in=ids, available_at__lte=now).update(available_at=lease_until)
+    return list(OutboxEvent.objects.filter(pk__in=ids, available_at=lease_until).order_by('pk'))
+
+
+def record_failure(events, error, now):
+    for event in events:
+        event.attempts += 1
+        event.last_error = f"{type(error).__name__}: {error}"[:1000]
+        event.available_at = now + datetime.timedelta(seconds=retry_delay(event.attempts))
+    OutboxEvent.objects.bulk_update(events, ['attempts', 'last_error', 'available_at'])
+
+
+def dispatch(batch_size=100, backend=None, now=None):
+    """Send one batch of due events, one message per recipient. Returns (events sent, events failed)."""
+    now = now or timezone.now()
+    events = lease_batch(batch_size, now)
+    if not events:
+        return 0, 0
+    by_recipient = {}
+    for event in events:
+        by_recipient.setdefault(event.recipient, []).append(event)
+
+    backend = backend or get_backend()
+    try:
+        backend.open()
+    except Exception as error:
+        logger.warning("Outbox backend unavailable: %s", error)
+        record_failure(events, error, now)
+        return 0, len(events)
+
+    sent = failed = 0
+    try:
+        for recipient, group in by_recipient.items():
+            try:
+                backend.send(recipient, group)
+            except Exception as error:
+                logger.warning("Sending %d outbox event(s) to %s failed: %s", len(group), recipient, error)
+                record_failure(group, error, now)
+                failed += len(group)
+            else:
+                OutboxEvent.objects.filter(pk__in=[event.pk for event in group]).update(sent_at=timezone.now())
+                sent += len(group)
+    finally:
+        backend.close()
+    return sent, failed
@@ -0,0 +1,63 @@
+"""
+Upkeep of the owning unit, section, department and financial year that
+tickets copy from their service's activity (see ``OWNERSHIP_FIELDS``).
+
+When the mapping they come from changes (a service moved to another
+activity, an activity moved to another unit, section or year, a section moved
+to another department), the affected open and in-progress tickets are
+rewritten in place with one UPDATE that reads the values back from the
+service; that UPDATE skips save() and its signals, so the ticket caches
+(admin facet counts, the report data stamp) are invalidated once it commits.
+Resolved, closed and archived tickets keep the owner they had while they were
+worked on, so a reorganisation does not change reports for past periods.
+
+A ticket also sets the fields itself on save, under the same rule: a resolved
+or closed ticket is only given a new owner when it moves to another service.
+Bulk inserts and rows written before these fields existed are covered by
+``backfill_ownership``, which fills in resolved and closed tickets only when
+they have no owner at all.
+"""
+
+from django.db import transaction
+from django.db.models import OuterRef, Q, Subquery
+
+from .models import OWNERSHIP_FIELDS, RESYNC_STATUSES, SupportService, SupportTicket
+from .transitions import invalidate_ticket_caches
+
+
+def ownership_from_service():
+    """update() values recomputing every ownership field from the ticket's service."""
+    return {
+        field: Subquery(SupportService.objects.filter(pk=OuterRef('service_id')).values(path)[:1])
+        for field, path in OWNERSHIP_FIELDS.items()
+    }
+
+
+def refresh_ownership(**filters):
+    """Recompute the ownership fields of the unresolved tickets matching `filters`; returns the row count."""
+    updated = SupportTicket.objects.filter(status__in=RESYNC_STATUSES, **filters).update(**ownership_from_service())
+    if updated:
+        transaction.on_commit(invalidate_ticket_caches)
+    return updated
+
+
+def unowned():
+    return Q(**{f'{field}__isnull': True for field in OWNERSHIP_FIELDS})
+
+
+def backfill_ownership(model, batch_size=1000, after=0):
+    """
+    Recompute the ownership fields of the unresolved and the unowned tickets
+    of `model`, `batch_size` tickets per short transaction, walking the
+    primary key upwards from `after`. Yields (last pk, tickets updated) after
+    each batch.
+    """
+    while True:
+        batch = list(model.objects.filter(pk__gt=after).order_by('pk').values_list('pk', flat=True)[:batch_size])
+        if not batch:
+            return
+        with transaction.atomic():
+            updated = model.objects.filter(Q(status__in=RESYNC_STATUSES) | unowned(),
+                                           pk__gte=batch[0], pk__lte=batch[-1]).update(**ownership_from_service())
+        after = batch[-1]
+        yield after, updated
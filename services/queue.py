@@ -0,0 +1,69 @@
+"""
+Work queue of open tickets for technicians.
+
+``claim_next`` hands a technician the oldest open ticket of their services or
+systems that nobody holds a live claim on, and records the claim with an
+expiry (``TICKET_CLAIM_SECONDS``). A claim that runs out before the ticket
+leaves 'open' simply makes the ticket claimable again; no sweeper is needed.
+
+On databases with ``SELECT ... FOR UPDATE SKIP LOCKED`` (PostgreSQL, MySQL
+8), concurrent claimers lock different candidate rows and never wait on one
+another. Elsewhere (SQLite) the candidates are read without locks and
+claimed with a conditional UPDATE that only succeeds while the ticket is
+still unclaimed; a claimer that loses the race moves on to the next
+candidate.
+"""
+
+import datetime
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import SupportTicket, Technician
+from .outbox import record_events
+
+# Candidates tried per claim_next() call on databases without SKIP LOCKED.
+CLAIM_ATTEMPTS = 20
+
+
+def queue_filter(user):
+    """Q for the tickets in `user`'s queue: their services or systems, or every ticket without a Technician profile."""
+    technician = Technician.objects.filter(user=user).values_list('pk', flat=True).first()
+    if technician is None:
+        return Q()
+    return Q(service__technicians=technician) | Q(system__technicians=technician)
+
+
+def claimable(now):
+    return Q(status='open') & (Q(claim_expires_at__isnull=True) | Q(claim_expires_at__lte=now))
+
+
+def claim_next(user, now=None):
+    """Claim the oldest claimable ticket in `user`'s queue; returns it, or None when the queue is empty."""
+    now = now or timezone.now()
+    claim = {'claimed_by': user, 'claim_expires_at': now + datetime.timedelta(seconds=settings.TICKET_CLAIM_SECONDS)}
+    # The service/system match goes through a subquery so the locking SELECT reads the tickets table only.
+    in_queue = SupportTicket.objects.filter(queue_filter(user)).values('pk')
+    candidates = SupportTicket.objects.filter(claimable(now), pk__in=in_queue).order_by('submitted_at', 'pk')
+
+    with transaction.atomic():
+        if connection.features.has_select_for_update_skip_locked:
+            pk = candidates.select_for_update(skip_locked=True).values_list('pk', flat=True).first()
+            if pk is None:
+                return None
+            SupportTicket.objects.filter(pk=pk).update(**claim)
+        else:
+            for pk in candidates.values_list('pk', flat=True)[:CLAIM_ATTEMPTS]:
+                if SupportTicket.objects.filter(claimable(now), pk=pk).update(**claim):
+                    break
+            else:
+                return None
+        record_events('assigned', [pk])
+    return SupportTicket.objects.select_related('system', 'service').get(pk=pk)
+
+
+def release_claims(queryset):
+    """Drop the claims on the tickets in `queryset`, making the open ones claimable again; returns the count."""
+    return queryset.filter(claimed_by__isnull=False).order_by().update(claimed_by=None, claim_expires_at=None)
@@ -0,0 +1,110 @@
+"""
+External reporter registry.
+
+Tickets used to name their external reporter only in free text
+(``external_user``); ``reporter`` now points at an ExternalReporter whose
+``identity_key`` (normalised email, else phone digits) is unique. A reporter
+given only by name is not linked: two "John"s are not the same person.
+Resolved identities are kept in a process-local LRU, so looking up the same
+reporters again costs no queries. Rows are only cached once the transaction
+that found or created them commits. Deleting a reporter clears this process's
+cache only; reporters are not meant to be deleted while workers are running.
+"""
+
+import re
+from collections import OrderedDict
+
+from django.db import transaction
+from django.db.models import Case, When
+
+from .models import ExternalReporter, normalize_email, normalize_phone, reporter_identity
+
+EMAIL_RE = re.compile(r'[\w.+-]+@[\w-]+(?:\.[\w-]+)+')
+PHONE_RE = re.compile(r'\+?\d[\d ()-]{5,}\d')
+CACHE_SIZE = 10000
+CHUNK_SIZE = 1000
+
+_reporters = OrderedDict()
+
+
+def parse_reporter(text):
+    """Split a free-text reporter such as 'Jane Doe <jane@example.com>' into ExternalReporter fields."""
+    text = (text or '').strip()
+    email = EMAIL_RE.search(text)
+    phone = PHONE_RE.search(EMAIL_RE.sub(' ', text))
+    name = text
+    for match in (email, phone):
+        if match:
+            name = name.replace(match.group(), ' ')
+    name = ' '.join(name.strip(' <>()[],;:-').split()) or (email.group() if email else '') or (phone.group() if phone else '')
+    return {
+        'full_name': name[:100],
+        'email': normalize_email(email.group()) if email else '',
+        'phone_number': normalize_phone(phone.group()) if phone else '',
+    }
+
+
+def remember(reporters):
+    for reporter in reporters:
+        _reporters[reporter.identity_key] = reporter
+        _reporters.move_to_end(reporter.identity_key)
+    while len(_reporters) > CACHE_SIZE:
+        _reporters.popitem(last=False)
+
+
+def forget_reporters():
+    _reporters.clear()
+
+
+def resolve_reporters(texts):
+    """
+    {text: ExternalReporter} for free-text reporters, creating the missing ones
+    with one bulk insert per chunk. Texts without an email or phone number are
+    left out.
+    """
+    fields = {text: parse_reporter(text) for text in set(texts) if text}
+    identities = {text: reporter_identity(**values) for text, values in fields.items()}
+    found = {identity: _reporters[identity] for identity in identities.values() if identity in _reporters}
+    missing = {identity: fields[text] for text, identity in identities.items() if identity and identity not in found}
+
+    keys = list(missing)
+    for start in range(0, len(keys), CHUNK_SIZE):
+        chunk = keys[start:start + CHUNK_SIZE]
+        ExternalReporter.objects.bulk_create(
+            [ExternalReporter(identity_key=identity, **missing[identity]) for identity in chunk],
+            ignore_conflicts=True,
+        )
+        loaded = list(ExternalReporter.objects.filter(identity_key__in=chunk))
+        found.update((reporter.identity_key, reporter) for reporter in loaded)
+        transaction.on_commit(lambda loaded=loaded: remember(loaded))
+
+    return {text: found[identity] for text, identity in identities.items() if identity in found}
+
+
+def get_or_create_reporter(text):
+    """The ExternalReporter for one free-text reporter, or None when it has no email or phone number."""
+    return resolve_reporters([text]).get(text)
+
+
+def backfill_reporters(model, batch_size=1000, after=0):
+    """
+    Link existing external tickets of `model` to reporters, `batch_size`
+    tickets per short transaction, walking the primary key upwards from
+    `after`. Yields (last pk, tickets linked) after each batch; rerunning
+    picks up the tickets that are still unlinked. Tickets whose reporter has
+    no email or phone number stay unlinked.
+    """
+    pending = model.objects.filter(reporter__isnull=True, user_type='external', external_user__gt='').order_by('pk')
+    while True:
+        batch = list(pending.filter(pk__gt=after).values_list('pk', 'external_user')[:batch_size])
+        if not batch:
+            return
+        reporters = resolve_reporters(text for _, text in batch)
+        links = {pk: reporters[text].pk for pk, text in batch if text in reporters}
+        if links:
+            with transaction.atomic():
+                model.objects.filter(pk__in=links, reporter__isnull=True).update(
+                    reporter_id=Case(*[When(pk=pk, then=reporter_id) for pk, reporter_id in links.items()])
+                )
+        after = batch[-1][0]
+        yield after, len(links)
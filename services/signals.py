@@ -0,0 +1,64 @@
+import logging
+
+from django.core.cache import cache
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from activities.models import Activity
+from office.models import Section
+from .ingest import ingest_statistics_record
+from .intake import lookup_cache_key
+from .models import ExternalReporter, StatisticsRecord, SupportService, SupportedSystem
+from .ownership import refresh_ownership
+from .reporters import forget_reporters
+
+logger = logging.getLogger(__name__)
+
+
+@receiver(post_save, sender=StatisticsRecord)
+def ingest_statistics_file(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    try:
+        ingest_statistics_record(instance)
+    except Exception:
+        # A malformed upload must not block saving the record; `ingest_statistics` can retry it.
+        logger.exception("Statistics ingestion failed for record %s", instance.pk)
+
+
+@receiver([post_save, post_delete], sender=SupportService)
+@receiver([post_save, post_delete], sender=SupportedSystem)
+def clear_intake_lookup(sender, **kwargs):
+    cache.delete(lookup_cache_key(sender))
+
+
+@receiver(post_delete, sender=ExternalReporter)
+def clear_reporter_cache(sender, **kwargs):
+    forget_reporters()
+
+
+# Fields whose change moves tickets to another owner, and the tickets affected.
+OWNERSHIP_SOURCES = {
+    SupportService: (('activities_id',), 'service'),
+    Activity: (('unit_id', 'section_id', 'financial_year_id'), 'service__activities'),
+    Section: (('department_id',), 'owning_section'),
+}
+
+
+@receiver(pre_save, sender=SupportService)
+@receiver(pre_save, sender=Activity)
+@receiver(pre_save, sender=Section)
+def note_ownership_change(sender, instance, raw=False, **kwargs):
+    fields, _ = OWNERSHIP_SOURCES[sender]
+    old = None if raw or instance.pk is None else sender._base_manager.filter(pk=instance.pk).values(*fields).first()
+    instance._ownership_changed = old is not None and any(old[field] != getattr(instance, field) for field in fields)
+
+
+@receiver(post_save, sender=SupportService)
+@receiver(post_save, sender=Activity)
+@receiver(post_save, sender=Section)
+def update_ticket_ownership(sender, instance, **kwargs):
+    if getattr(instance, '_ownership_changed', False):
+        _, lookup = OWNERSHIP_SOURCES[sender]
+        refresh_ownership(**{lookup: instance.pk})
+        instance._ownership_changed = False
@@ -0,0 +1,78 @@
+import hashlib
+import os
+import posixpath
+import tempfile
+
+from django.core.files.storage import FileSystemStorage
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    Stores each file under the SHA-256 of its content, so re-uploading the same
+    spreadsheet reuses the existing copy. Names look like
+    ``statistics/ab/cd/abcd...ef.xlsx``; the upload's directory and extension
+    are kept, its base name is not.
+    """
+
+    chunk_size = 64 * 1024
+
+    def _save(self, name, content):
+        directory, filename = posixpath.split(name)
+        extension = os.path.splitext(filename)[1].lower()
+
+        os.makedirs(self.location, exist_ok=True)
+        digest = hashlib.sha256()
+        fd, temp_path = tempfile.mkstemp(dir=self.location, prefix='.upload-')
+        try:
+            with os.fdopen(fd, 'wb') as temp:
+                if hasattr(content, 'seek'):
+                    content.seek(0)
+                for chunk in content.chunks(self.chunk_size):
+                    if isinstance(chunk, str):
+                        chunk = chunk.encode()
+                    digest.update(chunk)
+                    temp.write(chunk)
+
+            hexdigest = digest.hexdigest()
+            name = posixpath.join(directory, hexdigest[:2], hexdigest[2:4], hexdigest + extension)
+            full_path = self.path(name)
+            if os.path.exists(full_path):
+                os.remove(temp_path)
+            else:
+                os.makedirs(os.path.dirname(full_path), exist_ok=True)
+                if self.file_permissions_mode is not None:
+                    os.chmod(temp_path, self.file_permissions_mode)
+                os.replace(temp_path, full_path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        return name
+
+    def get_available_name(self, name, max_length=None):
+        # The final name is derived from the content in _save(); identical
+        # content must map to the same name rather than a suffixed copy.
+        return name
+
+    def delete(self, name):
+        # Files are shared between records with identical uploads, so they are
+        # never removed through a single record; `prune_statistics_files`
+        # removes the ones no record refers to any more.
+        pass
+
+    def remove(self, name):
+        """Delete `name` for good (``delete`` is deliberately a no-op)."""
+        super().delete(name)
+
+    def walk(self, directory):
+        """Names of every file below `directory`."""
+        if not self.exists(directory):
+            return
+        directories, files = self.listdir(directory)
+        for filename in files:
+            yield posixpath.join(directory, filename)
+        for subdirectory in directories:
+            yield from self.walk(posixpath.join(directory, subdirectory))
+
+
+statistics_storage = ContentAddressedStorage()
@@ -1,3 +1,705 @@
-from django.test import TestCase
+import datetime
+import hashlib
+import json
+import tempfile
+from decimal import Decimal
+from io import StringIO
 
-# Create your tests here.
+from django.contrib.auth.models import Group, Permission
+from django.core import mail
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.utils import timezone
+from django.db import DEFAULT_DB_ALIAS, connection, connections, router, transaction
+from django.http import HttpResponse
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import path, reverse
+
+from activities.models import Activity, FinancialYear
+from authentication.models import CustomUser
+from isd.facets import facet_version_key
+from isd.routers import REPLICA_DB_ALIAS, is_pinned, read_from_replica, reset_pin, use_replica
+from isd.testing import QueryBudgetTestCase
+from office.models import Department, Section, Unit
+from services.models import (
+    ApiToken, ExternalReporter, OutboxEvent, SupportService, SupportTicket, SupportedSystem, StatisticsRecord,
+    Technician,
+)
+from services.intake import insert_tickets
+from services.outbox import dispatch
+from services.queue import claim_next
+from services.reporters import forget_reporters, get_or_create_reporter
+from services.transitions import transition_tickets
+
+
+class TicketAdminQueryBudgetTests(QueryBudgetTestCase):
+    def test_changelist(self):
+        self.assertQueryBudget(reverse('admin:services_supportticket_changelist'), 10)
+
+    def test_changelist_facets(self):
+        self.assertFacetsCached(reverse('admin:services_supportticket_changelist'))
+
+    def test_facet_counts_follow_edits(self):
+        url = reverse('admin:services_supportticket_changelist')
+        self.count_queries(self.superuser, f'{url}?_facets=1')
+        open_count = SupportTicket.objects.filter(status='open').count()
+        self.assertContains(self.client.get(url, {'_facets': '1'}), f'Open ({open_count})')
+        SupportTicket.objects.filter(status='open').first().delete()
+        self.assertContains(self.client.get(url, {'_facets': '1'}), f'Open ({open_count - 1})')
+
+    def test_add_form(self):
+        self.assertQueryBudget(reverse('admin:services_supportticket_add'), 10)
+
+    def test_change_form(self):
+        self.assertQueryBudget(lambda: reverse('admin:services_supportticket_change', args=[SupportTicket.objects.first().pk]), 10)
+
+
+class StatisticRecordAdminQueryBudgetTests(QueryBudgetTestCase):
+    def test_changelist(self):
+        self.assertQueryBudget(reverse('admin:services_statisticsrecord_changelist'), 10)
+
+    def test_add_form(self):
+        self.assertQueryBudget(reverse('admin:services_statisticsrecord_add'), 10)
+
+    def test_change_form(self):
+        self.assertQueryBudget(lambda: reverse('admin:services_statisticsrecord_change', args=[StatisticsRecord.objects.first().pk]), 10)
+
+
+def use_temporary_media(test):
+    directory = tempfile.TemporaryDirectory()
+    test.addCleanup(directory.cleanup)
+    settings = override_settings(MEDIA_ROOT=directory.name)
+    settings.enable()
+    test.addCleanup(settings.disable)
+
+
+def statistics_record(content, name='figures.csv', **fields):
+    return StatisticsRecord.objects.create(**{
+        'title': 'Visits', 'description': 'Monthly visits', 'start_date': datetime.date(2025, 7, 1),
+        'end_date': datetime.date(2025, 8, 31), 'file': ContentFile(content, name=name), **fields,
+    })
+
+
+class StatisticsDownloadTests(TestCase):
+    content = b'period,visits\n2025-07,10\n2025-08,12\n'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_superuser('stats@example.com', None, full_name='Stats')
+
+    def setUp(self):
+        use_temporary_media(self)
+        self.record = statistics_record(self.content)
+        self.url = reverse('download_statistics_file', args=[self.record.pk])
+        self.client.force_login(self.user)
+
+    def download(self, **headers):
+        response = self.client.get(self.url, headers=headers)
+        body = b''.join(response.streaming_content) if response.streaming else response.content
+        return response, body
+
+    def test_whole_file(self):
+        response, body = self.download()
+        self.assertEqual((response.status_code, body), (200, self.content))
+        self.assertEqual(response['ETag'], f'"{hashlib.sha256(self.content).hexdigest()}"')
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertEqual(statistics_record(self.content, name='copy.csv').file.name, self.record.file.name)
+
+    def test_ranges(self):
+        size = len(self.content)
+        for header, start, end in (('bytes=0-5', 0, 5), ('bytes=10-', 10, size - 1), ('bytes=-4', size - 4, size - 1),
+                                   ('bytes=20-9999', 20, size - 1)):
+            response, body = self.download(Range=header)
+            self.assertEqual(response.status_code, 206, header)
+            self.assertEqual(body, self.content[start:end + 1], header)
+            self.assertEqual(response['Content-Range'], f'bytes {start}-{end}/{size}', header)
+            self.assertEqual(response['Content-Length'], str(end - start + 1), header)
+
+    def test_unsatisfiable_range(self):
+        for header in (f'bytes={len(self.content)}-', 'bytes=5-2', 'bytes=-0'):
+            response, _ = self.download(Range=header)
+            self.assertEqual(response.status_code, 416, header)
+            self.assertEqual(response['Content-Range'], f'bytes */{len(self.content)}', header)
+
+    def test_unsupported_range_serves_whole_file(self):
+        response, body = self.download(Range='bytes=0-1,4-5')
+        self.assertEqual((response.status_code, body), (200, self.content))
+
+    def test_if_range(self):
+        etag = self.download()[0]['ETag']
+        response, body = self.download(Range='bytes=0-5', If_Range=etag)
+        self.assertEqual((response.status_code, body), (206, self.content[:6]))
+        response, body = self.download(Range='bytes=0-5', If_Range='"stale"')
+        self.assertEqual((response.status_code, body), (200, self.content))
+
+    def test_if_none_match(self):
+        etag = self.download()[0]['ETag']
+        response, body = self.download(If_None_Match=etag)
+        self.assertEqual((response.status_code, body), (304, b''))
+        self.assertEqual(response['ETag'], etag)
+        self.assertEqual(self.download(If_None_Match='"other"')[0].status_code, 200)
+
+
+    def test_prune_unreferenced_files(self):
+        shared = statistics_record(self.content, name='copy.csv')
+        replaced = statistics_record(b'period,visits\n2025-07,1\n')
+        old_name = replaced.file.name
+        replaced.file = ContentFile(b'period,visits\n2025-07,2\n', name='fixed.csv')
+        replaced.save()
+        deleted = statistics_record(b'period,visits\n2025-07,3\n')
+        deleted_name = deleted.file.name
+        deleted.delete()
+        storage = self.record.file.storage
+
+        call_command('prune_statistics_files', stdout=StringIO())
+        self.assertTrue(storage.exists(old_name))  # too new: its record may not be saved yet
+
+        self.record.delete()  # the same file is still used by `shared`
+        call_command('prune_statistics_files', '--grace-hours', '0', stdout=StringIO())
+        self.assertFalse(storage.exists(old_name))
+        self.assertFalse(storage.exists(deleted_name))
+        self.assertEqual(sorted(storage.walk('statistics')), sorted([shared.file.name, replaced.file.name]))
+
+
+class StatisticsIngestTests(TestCase):
+    def setUp(self):
+        use_temporary_media(self)
+
+    def values(self, record):
+        return sorted(record.values.values_list('metric', 'period', 'value'))
+
+    def test_long_layout_skips_malformed_rows(self):
+        record = statistics_record(
+            b'\xef\xbb\xbfMetric,Value,Period\n'
+            b'visits,"1,200",2025-07\n'
+            b'visits,n/a,2025-08\n'        # not a number
+            b',5,2025-08\n'                # no metric
+            b'visits\n'                    # too short
+            b'calls,7,someday\n'           # unreadable period: the record's start date
+            b'calls,inf,2025-08\n'
+            b'calls,\xff3,2025-08\n'       # not UTF-8
+        )
+        self.assertEqual(self.values(record), [
+            ('calls', datetime.date(2025, 7, 1), Decimal('7')),
+            ('visits', datetime.date(2025, 7, 1), Decimal('1200')),
+        ])
+        self.assertEqual(record.ingested_file, record.file.name)
+
+    def test_wide_layout(self):
+        record = statistics_record(b'month,visits,calls\n07/2025,10,x\n\n2025-08-01,12,3\n')
+        self.assertEqual(self.values(record), [
+            ('calls', datetime.date(2025, 8, 1), Decimal('3')),
+            ('visits', datetime.date(2025, 7, 1), Decimal('10')),
+            ('visits', datetime.date(2025, 8, 1), Decimal('12')),
+        ])
+
+    def test_rerunning_the_same_file(self):
+        content = b'period,visits\n2025-07,10\n2025-08,12\n'
+        record = statistics_record(content)
+        self.assertEqual(record.values.count(), 2)
+
+        record.file = ContentFile(content, name='again.csv')
+        with self.assertNumQueries(1):  # the same content keeps its name, so only the save runs
+            record.save()
+        out = StringIO()
+        call_command('ingest_statistics', stdout=out)
+        self.assertIn('Ingested 0 records (0 values)', out.getvalue())
+        call_command('ingest_statistics', '--force', stdout=out)
+        self.assertEqual(record.values.count(), 2)
+
+        record.file = ContentFile(b'period,visits\n2025-09,4\n', name='september.csv')
+        record.save()
+        self.assertEqual(self.values(record), [('visits', datetime.date(2025, 9, 1), Decimal('4'))])
+
+
+class TicketTransitionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.superuser = CustomUser.objects.create_superuser('admin@example.com', None, full_name='Admin')
+        resolver = CustomUser.objects.create_user('tech@example.com', None, full_name='Tech', is_staff=True)
+        service = SupportService.objects.create(name='Printing')
+        for status in ('open', 'in_progress', 'resolved', 'closed') * 2:
+            resolved = {'resolved_at': timezone.now(), 'resolved_by': resolver} if status in ('resolved', 'closed') else {}
+            SupportTicket.objects.create(user_type='internal', internal_user_name='Staff', service=service,
+                                         description='Printer jam', status=status, **resolved)
+
+    def test_admin_action_is_one_update(self):
+        self.client.force_login(self.superuser)
+        open_ids = list(SupportTicket.objects.filter(status='open').values_list('pk', flat=True))
+        version = cache.get(facet_version_key(SupportTicket), 0)
+        with self.captureOnCommitCallbacks(execute=True), CaptureQueriesContext(connection) as queries:
+            response = self.client.post(reverse('admin:services_supportticket_changelist'), {
+                'action': 'mark_closed', '_selected_action': open_ids,
+            })
+        self.assertEqual(response.status_code, 302)
+        updates = [q for q in queries.captured_queries if q['sql'].startswith('UPDATE "services_supportticket"')]
+        self.assertEqual(len(updates), 1)
+
+        closed = SupportTicket.objects.filter(pk__in=open_ids)
+        self.assertFalse(closed.exclude(status='closed').exists())
+        self.assertFalse(closed.filter(resolved_at__isnull=True).exists())
+        self.assertFalse(closed.exclude(resolved_by=self.superuser).exists())
+        self.assertEqual(cache.get(facet_version_key(SupportTicket)), version + 1)
+
+    def test_command_reopens(self):
+        closed = SupportTicket.objects.filter(status='closed')
+        ids = list(closed.values_list('pk', flat=True))
+        call_command('transition_tickets', 'closed', '--from-status', 'resolved', stdout=StringIO())
+        self.assertFalse(SupportTicket.objects.filter(status='resolved').exists())
+        call_command('transition_tickets', 'open', '--ids', ','.join(map(str, ids)), stdout=StringIO())
+        reopened = SupportTicket.objects.filter(pk__in=ids)
+        self.assertFalse(reopened.exclude(status='open').exists())
+        self.assertFalse(reopened.filter(resolved_at__isnull=False).exists())
+        self.assertFalse(reopened.filter(resolved_by__isnull=False).exists())
+
+    def test_in_progress_clears_resolver(self):
+        ids = list(SupportTicket.objects.filter(status='resolved').values_list('pk', flat=True))
+        self.assertEqual(transition_tickets(SupportTicket.objects.filter(pk__in=ids), 'in_progress'), len(ids))
+        moved = SupportTicket.objects.filter(pk__in=ids)
+        self.assertFalse(moved.filter(resolved_by__isnull=False).exists())
+        self.assertFalse(moved.filter(resolved_at__isnull=False).exists())
+
+
+class TicketIntakeTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.superuser = CustomUser.objects.create_superuser('admin@example.com', None, full_name='Admin')
+        cls.service = SupportService.objects.create(name='Printing')
+
+    def setUp(self):
+        token = ApiToken(name='helpdesk', user=self.superuser)
+        self.key = token.generate_key()
+        token.save()
+
+    def post(self, tickets, key=None):
+        return self.client.post(reverse('ticket_intake'), json.dumps({'tickets': tickets}),
+                                content_type='application/json', HTTP_AUTHORIZATION=f'Bearer {key or self.key}')
+
+    def tickets(self, count, prefix='t'):
+        return [{'idempotency_key': f'{prefix}-{i}', 'description': 'Printer jam', 'user_type': 'external',
+                 'service': self.service.name, 'reporter': 'Jane'} for i in range(count)]
+
+    def test_admin_search(self):
+        self.client.force_login(self.superuser)
+        response = self.client.get(reverse('admin:services_apitoken_changelist'), {'q': 'admin@example'})
+        self.assertContains(response, 'helpdesk')
+
+    def test_rejects_bad_token(self):
+        response = self.post(self.tickets(1), key='wrong')
+        self.assertEqual(response.status_code, 401)
+        self.assertFalse(SupportTicket.objects.filter(idempotency_key='t-0').exists())
+
+    def test_retry_does_not_duplicate(self):
+        tickets = self.tickets(5) + [{'idempotency_key': 'bad', 'user_type': 'staff', 'service': 'nope'}]
+        response = self.post(tickets)
+        self.assertEqual(response.status_code, 201)
+        body = response.json()
+        self.assertEqual((body['created'], body['duplicates']), (5, 0))
+        self.assertEqual(body['errors'][0]['index'], 5)
+        self.assertEqual(set(body['errors'][0]['errors']), {'description', 'user_type', 'service'})
+
+        body = self.post(tickets + self.tickets(1, prefix='new')).json()
+        self.assertEqual((body['created'], body['duplicates']), (1, 5))
+        created = SupportTicket.objects.filter(idempotency_key__startswith='t-')
+        self.assertEqual(created.count(), 5)
+        self.assertFalse(created.exclude(service=self.service, external_user='Jane', resolved_by=self.superuser).exists())
+        self.assertFalse(created.filter(reporter__isnull=False).exists())  # a name alone is not an identity
+
+    def test_rejects_values_of_the_wrong_type(self):
+        tickets = self.tickets(4, prefix='typed')
+        tickets[0]['service'] = [self.service.pk]
+        tickets[1]['user_type'] = ['external']
+        tickets[2]['status'] = {'a': 1}
+        tickets[3]['system'] = {'name': 'Email'}
+        response = self.post(tickets + self.tickets(1, prefix='fine'))
+        self.assertEqual(response.status_code, 201)
+        body = response.json()
+        self.assertEqual(body['created'], 1)
+        self.assertEqual([(error['index'], list(error['errors'])) for error in body['errors']],
+                         [(0, ['service']), (1, ['user_type']), (2, ['status']), (3, ['system'])])
+
+    def test_keys_are_scoped_to_the_api_user(self):
+        self.assertEqual(self.post(self.tickets(2)).json()['created'], 2)
+        other = CustomUser.objects.create_user('other@example.com', None, full_name='Other', is_staff=True)
+        other.user_permissions.add(Permission.objects.get(codename='add_supportticket'))
+        token = ApiToken(name='other client', user=other)
+        key = token.generate_key()
+        token.save()
+        body = self.post(self.tickets(2), key=key).json()
+        self.assertEqual((body['created'], body['duplicates']), (2, 0))
+        self.assertEqual(SupportTicket.objects.filter(idempotency_key='t-0').count(), 2)
+
+    def test_insert_skips_keys_taken_by_a_concurrent_request(self):
+        def ticket(key):
+            return SupportTicket(idempotency_key=key, intake_user=self.superuser, description='Printer jam',
+                                 user_type='internal', service=self.service)
+
+        ticket('race').save()  # committed by the other request after this one looked the keys up
+        created = insert_tickets([ticket('race'), ticket('mine')], self.superuser)
+        self.assertEqual([t.idempotency_key for t in created], ['mine'])
+        self.assertEqual(SupportTicket.objects.filter(idempotency_key='race').count(), 1)
+
+    def test_query_count_does_not_grow_with_batch(self):
+        def count(tickets):
+            with CaptureQueriesContext(connection) as queries:
+                self.assertEqual(self.post(tickets).status_code, 201)
+            return len(queries)
+
+        self.post(self.tickets(1, prefix='warm'))
+        small = count(self.tickets(10, prefix='small'))
+        # Only the INSERT is split, by the backend's limit on parameters per statement.
+        fields = [f for f in SupportTicket._meta.concrete_fields if not f.primary_key]
+        inserts = -(-500 // connection.ops.bulk_batch_size(fields, [None] * 500))
+        self.assertLessEqual(count(self.tickets(500, prefix='large')), small - 1 + inserts)
+
+
+class ExternalReporterTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.service = SupportService.objects.create(name='Printing')
+
+    def setUp(self):
+        forget_reporters()
+
+    def test_identity_is_normalised(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            jane = get_or_create_reporter('Jane Doe <Jane@Example.com>')
+        self.assertEqual(jane.identity_key, 'email:jane@example.com')
+        with self.assertNumQueries(0):
+            self.assertEqual(get_or_create_reporter('Jane Doe <Jane@Example.com>'), jane)
+        self.assertEqual(get_or_create_reporter('J. Doe jane@example.com').pk, jane.pk)
+        self.assertEqual(get_or_create_reporter('Bob 0712 345 678').phone_number, '0712345678')
+        self.assertIsNone(get_or_create_reporter('Bob'))
+        self.assertIsNone(get_or_create_reporter('  '))
+
+    def test_name_only_reporters_are_not_merged(self):
+        first = ExternalReporter.objects.create(full_name='John')
+        second = ExternalReporter.objects.create(full_name='john')
+        self.assertNotEqual(first.pk, second.pk)
+        self.assertIsNone(second.identity_key)
+
+    def test_backfill_is_resumable(self):
+        for name in ['Jane <jane@example.com>', 'jane@EXAMPLE.com', '  bob ', 'Bob', ''] * 3:
+            SupportTicket.objects.create(user_type='external', external_user=name, description='x', service=self.service)
+        pending = SupportTicket.objects.filter(user_type='external', reporter__isnull=True).exclude(external_user='')
+        first = pending.order_by('pk')[4].pk
+
+        call_command('backfill_reporters', '--table', 'tickets', '--batch-size', '2', '--after', str(first), stdout=StringIO())
+        self.assertEqual(pending.count(), 9)
+        call_command('backfill_reporters', '--table', 'tickets', '--batch-size', '2', stdout=StringIO())
+        self.assertEqual(sorted(set(pending.values_list('external_user', flat=True))), ['  bob ', 'Bob'])
+        self.assertEqual(pending.count(), 6)
+        self.assertEqual(ExternalReporter.objects.count(), 1)
+        self.assertEqual(ExternalReporter.objects.get(identity_key='email:jane@example.com').tickets.count(), 6)
+
+
+class TicketOwnershipTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        department = Department.objects.create(name='ICT', short_name='ICT')
+        cls.section = Section.objects.create(name='Systems', department=department, short_name='SYS')
+        cls.unit = Unit.objects.create(name='Audit', short_name='AU')
+        financial_year = FinancialYear.objects.create(start_date=datetime.date(2025, 7, 1), end_date=datetime.date(2026, 6, 30))
+        previous_year = FinancialYear.objects.create(start_date=datetime.date(2024, 7, 1), end_date=datetime.date(2025, 6, 30))
+        activity = Activity.objects.create(name='Helpdesk', section=cls.section, financial_year=financial_year)
+        cls.unit_activity = Activity.objects.create(name='Audit support', unit=cls.unit, financial_year=previous_year)
+        cls.section_service = SupportService.objects.create(name='Email', activities=activity)
+        cls.unit_service = SupportService.objects.create(name='Audit tools', activities=cls.unit_activity)
+        for service in (cls.section_service, cls.unit_service):
+            for status in ('open', 'in_progress', 'resolved', 'closed'):
+                SupportTicket.objects.create(user_type='internal', internal_user_name='Staff', service=service,
+                                             description='Mailbox full', status=status)
+        cls.section_user = CustomUser.objects.create_user('section@example.com', None, full_name='Section', is_staff=True,
+                                                          department=department, section=cls.section)
+        cls.section_user.user_permissions.set(Permission.objects.filter(content_type__app_label='services'))
+
+    def owners(self, ticket):
+        ticket.refresh_from_db()
+        return ticket.owning_unit_id, ticket.owning_section_id, ticket.owning_department_id, ticket.financial_year_id
+
+    def test_set_on_save_and_kept_in_sync(self):
+        section, unit, service = self.section, self.unit, self.section_service
+        activity = service.activities
+        ticket = SupportTicket.objects.create(user_type='internal', description='x', service=service)
+        closed = SupportTicket.objects.create(user_type='internal', description='x', service=service, status='closed')
+        self.assertEqual(self.owners(ticket), (None, section.pk, section.department_id, activity.financial_year_id))
+        before = self.owners(closed)
+
+        other = self.unit_activity
+        service.activities = other
+        service.save()
+        self.assertEqual(self.owners(ticket), (unit.pk, None, None, other.financial_year_id))
+
+        other.unit, other.section = None, section
+        other.save()
+        self.assertEqual(self.owners(ticket), (None, section.pk, section.department_id, other.financial_year_id))
+
+        department = Department.objects.create(name='Other department')
+        section.department = department
+        section.save()
+        self.assertEqual(self.owners(ticket)[2], department.pk)
+        self.assertEqual(self.owners(closed), before)  # past reports keep their owners
+
+        with self.assertNumQueries(2):
+            service.save()  # the change check and the save; no ticket update for an unchanged mapping
+
+    def test_resolved_ticket_keeps_owner_when_edited(self):
+        service, moved = self.section_service, self.unit_service
+        closed = SupportTicket.objects.create(user_type='internal', description='x', service=service, status='closed')
+        before = self.owners(closed)
+        SupportService.objects.filter(pk=service.pk).update(activities=moved.activities)
+
+        closed.description = 'edited'
+        closed.save()
+        self.assertEqual(self.owners(closed), before)
+
+        closed.service = moved
+        closed.save()
+        self.assertEqual(self.owners(closed)[0], self.unit.pk)
+
+    def test_refresh_invalidates_ticket_caches(self):
+        service = self.section_service
+        version = cache.get(facet_version_key(SupportTicket), 0)
+        with self.captureOnCommitCallbacks(execute=True):
+            service.activities = self.unit_activity
+            service.save()
+        self.assertEqual(cache.get(facet_version_key(SupportTicket)), version + 1)
+
+    def test_backfill_and_scoped_list(self):
+        section = self.section
+        SupportTicket.objects.update(owning_unit=None, owning_section=None, owning_department=None, financial_year=None)
+        owned = SupportTicket.objects.filter(service__activities__section=section)
+        call_command('backfill_ticket_ownership', '--batch-size', '5', stdout=StringIO())
+        self.assertEqual(SupportTicket.objects.filter(owning_section=section).count(), owned.count())
+        self.assertFalse(SupportTicket.objects.filter(service__isnull=False, financial_year__isnull=True).exists())
+
+        self.client.force_login(self.section_user)
+        response = self.client.get(reverse('admin:services_supportticket_changelist'), {'owner': 'mine'})
+        self.assertEqual(response.context['cl'].result_count, owned.count())
+
+        # A rerun leaves resolved tickets that already have an owner alone.
+        resolved = SupportTicket.objects.filter(status='resolved', owning_section=section)
+        ids = list(resolved.values_list('pk', flat=True))
+        resolved.update(owning_section=None)
+        call_command('backfill_ticket_ownership', '--batch-size', '5', stdout=StringIO())
+        self.assertFalse(SupportTicket.objects.filter(pk__in=ids, owning_section__isnull=False).exists())
+
+
+class TicketQueueTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.technician = CustomUser.objects.create_user('tech@example.com', None, full_name='Tech', is_staff=True)
+        cls.technician.user_permissions.set(Permission.objects.filter(content_type__app_label='services'))
+        cls.colleague = CustomUser.objects.create_user('colleague@example.com', None, full_name='Colleague', is_staff=True)
+        cls.service = SupportService.objects.create(name='Email')
+        other = SupportService.objects.create(name='Printing')
+        for user in (cls.technician, cls.colleague):
+            Technician.objects.create(user=user).services.add(cls.service)
+        for service in (other, cls.service):
+            for status in ('open', 'in_progress', 'open'):
+                SupportTicket.objects.create(user_type='internal', internal_user_name='Staff', service=service,
+                                             description='Mailbox full', status=status)
+
+    def setUp(self):
+        self.queue = SupportTicket.objects.filter(service=self.service, status='open').order_by('submitted_at', 'pk')
+
+    def test_claims_oldest_unclaimed_ticket_of_own_services(self):
+        expected = list(self.queue)
+        claimed = [claim_next(self.technician) for _ in expected]
+        self.assertEqual(claimed, expected)
+        self.assertTrue(all(ticket.claimed_by == self.technician for ticket in claimed))
+        self.assertIsNone(claim_next(self.technician))
+
+        # An expired claim is up for grabs again.
+        later = claimed[0].claim_expires_at + datetime.timedelta(seconds=1)
+        self.assertEqual(claim_next(self.colleague, now=later).pk, claimed[0].pk)
+
+    def test_admin_claim_next_and_release(self):
+        self.client.force_login(self.technician)
+        url = reverse('admin:services_supportticket_claim_next')
+        self.assertEqual(self.client.get(url).status_code, 405)
+        ticket = self.queue.first()
+        response = self.client.post(url)
+        self.assertRedirects(response, reverse('admin:services_supportticket_change', args=[ticket.pk]))
+        self.assertContains(self.client.get(reverse('admin:services_supportticket_changelist')), 'Claim next ticket')
+
+        SupportTicket.objects.filter(service=self.service).update(claim_expires_at=timezone.now() - datetime.timedelta(minutes=1))
+        call_command('release_ticket_claims', stdout=StringIO())
+        self.assertFalse(SupportTicket.objects.filter(claimed_by__isnull=False).exists())
+
+        self.queue.update(status='in_progress')
+        response = self.client.post(url)
+        self.assertRedirects(response, reverse('admin:services_supportticket_changelist'))
+
+
+class FailingBackend:
+    def open(self):
+        pass
+
+    def close(self):
+        pass
+
+    def send(self, recipient, events):
+        raise ConnectionError("mail server down")
+
+
+class OutboxTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.superuser = CustomUser.objects.create_superuser('admin@example.com', None, full_name='Admin')
+        department = Department.objects.create(name='ICT', short_name='ICT')
+        section = Section.objects.create(name='Systems', department=department, short_name='SYS')
+        supervisor = CustomUser.objects.create_user('section@example.com', None, full_name='Supervisor', is_staff=True,
+                                                    department=department, section=section)
+        supervisor.groups.add(Group.objects.create(name='Supervisors'))
+        financial_year = FinancialYear.objects.create(start_date=datetime.date(2025, 7, 1), end_date=datetime.date(2026, 6, 30))
+        activity = Activity.objects.create(name='Helpdesk', section=section, financial_year=financial_year)
+        cls.service = SupportService.objects.create(name='Printing', activities=activity)
+        for status in ('open', 'open', 'resolved'):
+            SupportTicket.objects.create(user_type='internal', internal_user_name='Staff', service=cls.service,
+                                         description='Printer jam', status=status)
+
+    def setUp(self):
+        forget_reporters()
+
+    def add_ticket(self):
+        return self.client.post(reverse('admin:services_supportticket_add'), {
+            'user_type': 'external', 'external_user': 'Jane <jane@example.com>', 'service': self.service.pk,
+            'description': 'Printer jam', 'status': 'open',
+        })
+
+    def test_events_are_coalesced_per_recipient(self):
+        self.client.force_login(self.superuser)
+        for _ in range(2):
+            self.assertEqual(self.add_ticket().status_code, 302)
+        self.assertEqual(
+            sorted(OutboxEvent.objects.values_list('recipient', flat=True)),
+            ['jane@example.com', 'jane@example.com', 'section@example.com', 'section@example.com'],
+        )
+        self.assertEqual(mail.outbox, [])  # nothing is sent while saving
+
+        call_command('dispatch_outbox', stdout=StringIO())
+        self.assertEqual(sorted(message.to[0] for message in mail.outbox), ['jane@example.com', 'section@example.com'])
+        self.assertEqual(mail.outbox[0].subject, '2 ticket updates')
+        self.assertFalse(OutboxEvent.objects.filter(sent_at__isnull=True).exists())
+
+    def test_written_in_the_same_transaction(self):
+        tickets = SupportTicket.objects.filter(service=self.service, status='open')
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            transition_tickets(tickets, 'resolved')
+            self.assertTrue(OutboxEvent.objects.filter(event='resolved').exists())
+            raise RuntimeError
+        self.assertFalse(OutboxEvent.objects.exists())
+
+    def test_failed_sends_back_off(self):
+        ticket = SupportTicket.objects.filter(service=self.service, status='open').first()
+        transition_tickets(SupportTicket.objects.filter(pk=ticket.pk), 'resolved')
+        now = timezone.now()
+        with self.assertLogs('services.outbox', 'WARNING'):
+            self.assertEqual(dispatch(backend=FailingBackend(), now=now), (0, 1))
+        event = OutboxEvent.objects.get()
+        self.assertEqual((event.attempts, event.available_at), (1, now + datetime.timedelta(seconds=60)))
+        self.assertIn('mail server down', event.last_error)
+
+        self.assertEqual(dispatch(now=now + datetime.timedelta(seconds=59)), (0, 0))
+        with self.assertLogs('services.outbox', 'WARNING'):
+            self.assertEqual(dispatch(backend=FailingBackend(), now=now + datetime.timedelta(seconds=60)), (0, 1))
+        self.assertEqual(OutboxEvent.objects.get().available_at, now + datetime.timedelta(seconds=180))
+        self.assertEqual(dispatch(now=now + datetime.timedelta(seconds=180)), (1, 0))
+        self.assertEqual(mail.outbox[0].subject, f'Ticket #{event.ticket_id} resolved')
+
+
+def count_systems(request):
+    """Writes when asked to, then reads the way a report does."""
+    if request.GET.get('create'):
+        SupportedSystem.objects.create(name='new system')
+    if request.GET.get('render_form'):
+        # What the admin change form does on GET.
+        with transaction.atomic(using=router.db_for_write(SupportedSystem)):
+            pass
+    with use_replica():
+        return HttpResponse(str(SupportedSystem.objects.count()))
+
+
+urlpatterns = [
+    path('systems/', count_systems),
+    path('report/', read_from_replica(count_systems)),
+]
+
+
+@override_settings(DATABASE_ROUTERS=['isd.routers.ReplicaRouter'], REPLICA_PIN_SECONDS=5, ROOT_URLCONF=__name__,
+                   MIDDLEWARE=['services.middleware.ReplicaPinningMiddleware.ReplicaPinningMiddleware'])
+class ReplicaRoutingTests(TransactionTestCase):
+    # Not a TestCase: its transaction would keep every read on the primary. The
+    # replica alias only exists while these tests run, so it cannot be named here.
+    databases = '__all__'
+
+    @classmethod
+    def setUpClass(cls):
+        # A second SQLite database standing in for a replica that has not caught up:
+        # it is created empty, so anything read from it was routed there.
+        connections.settings[REPLICA_DB_ALIAS] = connections.configure_settings({
+            DEFAULT_DB_ALIAS: connections.settings[DEFAULT_DB_ALIAS],
+            REPLICA_DB_ALIAS: {'ENGINE': 'django.db.backends.sqlite3', 'NAME': ':memory:'},
+        })[REPLICA_DB_ALIAS]
+        call_command('migrate', database=REPLICA_DB_ALIAS, run_syncdb=True, verbosity=0)
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        connections[REPLICA_DB_ALIAS].close()
+        del connections[REPLICA_DB_ALIAS]
+        del connections.settings[REPLICA_DB_ALIAS]
+
+    def setUp(self):
+        SupportedSystem.objects.create(name='on the primary only')
+
+    def tearDown(self):
+        reset_pin()
+
+    def get(self, pinned=False, **params):
+        self.client.cookies.clear()
+        if pinned:
+            self.client.cookies['isd_pin_primary'] = '1'
+        return self.client.get('/systems/', params)
+
+    def test_reads_go_to_the_replica(self):
+        response = self.get()
+        self.assertEqual(response.content, b'0')
+        self.assertNotIn('isd_pin_primary', response.cookies)
+
+    def test_write_alias_lookup_does_not_pin(self):
+        self.assertEqual(router.db_for_write(SupportedSystem), DEFAULT_DB_ALIAS)
+        reset_pin()
+        router.db_for_write(SupportedSystem)
+        self.assertFalse(is_pinned())
+        response = self.get(render_form='1')
+        self.assertEqual(response.content, b'0')
+        self.assertNotIn('isd_pin_primary', response.cookies)
+
+    def test_write_pins_to_the_primary(self):
+        response = self.get(create='1')
+        self.assertEqual(response.content, b'2')
+        self.assertEqual(response.cookies['isd_pin_primary']['max-age'], 5)
+
+        self.client.cookies.clear()
+        response = self.client.post('/systems/')
+        self.assertEqual(response.content, b'2')
+        self.assertIn('isd_pin_primary', response.cookies)
+
+        # Report forms post their filters, but only read.
+        self.client.cookies.clear()
+        response = self.client.post('/report/')
+        self.assertEqual(response.content, b'0')
+        self.assertNotIn('isd_pin_primary', response.cookies)
+        response = self.client.post('/report/?create=1')
+        self.assertEqual(response.content, b'3')
+        self.assertIn('isd_pin_primary', response.cookies)
+
+    def test_pin_expires_with_the_cookie(self):
+        self.assertEqual(self.get(pinned=True).content, b'1')
+        # Once the cookie has expired the client no longer sends it.
+        self.assertEqual(self.get().content, b'0')
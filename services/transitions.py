@@ -0,0 +1,56 @@
+"""
+Bulk ticket status changes.
+
+A transition is one UPDATE over the selected tickets; per-row save() and its
+signals are skipped, so the caches that depend on ticket rows (admin facet
+counts, the report data stamp) are invalidated once, after the transaction
+commits. Resolving also queues 'resolved' notifications in the outbox, which
+needs the ids of the tickets being changed.
+"""
+
+from django.db import transaction
+from django.db.models import F, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from isd.facets import bump_facet_version
+from report.freshness import touch
+from .models import SupportTicket
+from .outbox import record_events
+
+RESOLVED_STATUSES = ('resolved', 'closed')
+
+
+def invalidate_ticket_caches():
+    bump_facet_version(SupportTicket)
+    touch()
+
+
+def transition_tickets(queryset, status, user=None):
+    """
+    Move every ticket in `queryset` to `status` with a single UPDATE and return
+    the number changed. Resolving keeps an existing resolved_at and records
+    `user` as the resolver; any other status clears resolved_at and resolved_by.
+    """
+    if status not in dict(SupportTicket.STATUS_CHOICES):
+        raise ValueError(f"Unknown ticket status {status!r}")
+
+    changes = {'status': status}
+    if status in RESOLVED_STATUSES:
+        changes['resolved_at'] = Coalesce(F('resolved_at'), Value(timezone.now()))
+        if user is not None:
+            changes['resolved_by'] = user
+    else:
+        changes['resolved_at'] = None
+        changes['resolved_by'] = None
+
+    with transaction.atomic():
+        if status == 'resolved':
+            ids = list(queryset.exclude(status=status).values_list('pk', flat=True))
+            updated = SupportTicket.objects.filter(pk__in=ids).order_by().update(**changes)
+            record_events('resolved', ids)
+        else:
+            updated = queryset.exclude(status=status).order_by().update(**changes)
+        if updated:
+            transaction.on_commit(invalidate_ticket_caches)
+    return updated
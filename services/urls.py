@@ -1,6 +1,8 @@
 from django.urls import path
-from .views import get_sub_services
+from .views import get_sub_services, download_statistics_file, ticket_intake
 
 urlpatterns = [
     path('get_sub_services/', get_sub_services, name='get_sub_services'),
+    path('statistics/<int:pk>/download/', download_statistics_file, name='download_statistics_file'),
+    path('tickets/batch/', ticket_intake, name='ticket_intake'),
 ]
@@ -1,7 +1,176 @@
-from django.http import JsonResponse
-from .models import SubService
+import json
+import os
+import re
+
+from django.conf import settings
+from django.core.exceptions import PermissionDenied
+from django.http import FileResponse, Http404, HttpResponse, JsonResponse
+from django.shortcuts import get_object_or_404
+from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
+from .intake import ingest_tickets
+from .models import ApiToken, SubService, StatisticsRecord
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
 
 def get_sub_services(request):
     service_id = request.GET.get('service')
     sub_services = SubService.objects.filter(service_id=service_id).values('id', 'name')
     return JsonResponse({'sub_services': list(sub_services)})
+
+
+class RangeFile:
+    """File wrapper that only yields `length` bytes starting at `start`."""
+
+    def __init__(self, file, start, length):
+        self.file = file
+        self.file.seek(start)
+        self.remaining = length
+
+    def read(self, size=-1):
+        if self.remaining <= 0:
+            return b''
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def close(self):
+        self.file.close()
+
+
+def parse_range(header, size):
+    """
+    Parse a single-range `Range` header into (start, end) inclusive. Returns None
+    for headers we don't handle (the whole file is served) and raises ValueError
+    when the range cannot be satisfied.
+    """
+    match = RANGE_RE.match(header.strip())
+    if not match or match.groups() == ('', ''):
+        return None
+    first, last = match.groups()
+    if first == '':
+        suffix = int(last)
+        if suffix == 0:
+            raise ValueError("Empty suffix range")
+        return max(size - suffix, 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        raise ValueError("Range not satisfiable")
+    return start, end
+
+
+def file_etag(name, size, modified):
+    # Content-addressed names already are the SHA-256 of the content.
+    stem = os.path.splitext(os.path.basename(name))[0]
+    if re.fullmatch(r'[0-9a-f]{64}', stem):
+        return quote_etag(stem)
+    return quote_etag(f"{size:x}-{int(modified.timestamp()):x}")
+
+
+def download_statistics_file(request, pk):
+    if not request.user.has_perm('services.view_statisticsrecord'):
+        raise PermissionDenied
+    record = get_object_or_404(StatisticsRecord.objects.only('title', 'file'), pk=pk)
+    if not record.file:
+        raise Http404("This record has no file.")
+
+    storage = record.file.storage
+    name = record.file.name
+    try:
+        size = storage.size(name)
+        modified = storage.get_modified_time(name)
+    except FileNotFoundError:
+        raise Http404("File not found.")
+
+    etag = file_etag(name, size, modified)
+    last_modified = int(modified.timestamp())
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        response = file_response(request, record, storage.open(name, 'rb'), size, etag, last_modified)
+
+    response.headers['ETag'] = etag
+    response.headers['Last-Modified'] = http_date(last_modified)
+    response.headers['Accept-Ranges'] = 'bytes'
+    response.headers['Cache-Control'] = 'private, max-age=3600'
+    return response
+
+
+def file_response(request, record, file, size, etag, last_modified):
+    extension = os.path.splitext(record.file.name)[1]
+    filename = f"{record.title}{extension}"
+
+    byte_range = None
+    if_range = request.headers.get('If-Range')
+    if request.headers.get('Range') and (not if_range or if_range in (etag, http_date(last_modified))):
+        try:
+            byte_range = parse_range(request.headers['Range'], size)
+        except ValueError:
+            file.close()
+            response = HttpResponse(status=416)
+            response.headers['Content-Range'] = f'bytes */{size}'
+            return response
+
+    if byte_range is None:
+        return FileResponse(file, as_attachment=True, filename=filename)
+
+    start, end = byte_range
+    response = FileResponse(RangeFile(file, start, end - start + 1), as_attachment=True, filename=filename, status=206)
+    response.headers['Content-Range'] = f'bytes {start}-{end}/{size}'
+    response.headers['Content-Length'] = str(end - start + 1)
+    return response
+
+
+def token_user(request):
+    """The user of the active API token in the `Authorization: Bearer <token>` header, or None."""
+    scheme, _, key = request.headers.get('Authorization', '').partition(' ')
+    if scheme.lower() not in ('bearer', 'token') or not key.strip():
+        return None
+    token = ApiToken.objects.select_related('user') \
+        .filter(key_hash=ApiToken.hash_key(key.strip()), is_active=True, user__is_active=True).first()
+    if token is None:
+        return None
+    ApiToken.objects.filter(pk=token.pk).update(last_used_at=timezone.now())
+    return token.user
+
+
+@csrf_exempt
+@require_POST
+def ticket_intake(request):
+    """
+    Create tickets from a JSON body {"tickets": [...]}. Each ticket needs an
+    `idempotency_key`; resending a key that was already accepted is reported as
+    a duplicate, so clients can safely retry a whole batch.
+    """
+    user = token_user(request)
+    if user is None:
+        response = JsonResponse({'error': "Invalid or missing API token."}, status=401)
+        response['WWW-Authenticate'] = 'Bearer'
+        return response
+    if not user.has_perm('services.add_supportticket'):
+        return JsonResponse({'error': "This token may not create tickets."}, status=403)
+
+    try:
+        payload = json.loads(request.body)
+    except (ValueError, UnicodeDecodeError):
+        return JsonResponse({'error': "Request body must be JSON."}, status=400)
+    tickets = payload.get('tickets') if isinstance(payload, dict) else payload
+    if not isinstance(tickets, list):
+        return JsonResponse({'error': 'Expected {"tickets": [...]}.'}, status=400)
+    if len(tickets) > settings.TICKET_INTAKE_MAX_BATCH:
+        return JsonResponse({'error': f"At most {settings.TICKET_INTAKE_MAX_BATCH} tickets per request."}, status=413)
+
+    result = ingest_tickets(tickets, user)
+    status = 201 if result['created'] else 200
+    return JsonResponse({
+        'created': len(result['created']),
+        'duplicates': len(result['duplicates']),
+        'errors': result['errors'],
+        'keys': {'created': result['created'], 'duplicates': result['duplicates']},
+    }, status=status)